@@ -1,146 +1,264 @@
-import os
 import configparser
-import requests
-from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
 from datetime import datetime
-import mysql.connector
-from urllib.parse import urlparse
+from news_db import get_connection as get_db_connection
 import json
-import threading
-import time
 from dotenv import load_dotenv
+from news_pubsub import broker
+import http_fetch
+from article_extractors import extract_text
+import ollama_client
+import metrics
+import data_versions
+import article_store
+import sentiment_aggregates
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables from .env file
 load_dotenv()
 
-def extract_and_save_news():
+def load_ingest_config(path='app.config'):
     # Read URLs and Ollama config from app.config
     config = configparser.ConfigParser()
-    config.read('app.config')
+    config.read(path)
+    return config
+
+def ensure_news_schema(cursor):
+    # Create table if not exists (updated schema)
+    cursor.execute('''CREATE TABLE IF NOT EXISTS news_articles
+                      (title TEXT, description TEXT, link TEXT, pubDate TIMESTAMP,
+                       sentiment TEXT, recommendation TEXT, stocks JSON, PRIMARY KEY (link(255)))''')
+    # Full article text, compressed, kept out of the listing rows
+    article_store.ensure_schema(cursor)
+    # Per-stock daily/hourly counts behind /dashboard
+    sentiment_aggregates.ensure_schema(cursor)
+    # Version counter the web views use to invalidate cached pages
+    data_versions.ensure_schema(cursor)
+
+def extract_and_save_news():
+    config = load_ingest_config()
     urls = config.get('MoneyControl', 'cms_urls').split(',')
     ollama_api_url = config.get('Ollama', 'api_url')
     ollama_model = config.get('Ollama', 'model')
 
-    # Connect to the database using environment variables
-    # Connect to the database using environment variables
-    conn = mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST'),
-        port=os.getenv('MYSQL_PORT'),
-        database=os.getenv('MAX_PAIN_DATABASE'),
-        user=os.getenv('MYSQL_USER'),
-        password=os.getenv('MYSQL_PASSWORD')
-    )
+    conn = get_db_connection()
     cursor = conn.cursor()
+    ensure_news_schema(cursor)
 
-    # Select the database
-    #cursor.execute(f"USE {os.getenv('MAX_PAIN_DATABASE')}")
-
-    # Create table if not exists (updated schema)
-    cursor.execute('''CREATE TABLE IF NOT EXISTS news_articles
-                      (title TEXT, description TEXT, link TEXT, pubDate TIMESTAMP, article TEXT,
-                       sentiment TEXT, recommendation TEXT, stocks JSON, PRIMARY KEY (link(255)))''')
-    
     for url in urls:
-        # Fetch and parse XML content
-        response = requests.get(url.strip())
+        process_feed(url.strip(), conn, cursor, ollama_api_url, ollama_model)
+
+    conn.close()
+
+def fetch_feed_items(url):
+    """
+    Fetch an RSS feed and return its items oldest first.
+
+    :param url: RSS feed URL
+    :return: Tuple of (items, validators). items is a list of dicts with title,
+             description, link, guid and pubDate keys, or None when the feed is
+             unchanged since the last fully processed fetch
+    """
+    # Fetch and parse XML content; an unchanged feed costs a 304 and no parsing
+    with metrics.stage('fetch_feed'):
+        response, validators = http_fetch.conditional_get(url)
+    if response.status_code == 304:
+        return None, validators
+    with metrics.stage('parse_feed'):
         root = ET.fromstring(response.content) if response.status_code == 200 else None
 
-        for item in root.findall('.//item') if root is not None else []:
-            title = item.find('title').text
-            description = item.find('description').text
-            link = item.find('link').text
-            pubDate_str = item.find('pubDate').text
+    items = []
+    for item in root.findall('.//item') if root is not None else []:
+        link = item.find('link').text
+        guid = item.find('guid')
+        items.append({
+            'title': item.find('title').text,
+            'description': item.find('description').text,
+            'link': link,
+            'guid': guid.text if guid is not None and guid.text else link,
             # Convert pubDate string to datetime object
-            pubDate = convert_to_datetime(pubDate_str)
+            'pubDate': convert_to_datetime(item.find('pubDate').text)
+        })
+    # Oldest first, so a checkpoint taken part way through never skips older items
+    items.sort(key=lambda entry: entry['pubDate'])
+    return items, validators
+
+def process_feed(url, conn, cursor, ollama_api_url, ollama_model, checkpoint=None, should_stop=None):
+    """
+    Ingest new items from one feed.
+
+    New articles are scraped and analyzed in batches sized to the Ollama
+    client's parallel slots, then inserted and committed in feed order.
+
+    :param checkpoint: Optional (pubDate, guid) of the newest item already handled;
+                       items at or before it are skipped without any DB lookup
+    :param should_stop: Optional callable; when it returns True the batch in
+                        flight is committed and the feed stops
+    :return: (pubDate, guid) of the newest item handled, or the given checkpoint.
+             It stops before the first item that failed, so that item and the
+             ones after it are read again on the next run
+    """
+    items, validators = fetch_feed_items(url)
+    if items is None:
+        print(f"Feed not modified: {url}")
+        return checkpoint
+
+    client = get_ollama_client(ollama_api_url, ollama_model)
+    store = article_store.store_from_config(load_ingest_config())
+    batch_size = max(1, client.max_parallel)
+    # Feed entries in order, paired with whether they still need ingesting
+    pending = []
+    pending_new = 0
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=batch_size, thread_name_prefix='ingest') as executor:
+        for entry in items:
+            if should_stop is not None and should_stop():
+                done, _ = flush_batch(pending, conn, cursor, client, store, executor)
+                # Keep the old validators so the unfinished feed is fetched again
+                return checkpoint if failed else done or checkpoint
+            if checkpoint is not None and is_at_or_before(entry, checkpoint):
+                continue
 
             # Check if the article already exists in the database
-            cursor.execute("SELECT * FROM news_articles WHERE link = %s", (link,))
-            if cursor.fetchone() is None:
-                # Extract full article text based on domain
-                article_text = extract_article_text(link)
-
-                # Perform sentiment analysis, get recommendation, and extract stocks using Ollama
-                sentiment, recommendation, stocks = analyze_content(article_text, ollama_api_url, ollama_model)
-
-                # Insert into database (updated query)
-                cursor.execute('''INSERT INTO news_articles 
-                                  (title, description, link, pubDate, article, sentiment, recommendation, stocks)
-                                  VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
-                               (title, description, link, pubDate.isoformat(), article_text, sentiment, recommendation, json.dumps(stocks)))
-                conn.commit()
-                print(f"Added new article: {title} - Stocks: {stocks} - Sentiment: {sentiment}, Recommendation: {recommendation}")
-            else:
-                print(f"Article already exists: {title}")
+            cursor.execute("SELECT 1 FROM news_articles WHERE link = %s LIMIT 1", (entry['link'],))
+            is_new = cursor.fetchone() is None
+            if not is_new:
+                print(f"Article already exists: {entry['title']}")
+            metrics.INGEST_ARTICLES.inc(result='new' if is_new else 'existing')
+            pending.append((entry, is_new))
+            pending_new += is_new
 
-    conn.close()
+            if pending_new >= batch_size:
+                done, batch_failed = flush_batch(pending, conn, cursor, client, store, executor)
+                if not failed:
+                    checkpoint = done or checkpoint
+                failed = failed or batch_failed
+                pending = []
+                pending_new = 0
+
+        done, batch_failed = flush_batch(pending, conn, cursor, client, store, executor)
+        if not failed:
+            checkpoint = done or checkpoint
+        failed = failed or batch_failed
+
+    if failed:
+        # Keep the old validators so the failed items are fetched again, not answered with a 304
+        print(f"Some articles failed; {url} will be read again from the first failure")
+    else:
+        http_fetch.validator_store.save(url, validators)
+    return checkpoint
+
+def flush_batch(pending, conn, cursor, client, store, executor):
+    """
+    Scrape, analyze and insert the new entries of a batch. An entry whose
+    scrape or analysis fails is counted and skipped, and the rest are saved.
+    The checkpoint stops short of the first failed entry, so it is retried;
+    entries after it that were saved are skipped next time by claim_link.
+
+    :return: Tuple of ((pubDate, guid) of the last entry before the first
+             failure, or None if there is none, and whether any entry failed)
+    """
+    if not pending:
+        return None, False
+
+    futures = [(entry, executor.submit(scrape_and_analyze, entry, client)) for entry, is_new in pending if is_new]
+    analyzed = []
+    first_failed = None
+    for entry, future in futures:
+        try:
+            analyzed.append((entry, future.result()))
+        except Exception as e:
+            # Skip just this entry: failing the batch would discard the other analyses
+            metrics.INGEST_ARTICLES.inc(result='failed')
+            print(f"Error ingesting article {entry['link']}: {e}")
+            if first_failed is None:
+                first_failed = entry
+
+    published = save_articles(cursor, store, analyzed)
+    if published:
+        with metrics.stage('commit'):
+            conn.commit()
+        # Hand the committed articles to in-process listeners such as stock alerts
+        broker.publish(published)
+
+    entries = [entry for entry, is_new in pending]
+    done = entries if first_failed is None else entries[:entries.index(first_failed)]
+    if not done:
+        return None, first_failed is not None
+    return (done[-1]['pubDate'], done[-1]['guid']), first_failed is not None
+
+def scrape_and_analyze(entry, client):
+    """
+    :return: (article text, (sentiment, recommendation, stocks))
+    """
+    # Extract full article text based on domain
+    article_text = extract_article_text(entry['link'])
+    with metrics.stage('ollama'):
+        return article_text, client.analyze(article_text)
+
+def save_articles(cursor, store, analyzed):
+    """
+    Insert analyzed articles with their bodies, add them to the sentiment
+    aggregates and bump the news version. The caller commits.
+
+    :param analyzed: Iterable of (feed entry, scrape_and_analyze result)
+    :return: The inserted articles, as published to the news broker
+    """
+    published = []
+    for entry, (article_text, (sentiment, recommendation, stocks)) in analyzed:
+        if not article_store.claim_link(cursor, entry['link']):
+            # Stored meanwhile by another ingester, or republished with a new pubDate
+            print(f"Article already exists: {entry['title']}")
+            continue
+        # Insert into database (updated query)
+        cursor.execute('''INSERT INTO news_articles 
+                          (title, description, link, pubDate, sentiment, recommendation, stocks)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                       (entry['title'], entry['description'], entry['link'], entry['pubDate'].isoformat(),
+                        sentiment, recommendation, json.dumps(stocks)))
+        # Same transaction as the row, so a body never outlives a rolled back insert
+        store.save(cursor, entry['link'], article_text)
+        published.append({
+            'title': entry['title'],
+            'description': entry['description'],
+            'link': entry['link'],
+            'pubDate': entry['pubDate'],
+            'sentiment': sentiment,
+            'recommendation': recommendation,
+            'stocks': stocks
+        })
+        print(f"Added new article: {entry['title']} - Stocks: {stocks} - Sentiment: {sentiment}, Recommendation: {recommendation}")
+    if published:
+        sentiment_aggregates.record(cursor, published)
+        data_versions.bump(cursor, data_versions.NEWS_ARTICLES)
+    return published
+
+def is_at_or_before(entry, checkpoint):
+    last_pub_date, last_guid = checkpoint
+    if entry['pubDate'] < last_pub_date:
+        return True
+    return entry['pubDate'] == last_pub_date and entry['guid'] == last_guid
 
 def convert_to_datetime(date_string):
     return datetime.strptime(date_string, "%a, %d %b %Y %H:%M:%S %z")
 
 def extract_article_text(url):
-    article_response = requests.get(url)
-    article_soup = BeautifulSoup(article_response.text, 'html.parser')
-    domain = urlparse(url).netloc
-    
-    if 'moneycontrol.com' in domain:
-        content_div = article_soup.find('div', class_='content_wrapper')
-        return content_div.get_text(strip=True) if content_div else ""
-    elif 'economictimes.indiatimes.com' in domain:
-        data_elements = article_soup.find_all('main', class_='clr customclr')
-        elementText = ""
-        if data_elements:
-            for element in data_elements:
-                for tag in ['img', 'a']:
-                    for sub_tag in element.find_all(tag):
-                        sub_tag.decompose()
-            for element in data_elements:
-                elementText += element.get_text(strip=True)
-            
-        return elementText
-    else:
-        # Default case or for unknown domains
-        return article_soup.get_text(strip=True)
+    with metrics.stage('fetch_article'):
+        article_response = http_fetch.get(url)
+    with metrics.stage('extract'):
+        return extract_text(article_response.text, url)
 
 def analyze_content(text, api_url, model):
-    prompt = f"""Consider yourself as a stock market analyst. Analyze the following news article and using your expertise of stock market provide the following information:
-1. Sentiment (POSITIVE, NEGATIVE, or NEUTRAL)
-2. Stock recommendation (BUY, SELL, or HOLD)
-3. stock in discussion discussion, in case of multiple stocks provide comma separated 
-
-{text}
-
-Respond in the following JSON format:
-{{
-    "sentiment": "POSITIVE/NEGATIVE/NEUTRAL",
-    "recommendation": "BUY/SELL/HOLD",
-    "stocks": [
-        {{"name": "Stock Name 1", "code": "STOCK_CODE_1"}},
-        {{"name": "Stock Name 2", "code": "STOCK_CODE_2"}},
-        ...
-    ]
-}}
-"""
-
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False
-    }
-
-    response = requests.post(api_url, json=payload)
-    if response.status_code == 200:
-        result = response.json()
-        try:
-            output = json.loads(result['response'])
-            return output['sentiment'], output['recommendation'], output['stocks']
-        except json.JSONDecodeError:
-            print(f"Error parsing Ollama API response: {result['response']}")
-            return "UNKNOWN", "UNKNOWN", []
-    else:
-        print(f"Error calling Ollama API: {response.status_code}")
-        return "UNKNOWN", "UNKNOWN", []
+    # Perform sentiment analysis, get recommendation, and extract stocks using Ollama
+    return get_ollama_client(api_url, model).analyze(text)
+
+def get_ollama_client(api_url, model):
+    return ollama_client.get_client(api_url, model, config=load_ingest_config())
 
 # Replace the direct function call with the background thread
 if __name__ == "__main__":
+    # Alerts go out from whichever process ingests the article
+    from stock_alerts import install_stock_alerts
+    install_stock_alerts()
     extract_and_save_news()
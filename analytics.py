@@ -0,0 +1,486 @@
+"""
+Columnar analytics copy of max_pain_data and news_articles, in DuckDB.
+
+Long-range research queries (max pain against expiry settlement, sentiment and
+recommendation hit rates per stock) scan whole tables. Run here, they read a
+local DuckDB file with vectorized scans instead of loading the MySQL instance
+behind the web views.
+
+sync copies both tables incrementally, a month at a time so each source query
+reads one partition. Every table has a watermark, the newest time copied; a
+sync re-reads from the watermark (news_articles from [Analytics]
+news_lookback_hours before it, as articles can arrive with older pubDates) and
+replaces that range. Rows the retention job drops from MySQL stay here. Times
+are UTC, as stored; the queries bucket by IST day.
+
+Usage: python analytics.py sync
+       python analytics.py query NAME [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--index-name NIFTY]
+                                      [--stock TCS] [--horizon-days 5] [--format table|csv|json]
+       python analytics.py sql "SELECT ..."
+       python analytics.py load-prices prices.csv
+       python analytics.py export DIR
+       python analytics.py status
+
+Queries: see QUERIES. recommendation_hit_rate needs daily closes loaded with
+load-prices (stock_code, day, close as CSV or Parquet). DuckDB allows one
+writing process: schedule sync so it does not overlap long queries.
+"""
+import argparse
+import configparser
+import csv
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+
+from news_pubsub import article_stock_codes
+from partitions import month_start, add_months
+
+DEFAULT_PATH = os.path.join('analytics', 'analytics.duckdb')
+DEFAULT_NEWS_LOOKBACK_HOURS = 48
+DEFAULT_BATCH = 50_000
+
+# (name, DuckDB type) in source column order
+SyncedTable = namedtuple('SyncedTable', 'name time_column columns')
+TABLES = (
+    SyncedTable('max_pain_data', 'record_time', (
+        ('record_time', 'TIMESTAMP'), ('expiry_date', 'DATE'), ('index_name', 'VARCHAR'), ('max_pain', 'DOUBLE'),
+        ('max_pain_trend', 'VARCHAR'), ('max_pain_price', 'DOUBLE'), ('index_price_close', 'DOUBLE'))),
+    SyncedTable('news_articles', 'pubDate', (
+        ('link', 'VARCHAR'), ('title', 'VARCHAR'), ('description', 'VARCHAR'), ('pubDate', 'TIMESTAMP'),
+        ('sentiment', 'VARCHAR'), ('recommendation', 'VARCHAR'), ('stocks', 'VARCHAR'))),
+)
+# One row per stock an article mentions, derived during sync
+NEWS_STOCKS_COLUMNS = (('link', 'VARCHAR'), ('stock_code', 'VARCHAR'), ('pubDate', 'TIMESTAMP'),
+                       ('sentiment', 'VARCHAR'), ('recommendation', 'VARCHAR'))
+
+IST_DAY = "CAST({column} + INTERVAL 330 MINUTE AS DATE)"
+
+# Per expiry: max pain at the last snapshot before expiry day, and the index at the last snapshot on it
+_SETTLEMENTS = f'''
+    WITH expiries AS (
+        SELECT index_name, expiry_date,
+               arg_max(max_pain, record_time)
+                   FILTER (WHERE {IST_DAY.format(column='record_time')} < expiry_date) AS max_pain,
+               arg_max(index_price_close, record_time)
+                   FILTER (WHERE {IST_DAY.format(column='record_time')} = expiry_date) AS settlement
+        FROM max_pain_data
+        WHERE expiry_date BETWEEN $since AND $until
+          AND (CAST($index_name AS VARCHAR) IS NULL OR index_name = $index_name)
+        GROUP BY index_name, expiry_date
+    ),
+    settlements AS (
+        SELECT index_name, expiry_date, max_pain, settlement, settlement - max_pain AS difference,
+               round(100 * abs(settlement - max_pain) / settlement, 3) AS distance_pct
+        FROM expiries
+        WHERE max_pain IS NOT NULL AND settlement IS NOT NULL
+    )
+'''
+
+Query = namedtuple('Query', 'description sql')
+QUERIES = {
+    'max_pain_settlement': Query(
+        'Max pain before each expiry against where the index settled',
+        _SETTLEMENTS + "SELECT * FROM settlements ORDER BY index_name, expiry_date"),
+    'max_pain_summary': Query(
+        'Per index: how far settlement lands from max pain, over all expiries in range',
+        _SETTLEMENTS + '''
+        SELECT index_name, count(*) AS expiries, round(avg(distance_pct), 3) AS mean_distance_pct,
+               round(median(distance_pct), 3) AS median_distance_pct,
+               round(100 * avg(CASE WHEN distance_pct <= 0.5 THEN 1 ELSE 0 END), 1) AS within_half_pct,
+               round(100 * avg(CASE WHEN distance_pct <= 1 THEN 1 ELSE 0 END), 1) AS within_one_pct
+        FROM settlements GROUP BY index_name ORDER BY index_name'''),
+    'sentiment_by_stock': Query(
+        'Articles per stock and IST month, by sentiment and recommendation',
+        f'''
+        SELECT stock_code, CAST(date_trunc('month', pubDate + INTERVAL 330 MINUTE) AS DATE) AS month,
+               count(*) AS articles,
+               count(*) FILTER (WHERE sentiment = 'POSITIVE') AS positive,
+               count(*) FILTER (WHERE sentiment = 'NEGATIVE') AS negative,
+               count(*) FILTER (WHERE sentiment = 'NEUTRAL') AS neutral,
+               count(*) FILTER (WHERE recommendation = 'BUY') AS buy,
+               count(*) FILTER (WHERE recommendation = 'SELL') AS sell,
+               count(*) FILTER (WHERE recommendation = 'HOLD') AS hold
+        FROM news_stocks
+        WHERE {IST_DAY.format(column='pubDate')} BETWEEN $since AND $until
+          AND (CAST($stock AS VARCHAR) IS NULL OR stock_code = $stock)
+        GROUP BY ALL ORDER BY stock_code, month'''),
+    'recommendation_hit_rate': Query(
+        'Per stock: share of calls the close horizon_days later agreed with (needs load-prices)',
+        f'''
+        WITH calls AS (
+            SELECT stock_code, sentiment, recommendation, {IST_DAY.format(column='pubDate')} AS day
+            FROM news_stocks
+            WHERE {IST_DAY.format(column='pubDate')} BETWEEN $since AND $until
+              AND (CAST($stock AS VARCHAR) IS NULL OR stock_code = $stock)
+        ),
+        last_prices AS (SELECT stock_code, max(day) AS last_day FROM stock_prices GROUP BY stock_code),
+        priced AS (
+            SELECT c.stock_code, c.sentiment, c.recommendation,
+                   100 * (exit.close - entry.close) / entry.close AS return_pct
+            FROM calls c
+            JOIN last_prices l ON l.stock_code = c.stock_code AND c.day + CAST($horizon_days AS INTEGER) <= l.last_day
+            ASOF JOIN stock_prices entry ON entry.stock_code = c.stock_code AND c.day >= entry.day
+            ASOF JOIN stock_prices exit
+                ON exit.stock_code = c.stock_code AND c.day + CAST($horizon_days AS INTEGER) >= exit.day
+        )
+        SELECT stock_code,
+               count(*) FILTER (WHERE recommendation = 'BUY') AS buy_calls,
+               round(100 * avg(CASE WHEN return_pct > 0 THEN 1 ELSE 0 END)
+                     FILTER (WHERE recommendation = 'BUY'), 1) AS buy_hit_pct,
+               count(*) FILTER (WHERE recommendation = 'SELL') AS sell_calls,
+               round(100 * avg(CASE WHEN return_pct < 0 THEN 1 ELSE 0 END)
+                     FILTER (WHERE recommendation = 'SELL'), 1) AS sell_hit_pct,
+               count(*) FILTER (WHERE sentiment = 'POSITIVE') AS positive_calls,
+               round(100 * avg(CASE WHEN return_pct > 0 THEN 1 ELSE 0 END)
+                     FILTER (WHERE sentiment = 'POSITIVE'), 1) AS positive_hit_pct,
+               count(*) FILTER (WHERE sentiment = 'NEGATIVE') AS negative_calls,
+               round(100 * avg(CASE WHEN return_pct < 0 THEN 1 ELSE 0 END)
+                     FILTER (WHERE sentiment = 'NEGATIVE'), 1) AS negative_hit_pct,
+               round(avg(return_pct), 2) AS mean_return_pct
+        FROM priced GROUP BY stock_code ORDER BY stock_code'''),
+}
+QUERY_DEFAULTS = {'since': date(2000, 1, 1), 'until': date(2100, 1, 1), 'index_name': None, 'stock': None,
+                  'horizon_days': 5}
+
+
+def _connect(path, read_only=False):
+    import duckdb
+    if not read_only:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return duckdb.connect(path, read_only=read_only)
+
+
+def _table_sql(name, columns):
+    return f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(f'{column} {kind}' for column, kind in columns)})"
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class AnalyticsStore:
+    """
+    The DuckDB file and the operations on it.
+
+    :param path: DuckDB database file
+    :param read_only: Open for queries only, alongside other readers
+    """
+
+    def __init__(self, path=DEFAULT_PATH, read_only=False):
+        self.path = path
+        self.db = _connect(path, read_only)
+        if not read_only:
+            self.ensure_schema()
+
+    @classmethod
+    def from_config(cls, config, read_only=False):
+        return cls(config.get('Analytics', 'path', fallback=DEFAULT_PATH), read_only=read_only)
+
+    def close(self):
+        self.db.close()
+
+    def ensure_schema(self):
+        for spec in TABLES:
+            self.db.execute(_table_sql(spec.name, spec.columns))
+        self.db.execute(_table_sql('news_stocks', NEWS_STOCKS_COLUMNS))
+        self.db.execute(_table_sql('stock_prices', (('stock_code', 'VARCHAR'), ('day', 'DATE'), ('close', 'DOUBLE'))))
+        self.db.execute('''CREATE TABLE IF NOT EXISTS sync_state
+                           (table_name VARCHAR PRIMARY KEY, watermark TIMESTAMP, synced_at TIMESTAMP)''')
+
+    def watermark(self, table):
+        row = self.db.execute("SELECT watermark FROM sync_state WHERE table_name = ?", [table]).fetchone()
+        return row[0] if row else None
+
+    def _set_watermark(self, table, watermark):
+        self.db.execute("DELETE FROM sync_state WHERE table_name = ?", [table])
+        self.db.execute("INSERT INTO sync_state VALUES (?, ?, ?)", [table, watermark, datetime.utcnow()])
+
+    def sync(self, source, lookbacks=None, batch_size=DEFAULT_BATCH, tables=None):
+        """
+        Copy new rows of every table from the source database.
+
+        :param source: DB-API connection (news_db.get_connection()) reading times as UTC
+        :param lookbacks: {table: timedelta} re-read before each table's watermark
+        :return: {table: rows copied}
+        """
+        lookbacks = lookbacks or {}
+        copied = {}
+        for spec in TABLES:
+            if tables and spec.name not in tables:
+                continue
+            copied[spec.name] = self._sync_table(source, spec, lookbacks.get(spec.name, timedelta(0)), batch_size)
+        return copied
+
+    def _sync_table(self, source, spec, lookback, batch_size):
+        cursor = source.cursor()
+        watermark = self.watermark(spec.name)
+        if watermark is None:
+            cursor.execute(f"SELECT {spec.time_column} FROM {spec.name} ORDER BY {spec.time_column} LIMIT 1")
+            row = cursor.fetchone()
+            if row is None or row[0] is None:
+                return 0
+            start = row[0]
+        else:
+            start = watermark - lookback
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+
+        copied = 0
+        current_month = month_start(datetime.utcnow())
+        while True:
+            # Month by month, so every source query stays within one partition
+            next_month = add_months(month_start(start), 1)
+            last = next_month > current_month
+            end = None if last else datetime(next_month.year, next_month.month, 1)
+            copied += self._copy_range(cursor, spec, start, end, batch_size)
+            if last:
+                break
+            start = end
+        return copied
+
+    def _copy_range(self, cursor, spec, start, end, batch_size):
+        """
+        Replace [start, end) of a table with the source's rows, in one transaction.
+
+        :return: Rows copied
+        """
+        import pandas
+
+        column = spec.time_column
+        names = [name for name, _ in spec.columns]
+        range_sql = f"{column} >= ?" + (f" AND {column} < ?" if end else "")
+        range_params = [start] + ([end] if end else [])
+        query = f"SELECT {', '.join(names)} FROM {spec.name} WHERE {range_sql.replace('?', '%s')}"
+        casts = ', '.join(f"TRY_CAST({name} AS {kind})" for name, kind in spec.columns)
+        doubles = [index for index, (_, kind) in enumerate(spec.columns) if kind == 'DOUBLE']
+        time_index = names.index(column)
+
+        self.db.begin()
+        try:
+            self.db.execute(f"DELETE FROM {spec.name} WHERE {range_sql}", range_params)
+            if spec.name == 'news_articles':
+                self.db.execute(f"DELETE FROM news_stocks WHERE {range_sql}", range_params)
+            cursor.execute(query, [_timestamp(value) for value in range_params])
+            copied, newest = 0, None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if doubles:
+                    # DECIMAL columns arrive as Decimal objects
+                    rows = [tuple(float(value) if index in doubles and value is not None else value
+                                  for index, value in enumerate(row)) for row in rows]
+                frame = pandas.DataFrame.from_records(rows, columns=names)
+                self.db.register('incoming', frame)
+                self.db.execute(f"INSERT INTO {spec.name} SELECT {casts} FROM incoming")
+                self.db.unregister('incoming')
+                if spec.name == 'news_articles':
+                    self._insert_news_stocks(rows)
+                batch_newest = max(row[time_index] for row in rows if row[time_index] is not None)
+                newest = batch_newest if newest is None else max(newest, batch_newest)
+                copied += len(rows)
+            if newest is not None:
+                if isinstance(newest, str):
+                    newest = datetime.fromisoformat(newest)
+                previous = self.watermark(spec.name)
+                self._set_watermark(spec.name, newest if previous is None else max(previous, newest))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return copied
+
+    def _insert_news_stocks(self, rows):
+        import pandas
+
+        exploded = []
+        for link, _, _, pub_date, sentiment, recommendation, stocks in rows:
+            try:
+                stocks = json.loads(stocks) if isinstance(stocks, (str, bytes)) else stocks
+            except ValueError:
+                stocks = []
+            for code in sorted(article_stock_codes({'stocks': stocks})):
+                exploded.append((link, code, pub_date, (sentiment or '').strip().upper() or None,
+                                 (recommendation or '').strip().upper() or None))
+        if not exploded:
+            return
+        frame = pandas.DataFrame.from_records(exploded, columns=[name for name, _ in NEWS_STOCKS_COLUMNS])
+        self.db.register('incoming_stocks', frame)
+        casts = ', '.join(f"TRY_CAST({name} AS {kind})" for name, kind in NEWS_STOCKS_COLUMNS)
+        self.db.execute(f"INSERT INTO news_stocks SELECT {casts} FROM incoming_stocks")
+        self.db.unregister('incoming_stocks')
+
+    def query(self, name, **params):
+        """
+        Run a named query from QUERIES.
+
+        :return: (column names, rows)
+        """
+        if name not in QUERIES:
+            raise KeyError(f"unknown query {name}; choose from {', '.join(sorted(QUERIES))}")
+        sql = QUERIES[name].sql
+        values = {key: value for key, value in {**QUERY_DEFAULTS, **params}.items() if f'${key}' in sql}
+        return self.sql(sql, values)
+
+    def sql(self, sql, params=None):
+        """:return: (column names, rows) of any statement"""
+        result = self.db.execute(sql, params or {})
+        columns = [column[0] for column in result.description] if result.description else []
+        return columns, result.fetchall()
+
+    def load_prices(self, path):
+        """
+        Load daily closes from a CSV or Parquet file with stock_code, day and
+        close columns, replacing any already loaded for the same stock and day.
+
+        :return: Rows loaded
+        """
+        reader = 'read_parquet' if path.lower().endswith('.parquet') else 'read_csv_auto'
+        literal = "'" + path.replace("'", "''") + "'"
+        self.db.begin()
+        try:
+            self.db.execute(f'''CREATE TEMP TABLE incoming_prices AS
+                                SELECT upper(CAST(stock_code AS VARCHAR)) AS stock_code, CAST(day AS DATE) AS day,
+                                       CAST(close AS DOUBLE) AS close
+                                FROM {reader}({literal})''')
+            self.db.execute('''DELETE FROM stock_prices WHERE (stock_code, day) IN
+                               (SELECT stock_code, day FROM incoming_prices)''')
+            self.db.execute("INSERT INTO stock_prices SELECT * FROM incoming_prices")
+            loaded = self.db.execute("SELECT count(*) FROM incoming_prices").fetchone()[0]
+            self.db.execute("DROP TABLE incoming_prices")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return loaded
+
+    def export(self, directory):
+        """Write every table as Parquet, the synced ones split by year and month of their time column."""
+        os.makedirs(directory, exist_ok=True)
+        for spec in TABLES + (SyncedTable('news_stocks', 'pubDate', NEWS_STOCKS_COLUMNS),):
+            target = "'" + os.path.join(directory, spec.name).replace("'", "''") + "'"
+            self.db.execute(f'''COPY (SELECT *, year({spec.time_column}) AS year, month({spec.time_column}) AS month
+                                      FROM {spec.name})
+                                TO {target} (FORMAT PARQUET, PARTITION_BY (year, month), OVERWRITE_OR_IGNORE)''')
+        target = "'" + os.path.join(directory, 'stock_prices.parquet').replace("'", "''") + "'"
+        self.db.execute(f"COPY stock_prices TO {target} (FORMAT PARQUET)")
+
+    def status(self):
+        """:return: Rows of (table, rows, watermark, synced_at)"""
+        rows = []
+        for name in [spec.name for spec in TABLES] + ['news_stocks', 'stock_prices']:
+            count = self.db.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+            state = self.db.execute("SELECT watermark, synced_at FROM sync_state WHERE table_name = ?",
+                                    [name]).fetchone()
+            rows.append((name, count) + (state or (None, None)))
+        return rows
+
+
+def load_config(path='app.config'):
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+
+def lookbacks_from_config(config):
+    hours = config.getfloat('Analytics', 'news_lookback_hours', fallback=DEFAULT_NEWS_LOOKBACK_HOURS)
+    return {'news_articles': timedelta(hours=hours)}
+
+
+def print_rows(columns, rows, output_format='table'):
+    if output_format == 'json':
+        print(json.dumps([dict(zip(columns, row)) for row in rows], default=str, indent=1))
+        return
+    if output_format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return
+    cells = [[('' if value is None else str(value)) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[index]) for row in cells]) for index, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in cells:
+        print('  '.join(value.rjust(width) if value[:1].isdigit() or value[:1] == '-' else value.ljust(width)
+                        for value, width in zip(row, widths)))
+    print(f"({len(rows)} rows)")
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='DuckDB file (default: [Analytics] path)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync = commands.add_parser('sync', help='copy new rows from MySQL')
+    sync.add_argument('--tables', help='comma separated subset of: ' + ', '.join(spec.name for spec in TABLES))
+    query = commands.add_parser('query', help='run a named query')
+    query.add_argument('name', choices=sorted(QUERIES))
+    query.add_argument('--since', type=parse_date)
+    query.add_argument('--until', type=parse_date)
+    query.add_argument('--index-name')
+    query.add_argument('--stock', type=str.upper)
+    query.add_argument('--horizon-days', type=int)
+    query.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+    sql = commands.add_parser('sql', help='run a SQL statement against the store')
+    sql.add_argument('statement')
+    sql.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+    prices = commands.add_parser('load-prices', help='load daily closes for recommendation_hit_rate')
+    prices.add_argument('file')
+    export = commands.add_parser('export', help='write the tables as Parquet files')
+    export.add_argument('directory')
+    commands.add_parser('status', help='row counts and watermarks')
+    commands.add_parser('queries', help='list the named queries')
+    args = parser.parse_args()
+
+    if args.command == 'queries':
+        for name, definition in sorted(QUERIES.items()):
+            print(f"{name:<26} {definition.description}")
+        return
+
+    config = load_config()
+    path = args.db or config.get('Analytics', 'path', fallback=DEFAULT_PATH)
+    store = AnalyticsStore(path, read_only=args.command in ('query', 'sql', 'status', 'export'))
+    try:
+        if args.command == 'sync':
+            from news_db import get_connection
+
+            source = get_connection()
+            cursor = source.cursor()
+            # Read TIMESTAMPs as UTC whatever the server's time zone
+            cursor.execute("SET time_zone = '+00:00'")
+            started = time.perf_counter()
+            copied = store.sync(source, lookbacks_from_config(config),
+                                config.getint('Analytics', 'batch', fallback=DEFAULT_BATCH),
+                                args.tables.split(',') if args.tables else None)
+            source.close()
+            for table, rows in copied.items():
+                print(f"{table}: {rows:,} rows copied, watermark {store.watermark(table)}")
+            print(f"Synced in {time.perf_counter() - started:.1f}s")
+        elif args.command == 'query':
+            params = {name: value for name, value in (('since', args.since), ('until', args.until),
+                                                      ('index_name', args.index_name), ('stock', args.stock),
+                                                      ('horizon_days', args.horizon_days)) if value is not None}
+            print_rows(*store.query(args.name, **params), output_format=args.format)
+        elif args.command == 'sql':
+            print_rows(*store.sql(args.statement), output_format=args.format)
+        elif args.command == 'load-prices':
+            print(f"Loaded {store.load_prices(args.file):,} daily closes")
+        elif args.command == 'export':
+            store.export(args.directory)
+            print(f"Exported Parquet files to {args.directory}")
+        elif args.command == 'status':
+            print_rows(['table', 'rows', 'watermark', 'synced_at'], store.status())
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+"""
+Versioned JSON read API over the news and max pain data, on aiohttp and aiomysql.
+
+Serves the queries behind /news, /max_pain and /max_pain_new without sessions
+or HTML, for dashboards and bots:
+
+  GET /api/v1/news             date_from, date_to (IST dates), sentiment, recommendation,
+                               stocks=TCS,INFY (any of)
+  GET /api/v1/max_pain         index_name, expiry_date, days (window ending at the newest
+                               snapshot, 0 for all history), sort_by, sort_order
+  GET /api/v1/max_pain/latest  index_name; every row of each index's newest snapshot
+
+Every endpoint takes fields=a,b to select only those columns, limit (default 50,
+at most 500) and offset, and count=1 to add the total. Responses are
+{"data": [{...}, ...], "meta": {...}}, or with format=compact
+{"fields": [...], "rows": [[...], ...], "meta": {...}}. meta holds limit,
+offset, returned, next_offset when there may be more rows, and total. Times are
+ISO 8601 in IST. Requests need "Authorization: Bearer <token>" with a token from
+API_TOKENS. Responses carry an ETag tied to the data version, so pollers get a
+304 until the data changes.
+
+A handful of workers hold thousands of idle or slow connections; only requests
+actually querying take one of API_DB_POOL_SIZE pooled connections per worker.
+
+Run: gunicorn api:create_app --worker-class aiohttp.GunicornWebWorker --workers 4 --bind 0.0.0.0:8081
+     python api.py [--port 8081]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+import metrics
+from config import Config
+from result_rows import IST, IST_OFFSET
+from ttl_cache import TTLCache
+
+API_PREFIX = '/api/v1'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# Seconds a data version is trusted before it is read again
+VERSION_TTL = 5
+# Encoded responses kept per worker, keyed by query and data version
+BODY_CACHE_SIZE = 1000
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+# How far back from the newest snapshot /max_pain/latest looks for each index
+LATEST_LOOKBACK = timedelta(days=7)
+
+NEWS_FIELDS = ('title', 'description', 'link', 'pubDate', 'sentiment', 'recommendation', 'stocks')
+MAX_PAIN_FIELDS = ('record_time', 'expiry_date', 'index_name', 'max_pain', 'max_pain_trend', 'max_pain_price',
+                   'index_price_close')
+MAX_PAIN_SORTS = ('record_time', 'expiry_date', 'index_name', 'max_pain', 'max_pain_price', 'index_price_close')
+TIME_FIELDS = ('pubDate', 'record_time')
+
+POOL = web.AppKey('pool', object)
+TOKENS = web.AppKey('tokens', tuple)
+VERSIONS = web.AppKey('versions', TTLCache)
+BODIES = web.AppKey('bodies', TTLCache)
+
+
+async def create_pool():
+    """aiomysql pool on the news/max pain database, reading times as UTC."""
+    import aiomysql
+    return await aiomysql.create_pool(
+        host=os.getenv('MYSQL_HOST'),
+        port=int(os.getenv('MYSQL_PORT') or 3306),
+        db=os.getenv('MAX_PAIN_DATABASE'),
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD') or '',
+        minsize=1,
+        maxsize=Config.API_DB_POOL_SIZE,
+        autocommit=True,
+        pool_recycle=3600,
+        init_command="SET time_zone = '+00:00'"
+    )
+
+
+async def fetch(request, query, params=()):
+    """Run one query on a pooled connection and return all rows."""
+    async with request.app[POOL].acquire() as conn:
+        async with conn.cursor() as cursor:
+            started = time.perf_counter()
+            await cursor.execute(query, params)
+            rows = await cursor.fetchall()
+            metrics.record_query('api', query, time.perf_counter() - started)
+            return rows
+
+
+def bad_request(message):
+    return web.HTTPBadRequest(text=json.dumps({'error': message}), content_type='application/json')
+
+
+def parse_fields(request, allowed):
+    value = request.query.get('fields')
+    if not value:
+        return allowed
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise bad_request(f"unknown fields: {', '.join(unknown)}; choose from {', '.join(allowed)}")
+    return fields
+
+
+def parse_int(request, name, default, minimum=0, maximum=None):
+    value = request.query.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise bad_request(f"{name} must be an integer")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise bad_request(f"{name} must be between {minimum} and {maximum}" if maximum is not None
+                          else f"{name} must be at least {minimum}")
+    return number
+
+
+def parse_date(request, name):
+    value = request.query.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise bad_request(f"{name} must be YYYY-MM-DD")
+
+
+def parse_list(request, name):
+    return [item.strip() for item in request.query.get(name, '').split(',') if item.strip()]
+
+
+def to_ist(value):
+    """ISO 8601 IST text for a datetime; naive values are UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(IST).isoformat()
+
+
+def encode_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_rows(fields, rows):
+    """Rows as JSON-ready lists, with times in IST and stocks parsed."""
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in fields]
+    for index, field in enumerate(fields):
+        if field in TIME_FIELDS:
+            columns[index] = [to_ist(value) if isinstance(value, datetime) else value for value in columns[index]]
+        elif field == 'stocks':
+            columns[index] = [json.loads(value) if isinstance(value, (str, bytes)) else value
+                              for value in columns[index]]
+    return [list(row) for row in zip(*columns)]
+
+
+def render_body(request, fields, rows, meta):
+    rows = encode_rows(fields, rows)
+    if request.query.get('format') == 'compact':
+        payload = {'fields': list(fields), 'rows': rows, 'meta': meta}
+    else:
+        payload = {'data': [dict(zip(fields, row)) for row in rows], 'meta': meta}
+    return json.dumps(payload, separators=(',', ':'), default=encode_value).encode()
+
+
+def page_meta(limit, offset, returned, total=None):
+    meta = {'limit': limit, 'offset': offset, 'returned': returned}
+    if returned == limit:
+        meta['next_offset'] = offset + limit
+    if total is not None:
+        meta['total'] = total
+    return meta
+
+
+async def cached_response(request, view, version_token, build_body):
+    """
+    JSON response for the request, cached per query and data version.
+
+    :param version_token: Changes whenever the data does; None skips caching
+    :param build_body: Coroutine function producing the encoded body on a miss
+    """
+    if version_token is None:
+        metrics.VIEW_CACHE.inc(view=view, result='bypass')
+        return json_response(request, await build_body())
+
+    query = '&'.join(f'{name}={value}' for name, value in sorted(request.query.items()))
+    key = hashlib.sha1(f'{view}|{query}|{version_token}'.encode('utf-8')).hexdigest()
+    etag = f'W/"{key[:32]}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        metrics.VIEW_CACHE.inc(view=view, result='not_modified')
+        return web.Response(status=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+    body = request.app[BODIES].get(key)
+    metrics.VIEW_CACHE.inc(view=view, result='miss' if body is None else 'hit')
+    if body is None:
+        body = await build_body()
+        request.app[BODIES].put(key, body)
+    response = json_response(request, body)
+    response.headers['ETag'] = etag
+    return response
+
+
+def json_response(request, body):
+    response = web.Response(body=body, content_type='application/json',
+                            headers={'Cache-Control': 'private, no-cache'})
+    if len(body) >= COMPRESS_MIN_BYTES:
+        # gzip or deflate, whichever the client accepts
+        response.enable_compression()
+    return response
+
+
+async def news_version(request):
+    """Version token of news_articles, as bumped by ingestion."""
+    token = request.app[VERSIONS].get('news')
+    if token is None:
+        rows = await fetch(request, "SELECT version FROM data_versions WHERE name = %s", ('news_articles',))
+        token = str(rows[0][0]) if rows else False
+        request.app[VERSIONS].put('news', token)
+    return token or None
+
+
+async def newest_snapshot(request):
+    """record_time of the newest max pain snapshot; it also versions the data, which is append-only."""
+    newest = request.app[VERSIONS].get('max_pain')
+    if newest is None:
+        rows = await fetch(request, "SELECT record_time FROM max_pain_data ORDER BY record_time DESC LIMIT 1")
+        newest = rows[0][0] if rows else False
+        request.app[VERSIONS].put('max_pain', newest)
+    return newest or None
+
+
+async def news(request):
+    fields = parse_fields(request, NEWS_FIELDS)
+    limit = parse_int(request, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = parse_int(request, 'offset', 0)
+    with_total = request.query.get('count') == '1'
+
+    conditions, params = [], []
+    # IST dates to UTC bounds; plain ranges on pubDate prune partitions
+    date_from = parse_date(request, 'date_from')
+    if date_from:
+        conditions.append("pubDate >= %s")
+        params.append((date_from - IST_OFFSET).strftime('%Y-%m-%d %H:%M:%S'))
+    date_to = parse_date(request, 'date_to')
+    if date_to:
+        conditions.append("pubDate < %s")
+        params.append((date_to + timedelta(days=1) - IST_OFFSET).strftime('%Y-%m-%d %H:%M:%S'))
+    for name in ('sentiment', 'recommendation'):
+        if request.query.get(name):
+            conditions.append(f"{name} = %s")
+            params.append(request.query[name].upper())
+    stocks = parse_list(request, 'stocks')
+    if stocks:
+        conditions.append('(' + ' OR '.join(["JSON_CONTAINS(stocks, JSON_OBJECT('code', %s))"] * len(stocks)) + ')')
+        params.extend(stock.upper() for stock in stocks)
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+    async def build_body():
+        rows = await fetch(request, f"SELECT {', '.join(fields)} FROM news_articles{where} "
+                                    "ORDER BY pubDate DESC LIMIT %s OFFSET %s", params + [limit, offset])
+        total = None
+        if with_total:
+            total = (await fetch(request, f"SELECT COUNT(*) FROM news_articles{where}", params))[0][0]
+        return render_body(request, fields, rows, page_meta(limit, offset, len(rows), total))
+
+    return await cached_response(request, 'api.news', await news_version(request), build_body)
+
+
+async def max_pain(request):
+    fields = parse_fields(request, MAX_PAIN_FIELDS)
+    limit = parse_int(request, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = parse_int(request, 'offset', 0)
+    days = parse_int(request, 'days', Config.MAX_PAIN_WINDOW_DAYS)
+    with_total = request.query.get('count') == '1'
+    sort_by = request.query.get('sort_by', 'record_time')
+    sort_order = request.query.get('sort_order', 'desc').lower()
+    if sort_by not in MAX_PAIN_SORTS:
+        raise bad_request(f"sort_by must be one of {', '.join(MAX_PAIN_SORTS)}")
+    if sort_order not in ('asc', 'desc'):
+        raise bad_request("sort_order must be asc or desc")
+
+    newest = await newest_snapshot(request)
+    conditions, params = [], []
+    if days > 0 and newest is not None:
+        # The same window as the max pain views: whole days ending at the newest snapshot
+        conditions.append("record_time >= %s")
+        params.append((datetime(newest.year, newest.month, newest.day) - timedelta(days=days))
+                      .strftime('%Y-%m-%d %H:%M:%S'))
+    for name in ('index_name', 'expiry_date'):
+        if request.query.get(name):
+            conditions.append(f"{name} = %s")
+            params.append(request.query[name])
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+    async def build_body():
+        rows = await fetch(request, f"SELECT {', '.join(fields)} FROM max_pain_data{where} "
+                                    f"ORDER BY {sort_by} {sort_order} LIMIT %s OFFSET %s", params + [limit, offset])
+        total = None
+        if with_total:
+            total = (await fetch(request, f"SELECT COUNT(*) FROM max_pain_data{where}", params))[0][0]
+        return render_body(request, fields, rows, page_meta(limit, offset, len(rows), total))
+
+    version = newest.isoformat() if newest is not None else None
+    return await cached_response(request, 'api.max_pain', version, build_body)
+
+
+async def max_pain_latest(request):
+    fields = parse_fields(request, MAX_PAIN_FIELDS)
+    newest = await newest_snapshot(request)
+    if newest is None:
+        return json_response(request, render_body(request, fields, [], {'returned': 0}))
+    since = (newest - LATEST_LOOKBACK).strftime('%Y-%m-%d %H:%M:%S')
+    index_sql, params = '', [since]
+    if request.query.get('index_name'):
+        index_sql = " AND index_name = %s"
+        params.append(request.query['index_name'])
+
+    async def build_body():
+        # Each index's newest record_time in the lookback, joined back for all its expiries
+        rows = await fetch(request, f'''SELECT {', '.join(f'm.{field}' for field in fields)}
+                                        FROM max_pain_data m
+                                        JOIN (SELECT index_name, MAX(record_time) AS record_time FROM max_pain_data
+                                              WHERE record_time >= %s{index_sql} GROUP BY index_name) latest
+                                          ON m.index_name = latest.index_name AND m.record_time = latest.record_time
+                                        WHERE m.record_time >= %s
+                                        ORDER BY m.index_name, m.expiry_date''', params + [since])
+        return render_body(request, fields, rows, {'returned': len(rows)})
+
+    return await cached_response(request, 'api.max_pain_latest', newest.isoformat(), build_body)
+
+
+def parse_tokens(value):
+    return tuple(token.strip() for token in (value or '').split(',') if token.strip())
+
+
+@web.middleware
+async def require_token(request, handler):
+    if request.path.startswith(API_PREFIX):
+        header = request.headers.get('Authorization', '')
+        token = header[7:].encode('utf-8') if header.startswith('Bearer ') else b''
+        if not token or not any(hmac.compare_digest(token, allowed.encode('utf-8')) for allowed in request.app[TOKENS]):
+            raise web.HTTPUnauthorized(text=json.dumps({'error': 'missing or invalid API token'}),
+                                       content_type='application/json', headers={'WWW-Authenticate': 'Bearer'})
+    return await handler(request)
+
+
+async def create_app(pool_factory=None, tokens=None):
+    """
+    Build the API application; gunicorn's aiohttp worker calls it without arguments.
+
+    :param pool_factory: Coroutine function returning an aiomysql-style pool (default: create_pool)
+    :param tokens: Accepted bearer tokens (default: API_TOKENS)
+    """
+    load_dotenv()
+    app = web.Application()
+    # Registered first so the request timer also covers rejected requests
+    metrics.init_aiohttp_app(app)
+    app.middlewares.append(require_token)
+    app[TOKENS] = tuple(tokens) if tokens is not None else parse_tokens(os.getenv('API_TOKENS', Config.API_TOKENS))
+    if not app[TOKENS]:
+        print("API_TOKENS is not set; every API request will be refused")
+    app[VERSIONS] = TTLCache(ttl=VERSION_TTL, maxsize=16)
+    app[BODIES] = TTLCache(ttl=300, maxsize=BODY_CACHE_SIZE)
+
+    async def pool_context(app):
+        app[POOL] = await (pool_factory or create_pool)()
+        yield
+        app[POOL].close()
+        await app[POOL].wait_closed()
+
+    app.cleanup_ctx.append(pool_context)
+    app.router.add_get(f'{API_PREFIX}/news', news, name='api.news')
+    app.router.add_get(f'{API_PREFIX}/max_pain', max_pain, name='api.max_pain')
+    app.router.add_get(f'{API_PREFIX}/max_pain/latest', max_pain_latest, name='api.max_pain_latest')
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('API_PORT', 8081)))
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
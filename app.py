@@ -1,45 +1,79 @@
-import sqlite3
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+import atexit
+import threading
+import time
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, stream_with_context, make_response
+from flask import session as flask_session
+from markupsafe import Markup
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask_bootstrap import Bootstrap
 from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SubmitField, SelectMultipleField, DateField, SelectField
 from wtforms.validators import DataRequired, NumberRange
 from dotenv import load_dotenv
-from news_fetcher import fetch_news
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from flask_paginate import Pagination, get_page_parameter
-from ExtractNews import extract_and_save_news
 from config import Config
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session, joinedload
 from sqlalchemy import text, asc, desc
-import pytz
-import requests
+from models import db, User, UserConfig, init_database
+import news_db
+from result_rows import materialize_rows
+from news_pubsub import NewsPoller, article_stock_codes
+from stock_alerts import alert_index, install_stock_alerts, send_email
+from ttl_cache import TTLCache
+import metrics
+import assets
+import view_cache
+import data_versions
+import sentiment_aggregates
 import json
-import mysql.connector
-import telegram
-from telegram import Bot, Update
 import asyncio
 
+# Telegram, mysql.connector, requests and the ingestion stack are imported
+# where they are used so that workers and CLI tools start quickly.
+
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-app.config.from_object(Config)
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
+login_manager = LoginManager()
 login_manager.login_view = 'login'
-bootstrap = Bootstrap(app)
-
-# Configure SQLAlchemy for the Max Pain database
-max_pain_db_uri = app.config['MAX_PAIN_SQLALCHEMY_DATABASE_URI']
-max_pain_engine = create_engine(max_pain_db_uri)
-MaxPainSession = sessionmaker(bind=max_pain_engine)
+bootstrap = Bootstrap()
+
+def create_app(config_object=Config):
+    """Build and configure the Flask app. No database or network I/O happens here."""
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    db.init_app(app)
+    login_manager.init_app(app)
+    bootstrap.init_app(app)
+    # Request, SQL and template timings, served on /metrics
+    metrics.init_app(app)
+    # asset_url() helper, /assets and `flask build-assets`
+    assets.init_app(app)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create tables and the default admin user."""
+        init_database()
+
+    return app
+
+app = create_app()
+
+# The Max Pain engine is created on first use rather than at import
+_max_pain_sessionmaker = None
+_max_pain_lock = threading.Lock()
+
+def MaxPainSession():
+    global _max_pain_sessionmaker
+    if _max_pain_sessionmaker is None:
+        with _max_pain_lock:
+            if _max_pain_sessionmaker is None:
+                max_pain_engine = create_engine(app.config['MAX_PAIN_SQLALCHEMY_DATABASE_URI'])
+                _max_pain_sessionmaker = sessionmaker(bind=max_pain_engine)
+    return _max_pain_sessionmaker()
 
 # List of NSE stocks (you should replace this with a complete list)
 NSE_STOCKS = [
@@ -53,37 +87,19 @@ NEWS_SOURCES = [
     'Financial Express', 'NDTV Profit', 'Bloomberg Quint'
 ]
 
-# Models
-class UserConfig(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    risk_tolerance = db.Column(db.Float, nullable=False, default=0.5)
-    investment_horizon = db.Column(db.String(50), nullable=False, default='Medium-term')
-    preferred_sectors = db.Column(db.String(200), nullable=True)
-    selected_stocks = db.Column(db.String(500), nullable=True)
-    selected_news_sources = db.Column(db.String(200), nullable=True)
-
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(64), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
-    is_admin = db.Column(db.Boolean, default=False)
-    is_approved = db.Column(db.Boolean, default=False)
-    config = db.relationship('UserConfig', backref='user', uselist=False, cascade='all, delete-orphan')
-
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-    def get_config(self):
-        if not self.config:
-            self.config = UserConfig(user_id=self.id)
-            db.session.add(self.config)
-            db.session.commit()
-        return self.config
+# Per-process cache of detached User objects (with their config) for load_user
+user_cache = TTLCache(ttl=int(os.getenv('USER_CACHE_TTL', 30)), maxsize=10000)
+
+# Rendered content of /news and the max pain pages, keyed by filters and data version
+fragment_cache = view_cache.backend_from_env()
+# Data versions are re-read at most this often, so cache hits skip the database
+version_cache = TTLCache(ttl=float(os.getenv('VIEW_CACHE_VERSION_TTL', 5)), maxsize=16)
+
+# Articles ingested by any process, for /news/stream; polls only once a stream opens
+news_poller = NewsPoller(interval=float(os.getenv('NEWS_STREAM_POLL_SECONDS', 5)))
+# Each open stream occupies a worker thread, so streams end after this long and
+# the browser reconnects; run gunicorn with gthread or gevent workers for many clients
+NEWS_STREAM_MAX_SECONDS = float(os.getenv('NEWS_STREAM_MAX_SECONDS', 300))
 
 # Forms
 class ConfigForm(FlaskForm):
@@ -113,17 +129,105 @@ class NewsFilterForm(FlaskForm):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    cached = user_cache.get(user_id)
+    if cached is None:
+        # Load in a throwaway session so the cached copy is detached and
+        # never modified by the request that loaded it
+        with Session(db.engine) as session:
+            cached = session.get(User, user_id, options=[joinedload(User.config)])
+        if cached is None:
+            return None
+        user_cache.put(user_id, cached)
+    # Attach a copy to this request's session without a SELECT
+    return db.session.merge(cached, load=False)
 
 # Routes
 @app.route('/')
 def index():
     return render_template('index.html',bootstrap=bootstrap)
 
+# period -> (label, bucket size, number of buckets)
+DASHBOARD_PERIODS = {
+    '48h': ('Last 48 hours', timedelta(hours=1), 48),
+    '7d': ('Last 7 days', timedelta(days=1), 7),
+    '30d': ('Last 30 days', timedelta(days=1), 30),
+    '90d': ('Last 90 days', timedelta(days=1), 90),
+}
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html',bootstrap=bootstrap)
+    period = request.args.get('period', '30d')
+    if period not in DASHBOARD_PERIODS:
+        period = '30d'
+    stocks = current_user.get_config().stock_list
+    _, step, buckets = DASHBOARD_PERIODS[period]
+
+    # Newest bucket: the current IST hour or day
+    newest = sentiment_aggregates.ist_hour(datetime.now(timezone.utc))
+    if step >= timedelta(days=1):
+        newest = day_start(newest)
+    version = news_data_version()
+    if version is not None:
+        # The buckets shown move with the clock as well as with new articles
+        version = data_versions.DataVersion(f'{version.token}:{newest.isoformat()}', version.updated_at)
+    return render_cached_view(
+        'dashboard', version,
+        lambda: render_dashboard_content(stocks, period, [newest - step * i for i in range(buckets - 1, -1, -1)]),
+        'dashboard.html', stocks=stocks, bootstrap=bootstrap
+    )
+
+def render_dashboard_content(stocks, period, buckets):
+    """
+    Heatmap and trend data for the user's stocks, read from the sentiment aggregates.
+
+    :param buckets: Bucket start times, oldest first
+    """
+    hourly = DASHBOARD_PERIODS[period][1] < timedelta(days=1)
+    rows = []
+    if stocks:
+        try:
+            conn = news_db.get_connection()
+            cursor = conn.cursor()
+            if hourly:
+                rows = sentiment_aggregates.read_hourly(cursor, stocks, buckets[0])
+            else:
+                rows = sentiment_aggregates.read_daily(cursor, stocks, buckets[0].date())
+            conn.close()
+        except Exception as e:
+            print(f"Error reading sentiment aggregates: {e}")
+
+    # Same text for DATE/DATETIME values and the bucket starts
+    labels = [str(bucket if hourly else bucket.date())[:16 if hourly else 10] for bucket in buckets]
+    counts = {(row[0], str(row[1])[:16 if hourly else 10]): dict(zip(sentiment_aggregates.COUNT_COLUMNS, row[2:]))
+              for row in rows}
+    heatmap = []
+    trends = []
+    for stock in stocks:
+        cells = []
+        totals = dict.fromkeys(sentiment_aggregates.COUNT_COLUMNS, 0)
+        for label in labels:
+            cell = counts.get((stock, label))
+            score = None
+            if cell and cell['articles']:
+                # -1 all negative .. +1 all positive
+                score = (cell['positive'] - cell['negative']) / cell['articles']
+                for column in totals:
+                    totals[column] += cell[column]
+            cells.append({'label': label, 'score': score, 'counts': cell})
+        heatmap.append({'stock': stock, 'cells': cells, 'totals': totals})
+        trends.append({'label': stock, 'data': [None if cell['score'] is None else round(cell['score'], 3) for cell in cells]})
+
+    return render_template(
+        '_dashboard_content.html',
+        stocks=stocks,
+        period=period,
+        periods=DASHBOARD_PERIODS,
+        labels=labels,
+        heatmap=heatmap,
+        chart_data={'labels': labels, 'datasets': trends}
+    )
 
 @app.route("/webhook", methods=['POST'])
 def webhook():
@@ -134,6 +238,9 @@ def webhook():
             print(f"Received data: {data}")
             
 
+            import telegram
+            from telegram import Bot
+
             # Replace with your bot token
             BOT_TOKEN = os.getenv('telegram_token')
 
@@ -174,12 +281,15 @@ def user_config():
     user_config = current_user.get_config()
     
     if form.validate_on_submit():
+        user_config = current_user.ensure_config()
         user_config.risk_tolerance = form.risk_tolerance.data
         user_config.investment_horizon = form.investment_horizon.data
         user_config.preferred_sectors = form.preferred_sectors.data
         user_config.selected_stocks = ','.join(form.selected_stocks.data)
         user_config.selected_news_sources = ','.join(form.selected_news_sources.data)
         db.session.commit()
+        user_cache.invalidate(current_user.id)
+        alert_index.set_user(current_user.id, current_user.email, user_config.selected_stocks)
         flash('Your configuration has been updated.', 'success')
         return redirect(url_for('user_config'))
     
@@ -187,8 +297,8 @@ def user_config():
         form.risk_tolerance.data = user_config.risk_tolerance
         form.investment_horizon.data = user_config.investment_horizon
         form.preferred_sectors.data = user_config.preferred_sectors
-        form.selected_stocks.data = user_config.selected_stocks.split(',') if user_config.selected_stocks else []
-        form.selected_news_sources.data = user_config.selected_news_sources.split(',') if user_config.selected_news_sources else []
+        form.selected_stocks.data = list(user_config.stock_list)
+        form.selected_news_sources.data = list(user_config.news_source_list)
     
     return render_template('user_config.html', form=form,bootstrap=bootstrap)
 
@@ -230,6 +340,8 @@ def register():
         else:
             new_user = User(username=username, email=email)
             new_user.set_password(password)
+            # Create the config up front so page views never have to
+            new_user.config = UserConfig()
             db.session.add(new_user)
             db.session.commit()
             flash('Registration successful. Please wait for admin approval.', 'success')
@@ -261,6 +373,8 @@ def approve_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_approved = True
     db.session.commit()
+    user_cache.invalidate(user.id)
+    alert_index.set_user(user.id, user.email, user.config.selected_stocks if user.config else None)
     flash(f'User {user.username} has been approved.', 'success')
     
     # Send approval email
@@ -269,6 +383,84 @@ def approve_user(user_id):
     
     return redirect(url_for('admin'))
 
+def news_data_version():
+    """Version of news_articles, bumped by ingestion; None disables caching."""
+    version = version_cache.get('news')
+    if version is None:
+        try:
+            conn = news_db.get_connection()
+            cursor = conn.cursor()
+            version = data_versions.read(cursor, data_versions.NEWS_ARTICLES)
+            conn.close()
+        except Exception as e:
+            print(f"Error reading news data version: {e}")
+        # False remembers "no version yet" for the TTL instead of asking again
+        version_cache.put('news', version or False)
+    return version or None
+
+def max_pain_data_version():
+    """Version of max_pain_data, taken from its newest snapshot; None disables caching."""
+    version = version_cache.get('max_pain')
+    if version is None:
+        # Snapshots are only ever appended, so the newest record_time identifies the data
+        session = MaxPainSession()
+        try:
+            latest = session.execute(text("SELECT record_time FROM max_pain_data ORDER BY record_time DESC LIMIT 1")).scalar()
+        except Exception as e:
+            print(f"Error reading max pain data version: {e}")
+            latest = None
+        finally:
+            session.close()
+        version = data_versions.DataVersion(latest.isoformat(), latest) if latest else None
+        version_cache.put('max_pain', version or False)
+    return version or None
+
+# (days, label) choices for the max pain views' time window; 0 is all history
+MAX_PAIN_WINDOWS = ((7, 'Last 7 days'), (30, 'Last 30 days'), (90, 'Last 90 days'), (365, 'Last year'), (0, 'All history'))
+
+def max_pain_window_start(version, days):
+    """
+    Oldest record_time the max pain views show, or None for all history.
+
+    The window ends at the newest snapshot rather than today, so it is never
+    empty when snapshots stop, and starts at midnight so it only moves daily.
+    """
+    if days <= 0:
+        return None
+    newest = version.updated_at if version else datetime.now()
+    return day_start(newest) - timedelta(days=days)
+
+def render_cached_view(view, version, render_content, page_template, stocks=(), **context):
+    """
+    Render page_template around view content cached per filters and data version.
+
+    :param view: View name, part of the cache key
+    :param version: DataVersion of the data shown, or None to skip caching
+    :param render_content: Runs the queries and renders the content on a miss
+    :param page_template: Page whose content block shows the cached HTML
+    :param stocks: The user's effective stock filter, part of the cache key
+    :return: Response, or a 304 when the browser's copy is current
+    """
+    if version is None:
+        metrics.VIEW_CACHE.inc(view=view, result='bypass')
+        return render_template(page_template, content=Markup(render_content()), **context)
+
+    key = view_cache.fragment_key(view, request.args, stocks, version.token)
+    etag = view_cache.make_etag(key, current_user.id)
+    # Pending flash messages are part of the page, so it has to be sent in full
+    if '_flashes' not in flask_session and view_cache.is_fresh(request, etag, version.updated_at):
+        metrics.VIEW_CACHE.inc(view=view, result='not_modified')
+        return view_cache.add_validators(make_response('', 304), etag, version.updated_at)
+
+    content = fragment_cache.get(key) if fragment_cache is not None else None
+    metrics.VIEW_CACHE.inc(view=view, result='miss' if content is None else 'hit')
+    if content is None:
+        content = render_content()
+        if fragment_cache is not None:
+            fragment_cache.set(key, content)
+    response = make_response(render_template(page_template, content=Markup(content), **context))
+    return view_cache.add_validators(response, etag, version.updated_at)
+
 @app.route('/news', methods=['GET'])
 @login_required
 def news():
@@ -298,9 +490,24 @@ def news():
         form.stocks.data = selected_stocks
     elif not form.stocks.data:
         user_config = current_user.get_config()
-        if user_config.selected_stocks:
-            form.stocks.data = user_config.selected_stocks.split(',')
+        if user_config.stock_list:
+            form.stocks.data = list(user_config.stock_list)
+
+    version = news_data_version()
+    if version is not None:
+        # Without date arguments the range is the last 7 days, which moves with the clock
+        effective = f'{form.date_from.data:%Y-%m-%d}:{form.date_to.data:%Y-%m-%d}'
+        version = data_versions.DataVersion(f'{version.token}:{effective}', version.updated_at)
+    return render_cached_view(
+        'news', version, lambda: render_news_content(form, page, per_page),
+        'news.html', stocks=form.stocks.data, page=page, bootstrap=bootstrap
+    )
+
+def day_start(value):
+    """Midnight at the start of a date or datetime's day."""
+    return datetime(value.year, value.month, value.day)
 
+def render_news_content(form, page, per_page):
     # Build the SQL query dynamically
     query = """
         SELECT title, description, link, pubDate, sentiment, recommendation, stocks 
@@ -317,12 +524,13 @@ def news():
 
     # Add filters to both queries
     filter_conditions = []
+    # Plain ranges on pubDate, so MySQL prunes to the months they cover
     if form.date_from.data:
-        filter_conditions.append("date(pubDate) >= date(%s)")
-        params.append(form.date_from.data.isoformat())
+        filter_conditions.append("pubDate >= %s")
+        params.append(day_start(form.date_from.data).strftime('%Y-%m-%d %H:%M:%S'))
     if form.date_to.data:
-        filter_conditions.append("date(pubDate) <= date(%s)")
-        params.append(form.date_to.data.isoformat())
+        filter_conditions.append("pubDate < %s")
+        params.append((day_start(form.date_to.data) + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'))
     if form.sentiment.data:
         filter_conditions.append("sentiment = %s")
         params.append(form.sentiment.data)
@@ -341,13 +549,7 @@ def news():
     pagination_params.extend([per_page, (page - 1) * per_page])
 
     # Connect to the database
-    conn = mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST'),
-        port=os.getenv('MYSQL_PORT'),
-        database=os.getenv('MAX_PAIN_DATABASE'),
-        user=os.getenv('MYSQL_USER'),
-        password=os.getenv('MYSQL_PASSWORD')
-    )
+    conn = news_db.get_connection()
     cursor = conn.cursor()
     
     # Get total count
@@ -361,7 +563,6 @@ def news():
     
     # Process the articles
     processed_articles = []
-    selected_stocks = form.stocks.data if form.stocks.data else []
     
     for article in articles:
         try:
@@ -392,11 +593,52 @@ def news():
     )
     
     return render_template(
-        'news.html',
+        '_news_content.html',
         articles=processed_articles,
         form=form,
         pagination=pagination,
-        page=page,bootstrap=bootstrap
+        page=page
+    )
+
+@app.route('/news/stream', methods=['GET'])
+@login_required
+def news_stream():
+    # Apply the same filters as the page the client is looking at
+    sentiment = request.args.get('sentiment')
+    recommendation = request.args.get('recommendation')
+    selected_stocks = request.args.getlist('stocks')
+    if not selected_stocks:
+        selected_stocks = current_user.get_config().stock_list
+    wanted_stocks = {stock.upper() for stock in selected_stocks}
+
+    # Sent back by EventSource on reconnect, to replay what arrived in between
+    subscription = news_poller.subscribe(request.headers.get('Last-Event-ID'))
+    deadline = time.monotonic() + NEWS_STREAM_MAX_SECONDS
+
+    def generate():
+        with subscription:
+            yield 'retry: 5000\n\n'
+            while time.monotonic() < deadline:
+                article = subscription.get(timeout=max(0.1, min(15, deadline - time.monotonic())))
+                if article is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                if sentiment and article['sentiment'] != sentiment:
+                    continue
+                if recommendation and article['recommendation'] != recommendation:
+                    continue
+                if wanted_stocks and not wanted_stocks & article_stock_codes(article):
+                    continue
+                card = render_template('_news_card.html', article=dict(
+                    article, pubDate=article['pubDate'].strftime('%B %d, %Y %I:%M %p')))
+                payload = json.dumps({'link': article['link'], 'html': card})
+                yield f'id: {article["event_id"]}\nevent: article\ndata: {payload}\n\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
 
 @app.route('/decline_user/<int:user_id>')
@@ -416,6 +658,8 @@ def decline_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
+        alert_index.remove_user(user_id)
         flash(f'User {user.username} has been declined and removed from the system.', 'success')
     
     return redirect(url_for('admin'))
@@ -437,22 +681,12 @@ def remove_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
+        alert_index.remove_user(user_id)
         flash(f'User {user.username} has been removed from the system.', 'success')
     
     return redirect(url_for('admin'))
 
-def send_email(to, subject, template):
-    MAILGUN_API_KEY = os.getenv('MAILGUN_API_KEY')
-    MAILGUN_DOMAIN = os.getenv('MAILGUN_DOMAIN')
-    MAILGUN_FROM = os.getenv('MAILGUN_FROM')
-    return requests.post(
-        f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages",
-        auth=("api", MAILGUN_API_KEY),
-        data={"from": MAILGUN_FROM,
-              "to": to,
-              "subject": subject,
-              "html": template})
-
 # Add a route for password change
 @app.route('/change_password', methods=['GET', 'POST'])
 @login_required
@@ -463,6 +697,7 @@ def change_password():
         if current_user.check_password(old_password):
             current_user.set_password(new_password)
             db.session.commit()
+            user_cache.invalidate(current_user.id)
             flash('Your password has been updated.', 'success')
             
             # Send password change alert
@@ -487,18 +722,31 @@ def max_pain():
 
     # Get filter and search parameters
     search_query = request.args.getlist('search')
+    days = request.args.get('days', type=int, default=app.config['MAX_PAIN_WINDOW_DAYS'])
+
+    version = max_pain_data_version()
+    since = max_pain_window_start(version, days)
+    return render_cached_view(
+        'max_pain', version,
+        lambda: render_max_pain_content(page, per_page, sort_by, sort_order, search_query, days, since),
+        'max_pain.html', bootstrap=bootstrap
+    )
 
+def render_max_pain_content(page, per_page, sort_by, sort_order, search_query, days, since):
     # Fetch Max Pain data from the Max Pain database
     session = MaxPainSession()
 
+    # A plain range on record_time lets MySQL read only the window's partitions
+    window_sql = " AND record_time >= :since" if since else ""
+    params = {'since': since} if since else {}
+
     # Fetch unique index names for the dropdown
-    unique_index_names = session.execute(text("SELECT DISTINCT index_name FROM max_pain_data")).fetchall()
+    unique_index_names = session.execute(text("SELECT DISTINCT index_name FROM max_pain_data WHERE 1=1" + window_sql), params).fetchall()
     unique_index_names = [row[0] for row in unique_index_names]
 
-    # Build the base query
-    base_query = "SELECT * FROM max_pain_data WHERE 1=1"
-    count_query = "SELECT COUNT(*) FROM max_pain_data WHERE 1=1"
-    params = {}
+    # Build the base query from only the columns the table shows
+    base_query = "SELECT record_time, expiry_date, index_name, max_pain FROM max_pain_data WHERE 1=1" + window_sql
+    count_query = "SELECT COUNT(*) FROM max_pain_data WHERE 1=1" + window_sql
 
     if search_query:
         base_query += " AND index_name IN :search_query"
@@ -513,19 +761,10 @@ def max_pain():
     total = session.execute(text(count_query), params).scalar()
 
     # Execute the base query with pagination
-    result = session.execute(text(base_query), params).fetchall()
-
-    # Convert rows to dictionaries and convert record_time to IST
-    max_pain_data = []
-    utc = pytz.utc
-    ist = pytz.timezone('Asia/Kolkata')
-    for row in result:
-        row_dict = dict(row._mapping)
-        if 'record_time' in row_dict:
-            utc_time = utc.localize(row_dict['record_time'])
-            ist_time = utc_time.astimezone(ist)
-            row_dict['record_time'] = ist_time.strftime('%Y-%m-%d %H:%M:%S')
-        max_pain_data.append(row_dict)
+    result = session.execute(text(base_query), params)
+
+    # Materialize rows with record_time converted to IST in one pass
+    max_pain_data = materialize_rows(result, row_name='MaxPainRow')
     session.close()
 
     # Create pagination object
@@ -538,13 +777,15 @@ def max_pain():
     )
 
     return render_template(
-        'max_pain.html',
+        '_max_pain_content.html',
         max_pain_data=max_pain_data,
         pagination=pagination,
         sort_by=sort_by,
         sort_order=sort_order,
         search_query=search_query,
-        unique_index_names=unique_index_names,bootstrap=bootstrap
+        unique_index_names=unique_index_names,
+        days=days,
+        windows=MAX_PAIN_WINDOWS
     )
 
 @app.route('/max_pain_new', methods=['GET'])
@@ -561,24 +802,41 @@ def max_pain_new():
     # Get filter and search parameters
     index_name_filter = request.args.get('index_name', '')
     expiry_date_filter = request.args.get('expiry_date', '')
+    days = request.args.get('days', type=int, default=app.config['MAX_PAIN_WINDOW_DAYS'])
+
+    version = max_pain_data_version()
+    since = max_pain_window_start(version, days)
+    return render_cached_view(
+        'max_pain_new', version,
+        lambda: render_max_pain_new_content(page, per_page, sort_by, sort_order, index_name_filter,
+                                            expiry_date_filter, days, since),
+        'max_pain_new.html', index_name_filter=index_name_filter
+    )
 
+def render_max_pain_new_content(page, per_page, sort_by, sort_order, index_name_filter, expiry_date_filter, days, since):
     # Fetch Max Pain data from the Max Pain database
     session = MaxPainSession()
 
+    # A plain range on record_time lets MySQL read only the window's partitions
+    window_sql = " AND record_time >= :since" if since else ""
+    params = {'since': since} if since else {}
+
     # Fetch unique index names for the tabs
-    unique_index_names = session.execute(text("SELECT DISTINCT index_name FROM max_pain_data")).fetchall()
+    unique_index_names = session.execute(text("SELECT DISTINCT index_name FROM max_pain_data WHERE 1=1" + window_sql), params).fetchall()
     unique_index_names = [row[0] for row in unique_index_names]
 
     # Fetch unique expiry dates for the selected index
     expiry_dates = []
     if index_name_filter:
-        result = session.execute(text("SELECT DISTINCT expiry_date FROM max_pain_data WHERE index_name = :index_name ORDER BY expiry_date"), {'index_name': index_name_filter}).fetchall()
+        result = session.execute(text("SELECT DISTINCT expiry_date FROM max_pain_data WHERE index_name = :index_name" + window_sql + " ORDER BY expiry_date"), {'index_name': index_name_filter, **params}).fetchall()
         expiry_dates = [row[0] for row in result]
 
     # Build the base query with filters
-    base_query = "SELECT * FROM max_pain_data WHERE 1=1"
-    count_query = "SELECT COUNT(*) FROM max_pain_data WHERE 1=1"
-    params = {}
+    base_query = """
+        SELECT record_time, max_pain_trend, max_pain_price, index_price_close, expiry_date, index_name
+        FROM max_pain_data WHERE 1=1
+    """ + window_sql
+    count_query = "SELECT COUNT(*) FROM max_pain_data WHERE 1=1" + window_sql
 
     if index_name_filter:
         base_query += " AND index_name = :index_name"
@@ -598,19 +856,10 @@ def max_pain_new():
     total_filtered = session.execute(text(count_query), params).scalar()
 
     # Execute the base query with pagination
-    result = session.execute(text(base_query), params).fetchall()
-
-    # Convert rows to dictionaries and convert record_time to IST
-    max_pain_data = []
-    utc = pytz.utc
-    ist = pytz.timezone('Asia/Kolkata')
-    for row in result:
-        row_dict = dict(row._mapping)
-        if 'record_time' in row_dict:
-            utc_time = utc.localize(row_dict['record_time'])
-            ist_time = utc_time.astimezone(ist)
-            row_dict['record_time'] = ist_time.strftime('%Y-%m-%d %H:%M:%S')
-        max_pain_data.append(row_dict)
+    result = session.execute(text(base_query), params)
+
+    # Materialize rows with record_time converted to IST in one pass
+    max_pain_data = materialize_rows(result, row_name='MaxPainRow')
     session.close()
 
     # Create pagination object
@@ -623,7 +872,7 @@ def max_pain_new():
     )
 
     return render_template(
-        'max_pain_new.html',
+        '_max_pain_new_content.html',
         max_pain_data=max_pain_data,
         pagination=pagination,
         sort_by=sort_by,
@@ -632,33 +881,35 @@ def max_pain_new():
         expiry_date_filter=expiry_date_filter,
         unique_index_names=unique_index_names,
         expiry_dates=expiry_dates,
-        total_filtered=total_filtered
+        total_filtered=total_filtered,
+        days=days,
+        windows=MAX_PAIN_WINDOWS
     )
 
-# Create the database tables
-with app.app_context():
-    db.create_all()
-    # Create an admin user if it doesn't exist
-    admin = User.query.filter_by(username=os.getenv('ADMIN_USERNAME')).first()
-    if not admin:
-        admin = User(
-            username=os.getenv('ADMIN_USERNAME'),
-            email=os.getenv('ADMIN_EMAIL'),
-            is_approved=True,
-            is_admin=True
-        )
-        admin.set_password(os.getenv('ADMIN_PASSWORD'))
-        db.session.add(admin)
-        db.session.commit()
-        print("Default admin user created.")
-    else:
-        print("Admin user already exists.")
+def start_news_extraction():
+    # Only the ingesting process needs the scraping/LLM stack and the alert index
+    from ingest_scheduler import IngestScheduler
+    install_stock_alerts()
+    scheduler = IngestScheduler()
+    scheduler.start()
+    # Let the article in flight commit and checkpoint before the worker exits
+    atexit.register(scheduler.stop, 30)
+    return scheduler
+
+news_thread = None
+_news_thread_lock = threading.Lock()
+
+@app.before_request
+def start_news_extraction_once():
+    # Started from the first request rather than at import, so it runs in each
+    # forked worker; the MySQL ingest lock keeps only one of them ingesting
+    global news_thread
+    if news_thread is None and os.getenv('NEWS_INGEST_ENABLED', '').lower() in ('1', 'true', 'yes'):
+        with _news_thread_lock:
+            if news_thread is None:
+                news_thread = start_news_extraction()
 
-# Add this near the start of your app initialization
-#news_thread = start_news_extraction()
-#start_news_extraction()
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_database()
     app.run(host='0.0.0.0',port=int(os.getenv('APP_PORT', 5000)))
-
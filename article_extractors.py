@@ -0,0 +1,161 @@
+import re
+from urllib.parse import urlparse
+
+import lxml.html
+from lxml import etree
+
+# Domain suffix -> extractor(tree) returning article text or None
+EXTRACTORS = {}
+
+# Elements that never hold article text
+NOISE_TAGS = ('script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form',
+              'iframe', 'svg', 'button', 'figure', 'template')
+NOISE_PATTERN = re.compile(
+    r'comment|share|social|related|advert|\bad[s_-]|promo|sponsor|sidebar|menu|breadcrumb|'
+    r'footer|header|subscribe|newsletter|popup|modal|cookie|banner|widget|recommend',
+    re.IGNORECASE
+)
+# Paragraph-like blocks the generic extractor scores
+TEXT_BLOCKS = ('p', 'li', 'h2', 'h3', 'blockquote', 'pre')
+MIN_BLOCK_LENGTH = 25
+
+
+def register_extractor(*domains):
+    """
+    Register an extractor for one or more domains.
+
+    A domain also matches its subdomains, so 'moneycontrol.com' covers
+    'www.moneycontrol.com'. The extractor receives the parsed lxml tree and
+    returns the article text, or None to fall back to the generic extractor.
+    """
+    def decorator(func):
+        for domain in domains:
+            EXTRACTORS[domain.lower()] = func
+        return func
+    return decorator
+
+
+def find_extractor(url):
+    host = urlparse(url).netloc.lower().split(':')[0]
+    while host:
+        if host in EXTRACTORS:
+            return EXTRACTORS[host]
+        _, _, host = host.partition('.')
+    return None
+
+
+def parse_html(html):
+    if isinstance(html, str):
+        # lxml refuses str input that carries an XML encoding declaration
+        html = html.encode('utf-8')
+    parser = lxml.html.HTMLParser(remove_comments=True, remove_pis=True, encoding='utf-8')
+    return lxml.html.document_fromstring(html, parser=parser)
+
+
+def element_text(element):
+    """Whitespace-normalised text of an element and its descendants."""
+    return ' '.join(' '.join(element.itertext()).split())
+
+
+def class_xpath(tag, class_name):
+    """XPath for <tag> elements whose class attribute contains class_name as a whole word."""
+    return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+def extract_text(html, url):
+    """
+    Extract the article body text from a page.
+
+    :param html: Page HTML as str or bytes
+    :param url: Page URL, used to pick a domain-specific extractor
+    :return: Article text, '' if nothing usable was found
+    """
+    if not html:
+        return ""
+    try:
+        tree = parse_html(html)
+    except (etree.ParserError, ValueError):
+        return ""
+    extractor = find_extractor(url)
+    if extractor is not None:
+        text = extractor(tree)
+        if text:
+            return text
+    return extract_main_content(tree)
+
+
+@register_extractor('moneycontrol.com')
+def extract_moneycontrol(tree):
+    nodes = tree.xpath(class_xpath('div', 'content_wrapper'))
+    return element_text(nodes[0]) if nodes else None
+
+
+@register_extractor('economictimes.indiatimes.com')
+def extract_economic_times(tree):
+    nodes = tree.xpath(class_xpath('main', 'clr') + "[contains(concat(' ', normalize-space(@class), ' '), ' customclr ')]")
+    if not nodes:
+        return None
+    for node in nodes:
+        # Images and inline links are course promos and related-story teasers
+        for sub_node in node.xpath('.//img | .//a'):
+            sub_node.drop_tree()
+    return ' '.join(element_text(node) for node in nodes)
+
+
+def _strip_noise(tree):
+    for node in tree.xpath('//' + ' | //'.join(NOISE_TAGS)):
+        node.drop_tree()
+    for node in tree.xpath('//*[@class or @id]'):
+        marker = f"{node.get('class', '')} {node.get('id', '')}"
+        # Never drop the document skeleton, only blocks inside it
+        if node.tag not in ('html', 'body', 'article', 'main') and NOISE_PATTERN.search(marker):
+            node.drop_tree()
+
+
+def extract_main_content(tree):
+    """
+    Readability-style fallback: keep the container holding the most paragraph text.
+
+    Each text block scores its length for its parent and half of it for its
+    grandparent. The best container's blocks are returned in document order.
+    """
+    _strip_noise(tree)
+    scores = {}
+    for block in tree.iter(*TEXT_BLOCKS):
+        length = len(element_text(block))
+        if length < MIN_BLOCK_LENGTH:
+            continue
+        # Link-heavy blocks are menus and teaser lists
+        link_length = sum(len(element_text(link)) for link in block.iter('a'))
+        length -= 2 * link_length
+        if length <= 0:
+            continue
+        parent = block.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + length
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + length / 2
+
+    if not scores:
+        body = tree.find('body')
+        return element_text(body if body is not None else tree)
+
+    best = max(scores, key=scores.get)
+    blocks = []
+    for block in best.iter(*TEXT_BLOCKS):
+        # A <p> inside an <li> is already part of the list item's text
+        if any(ancestor.tag in TEXT_BLOCKS for ancestor in _ancestors_below(block, best)):
+            continue
+        text = element_text(block)
+        if len(text) >= MIN_BLOCK_LENGTH:
+            blocks.append(text)
+    return '\n'.join(blocks)
+
+
+def _ancestors_below(element, top):
+    parent = element.getparent()
+    while parent is not None and parent is not top:
+        yield parent
+        parent = parent.getparent()
@@ -0,0 +1,185 @@
+import hashlib
+import threading
+import zlib
+
+CODECS = ('zlib', 'zstd')
+DEFAULT_CODEC = 'zlib'
+DEFAULT_LEVEL = 6
+# zstd's recommended dictionary size; larger gains little for news text
+DICTIONARY_SIZE = 112 * 1024
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("codec zstd needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def link_hash(link):
+    """Fixed-width key for a link: hex SHA-1."""
+    return hashlib.sha1(link.encode('utf-8')).hexdigest()
+
+
+def ensure_schema(cursor):
+    # Bodies live outside news_articles so listing queries never read them
+    cursor.execute('''CREATE TABLE IF NOT EXISTS article_bodies
+                      (link_hash CHAR(40) PRIMARY KEY, codec VARCHAR(16) NOT NULL, dictionary_id INT,
+                       raw_size INT NOT NULL, body LONGBLOB NOT NULL)''')
+    # Partitioned, news_articles can only have unique keys that include pubDate,
+    # so this unpartitioned table is what keeps links unique
+    cursor.execute("CREATE TABLE IF NOT EXISTS news_links (link_hash CHAR(40) PRIMARY KEY)")
+
+
+def claim_link(cursor, link):
+    """
+    Register a link in the transaction that inserts its article.
+
+    A concurrent transaction claiming the same link waits for this one, then
+    finds it taken.
+
+    :return: False if the link was already stored
+    """
+    cursor.execute("INSERT IGNORE INTO news_links (link_hash) VALUES (%s)", (link_hash(link),))
+    return cursor.rowcount > 0
+
+
+def backfill_links(cursor):
+    """Register every stored article's link; run once on tables created before news_links."""
+    cursor.execute("INSERT IGNORE INTO news_links (link_hash) SELECT SHA1(link) FROM news_articles")
+    return cursor.rowcount
+
+
+def ensure_dictionary_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS article_dictionaries
+                      (id INT AUTO_INCREMENT PRIMARY KEY, codec VARCHAR(16) NOT NULL,
+                       data LONGBLOB NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def compress(text, codec=DEFAULT_CODEC, level=DEFAULT_LEVEL, dictionary=None):
+    data = text.encode('utf-8')
+    if codec == 'zlib':
+        return zlib.compress(data, level)
+    if codec == 'zstd':
+        zstandard = _zstd()
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdCompressor(level=level, dict_data=dict_data).compress(data)
+    raise ValueError(f"Unknown article codec: {codec}")
+
+
+def decompress(blob, codec, dictionary=None):
+    if codec == 'zlib':
+        return zlib.decompress(blob).decode('utf-8')
+    if codec == 'zstd':
+        zstandard = _zstd()
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(blob).decode('utf-8')
+    raise ValueError(f"Unknown article codec: {codec}")
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Train a zstd dictionary on sample article bodies.
+
+    :param samples: List of article texts, a few hundred or more
+    :return: Dictionary bytes
+    """
+    zstandard = _zstd()
+    return zstandard.train_dictionary(size, [text.encode('utf-8') for text in samples]).as_bytes()
+
+
+def save_dictionary(cursor, data, codec='zstd'):
+    """Store a trained dictionary and return its id."""
+    ensure_dictionary_schema(cursor)
+    cursor.execute("INSERT INTO article_dictionaries (codec, data) VALUES (%s, %s)", (codec, data))
+    return cursor.lastrowid
+
+
+class ArticleStore:
+    """
+    Compressed article bodies keyed by link.
+
+    With use_dictionary the newest trained zstd dictionary is used for new
+    bodies; every row records its dictionary so older ones still decompress.
+    """
+
+    def __init__(self, codec=DEFAULT_CODEC, level=DEFAULT_LEVEL, use_dictionary=False):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown article codec: {codec}")
+        if codec == 'zstd':
+            _zstd()
+        self.codec = codec
+        self.level = level
+        self.use_dictionary = use_dictionary and codec == 'zstd'
+        self._dictionaries = {}
+        self._current_dictionary = None
+        self._lock = threading.Lock()
+
+    def _dictionary(self, cursor, dictionary_id):
+        with self._lock:
+            if dictionary_id not in self._dictionaries:
+                cursor.execute("SELECT data FROM article_dictionaries WHERE id = %s", (dictionary_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise LookupError(f"Article dictionary {dictionary_id} not found")
+                self._dictionaries[dictionary_id] = bytes(row[0])
+            return self._dictionaries[dictionary_id]
+
+    def _newest_dictionary_id(self, cursor):
+        if self._current_dictionary is None:
+            cursor.execute("SELECT MAX(id) FROM article_dictionaries WHERE codec = %s", (self.codec,))
+            row = cursor.fetchone()
+            # 0 remembers that there is none
+            self._current_dictionary = row[0] if row and row[0] else 0
+        return self._current_dictionary or None
+
+    def save(self, cursor, link, text):
+        """Compress and store an article body; replaces any earlier body for the link."""
+        dictionary_id = self._newest_dictionary_id(cursor) if self.use_dictionary else None
+        dictionary = self._dictionary(cursor, dictionary_id) if dictionary_id else None
+        text = text or ''
+        blob = compress(text, self.codec, self.level, dictionary)
+        cursor.execute('''REPLACE INTO article_bodies (link_hash, codec, dictionary_id, raw_size, body)
+                          VALUES (%s, %s, %s, %s, %s)''',
+                       (link_hash(link), self.codec, dictionary_id, len(text.encode('utf-8')), blob))
+
+    def load(self, cursor, link):
+        """
+        Fetch and decompress one article body.
+
+        :return: The article text, or None if no body is stored for the link
+        """
+        cursor.execute("SELECT codec, dictionary_id, body FROM article_bodies WHERE link_hash = %s",
+                       (link_hash(link),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return self.decode(cursor, *row)
+
+    def decode(self, cursor, codec, dictionary_id, blob):
+        """Decompress a body read from article_bodies; cursor is only used to fetch its dictionary."""
+        dictionary = self._dictionary(cursor, dictionary_id) if dictionary_id else None
+        return decompress(bytes(blob), codec, dictionary)
+
+    def load_dictionaries(self, cursor):
+        """Cache every dictionary stored bodies use, so decode() needs no queries."""
+        cursor.execute("SELECT DISTINCT dictionary_id FROM article_bodies WHERE dictionary_id IS NOT NULL")
+        for (dictionary_id,) in cursor.fetchall():
+            self._dictionary(cursor, dictionary_id)
+
+
+def store_from_config(config):
+    """
+    Build an ArticleStore from the [Storage] section of app.config.
+
+    :param config: ConfigParser, or None for defaults
+    """
+    if config is None or not config.has_section('Storage'):
+        return ArticleStore()
+    section = config['Storage']
+    return ArticleStore(
+        codec=section.get('article_codec', DEFAULT_CODEC),
+        level=section.getint('article_level', DEFAULT_LEVEL),
+        use_dictionary=section.getboolean('article_dictionary', False)
+    )
@@ -0,0 +1,296 @@
+"""
+Static asset pipeline: fingerprinted, precompressed files served with immutable caching.
+
+`flask build-assets` (or `python assets.py`) copies static/ into static/dist/:
+CSS is purged of rules for classes no template uses, every file gets a content
+hash in its name, gzip and (when the brotli package is installed) brotli
+variants are written next to it, and manifest.json maps logical names to the
+built files. Templates link assets with {{ asset_url('bootstrap.min.css') }}.
+
+/assets/<file> serves the built files with the best encoding the client
+accepts and a one year immutable Cache-Control, so browsers fetch each version
+once. A front-end proxy can serve static/dist directly (nginx gzip_static /
+brotli_static) and keep the traffic off the app workers entirely.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.ico', '.map')
+_SUFFIXES = {'gzip': 'gz', 'br': 'br'}
+# Keep a compressed variant only when it saves at least this much
+MIN_SAVING = 0.1
+ONE_YEAR = 365 * 24 * 3600
+
+# Classes that only appear in generated markup (flask_paginate) or are added
+# by script at runtime
+SAFELIST = {
+    'pagination', 'page-item', 'page-link', 'active', 'disabled',
+    'show', 'showing', 'hiding', 'fade', 'collapse', 'collapsing', 'collapsed',
+    'was-validated', 'is-valid', 'is-invalid',
+}
+
+_CLASS_OR_ID = re.compile(r'[.#](-?[_a-zA-Z][\w-]*)')
+_TOKEN = re.compile(r'[A-Za-z][\w-]*')
+# Attribute values and :not() arguments do not require the class to be used
+_IGNORED_PARTS = re.compile(r'\[[^\]]*\]|:not\([^)]*\)')
+# At-rules whose blocks hold declarations or keyframes rather than rules
+_OPAQUE_AT_RULES = ('@font-face', '@keyframes', '@-webkit-keyframes', '@page', '@counter-style')
+
+
+def content_tokens(paths):
+    """Every word-like token in the given files: a superset of the classes in use."""
+    tokens = set(SAFELIST)
+    for path in paths:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            tokens.update(_TOKEN.findall(f.read()))
+    return tokens
+
+
+def content_paths(root=ROOT, static_dir=STATIC_DIR):
+    """Templates, app modules and scripts: everywhere a class name can come from."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root, 'templates')):
+        paths.extend(os.path.join(dirpath, name) for name in filenames if name.endswith('.html'))
+    paths.extend(os.path.join(root, name) for name in os.listdir(root) if name.endswith('.py'))
+    # Scripts toggle classes at runtime (show, collapsing, modal-open, ...)
+    paths.extend(os.path.join(static_dir, name) for name in source_files(static_dir) if name.endswith('.js'))
+    return paths
+
+
+def _split_blocks(css):
+    """Yield (prelude, body) for each top-level block, and (text, None) for statements and comments."""
+    index, length = 0, len(css)
+    while index < length:
+        if css.startswith('/*', index):
+            end = css.find('*/', index + 2)
+            end = length if end == -1 else end + 2
+            yield css[index:end], None
+            index = end
+            continue
+        brace = css.find('{', index)
+        semicolon = css.find(';', index)
+        comment = css.find('/*', index)
+        if brace == -1:
+            yield css[index:], None
+            return
+        if comment != -1 and comment < brace:
+            # Comment before the block starts: emit what precedes it
+            if css[index:comment].strip():
+                yield css[index:comment], None
+            index = comment
+            continue
+        if semicolon != -1 and semicolon < brace:
+            # @charset / @import statement
+            yield css[index:semicolon + 1], None
+            index = semicolon + 1
+            continue
+        depth, position, quote = 0, brace, None
+        while position < length:
+            char = css[position]
+            if quote:
+                if char == '\\':
+                    position += 1
+                elif char == quote:
+                    quote = None
+            elif char in '"\'':
+                quote = char
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+            position += 1
+        yield css[index:brace], css[brace + 1:position]
+        index = position + 1
+
+
+def _split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for position, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:position])
+            start = position + 1
+    selectors.append(prelude[start:])
+    return selectors
+
+
+def purge_css(css, used):
+    """
+    Drop selectors naming a class or id that never appears in used.
+
+    :param css: Stylesheet text
+    :param used: Set of tokens found in templates and scripts
+    :return: Stylesheet with unused rules removed; comments other than /*! licence */ are dropped
+    """
+    output = []
+    for prelude, body in _split_blocks(css):
+        stripped = prelude.strip()
+        if body is None:
+            if stripped and (not stripped.startswith('/*') or stripped.startswith('/*!')):
+                output.append(prelude)
+            continue
+        if stripped.startswith('@'):
+            if stripped.startswith(_OPAQUE_AT_RULES):
+                output.append(f'{stripped}{{{body}}}')
+                continue
+            inner = purge_css(body, used)
+            if inner.strip():
+                output.append(f'{stripped}{{{inner}}}')
+            continue
+        kept = [selector.strip() for selector in _split_selectors(stripped)
+                if all(name in used for name in _CLASS_OR_ID.findall(_IGNORED_PARTS.sub('', selector)))]
+        if kept:
+            output.append(f"{','.join(kept)}{{{body}}}")
+    return ''.join(output)
+
+
+def source_files(static_dir=STATIC_DIR):
+    """Files to build: source maps and unminified twins of .min files are skipped."""
+    names = sorted(name for name in os.listdir(static_dir) if os.path.isfile(os.path.join(static_dir, name)))
+    for name in names:
+        if name.endswith('.map'):
+            continue
+        base, ext = os.path.splitext(name)
+        if not base.endswith('.min') and f'{base}.min{ext}' in names:
+            continue
+        yield name
+
+
+def _compress(data):
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: compressed for encoding, compressed in variants.items()
+            if len(compressed) <= len(data) * (1 - MIN_SAVING)}
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR, purge=True):
+    """
+    Build static_dir into dist_dir and write the manifest.
+
+    :param purge: Strip CSS rules for classes unused by the templates
+    :return: The manifest dict
+    """
+    os.makedirs(dist_dir, exist_ok=True)
+    used = content_tokens(content_paths()) if purge else None
+    manifest = {}
+    written = {MANIFEST_NAME}
+    print(f"{'asset':<28} {'source':>9} {'built':>9} {'gzip':>9} {'br':>9}")
+    for name in source_files(static_dir):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            source = f.read()
+        data = source
+        if purge and name.endswith('.css'):
+            data = purge_css(source.decode('utf-8'), used).encode('utf-8')
+
+        base, ext = os.path.splitext(name)
+        built_name = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        variants = _compress(data) if ext in COMPRESSIBLE else {}
+        for suffix, payload in [('', data)] + [(f'.{_SUFFIXES[e]}', v) for e, v in variants.items()]:
+            path = os.path.join(dist_dir, built_name + suffix)
+            written.add(built_name + suffix)
+            # Same hash, same content: leave existing files (and their mtimes) alone
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(payload)
+        manifest[name] = {'file': built_name, 'encodings': sorted(variants)}
+        sizes = [f"{len(variants[e]):,}" if e in variants else '-' for e in ('gzip', 'br')]
+        print(f"{name:<28} {len(source):>9,} {len(data):>9,} {sizes[0]:>9} {sizes[1]:>9}")
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    # Old fingerprints are no longer referenced by any page
+    for name in os.listdir(dist_dir):
+        if name not in written:
+            os.remove(os.path.join(dist_dir, name))
+    return manifest
+
+
+class AssetManifest:
+    """Logical name -> built file lookups, reloaded when the manifest changes."""
+
+    def __init__(self, dist_dir=DIST_DIR):
+        self.path = os.path.join(dist_dir, MANIFEST_NAME)
+        self._mtime = None
+        self.assets = {}
+        self.files = {}
+
+    def refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self.assets, self.files, self._mtime = {}, {}, None
+            return
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self.assets = json.load(f)
+            self.files = {entry['file']: entry for entry in self.assets.values()}
+            self._mtime = mtime
+
+
+def init_app(app, dist_dir=DIST_DIR):
+    """Register the asset_url template helper, the /assets route and `flask build-assets`."""
+    from flask import abort, request, send_from_directory, url_for
+
+    manifest = AssetManifest(dist_dir)
+    manifest.refresh()
+
+    def asset_url(name):
+        # Without a build the plain static file is served, uncached
+        if app.debug:
+            manifest.refresh()
+        entry = manifest.assets.get(name)
+        if entry is None:
+            return url_for('static', filename=name)
+        return url_for('asset', filename=entry['file'])
+
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        entry = manifest.files.get(filename)
+        if entry is None:
+            # Possibly built after this worker started
+            manifest.refresh()
+            entry = manifest.files.get(filename)
+        if entry is None:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        # Highest q-value first; anything not listed is identity
+        encoding = max((e for e in entry['encodings'] if request.accept_encodings[e]),
+                       key=lambda e: (request.accept_encodings[e], e == 'br'), default=None)
+        stored = filename + (f'.{_SUFFIXES[encoding]}' if encoding else '')
+        response = send_from_directory(dist_dir, stored, mimetype=mimetype, max_age=ONE_YEAR)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint, purge and precompress static/ into static/dist."""
+        build(dist_dir=dist_dir)
+        manifest.refresh()
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,145 @@
+"""
+Time analytics.py against the same aggregates run on the row store.
+
+Syncs a seeded stand-in database into a fresh DuckDB file, then syncs again
+with --new-rows articles added to show the incremental cost. Each query is
+then run --repeat times on SQLite and on DuckDB and the median reported.
+The SQLite spellings compute the same figures as analytics.QUERIES, checked
+by comparing results.
+
+Usage: python benchmarks/bench_analytics.py [--rows 1000000] [--new-rows 1000] [--repeat 3]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import analytics  # noqa: E402
+import standin_db  # noqa: E402
+
+# (label, SQLite query, DuckDB query); both return the same rows in the same order
+COMPARISONS = (
+    ('max pain by index and month',
+     '''SELECT index_name, substr(record_time, 1, 7) AS month, COUNT(*), ROUND(AVG(max_pain), 2),
+               MIN(index_price_close), MAX(index_price_close)
+        FROM max_pain_data GROUP BY index_name, month ORDER BY index_name, month''',
+     '''SELECT index_name, strftime(record_time, '%Y-%m') AS month, count(*), round(avg(max_pain), 2),
+               min(index_price_close), max(index_price_close)
+        FROM max_pain_data GROUP BY ALL ORDER BY index_name, month'''),
+    ('last snapshot per expiry',
+     '''SELECT m.index_name, m.expiry_date, m.max_pain FROM max_pain_data m
+        JOIN (SELECT index_name, expiry_date, MAX(record_time) AS last_time FROM max_pain_data
+              GROUP BY index_name, expiry_date) l
+          ON l.index_name = m.index_name AND l.expiry_date = m.expiry_date AND l.last_time = m.record_time
+        ORDER BY m.index_name, m.expiry_date''',
+     '''SELECT index_name, strftime(expiry_date, '%Y-%m-%d'), arg_max(max_pain, record_time) FROM max_pain_data
+        GROUP BY ALL ORDER BY 1, 2'''),
+    ('sentiment by month',
+     '''SELECT substr(pubDate, 1, 7) AS month, sentiment, recommendation, COUNT(*)
+        FROM news_articles GROUP BY month, sentiment, recommendation ORDER BY 1, 2, 3''',
+     '''SELECT strftime(pubDate, '%Y-%m') AS month, sentiment, recommendation, count(*)
+        FROM news_articles GROUP BY ALL ORDER BY 1, 2, 3'''),
+)
+
+
+def timed(function, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def add_articles(path, rows):
+    """Insert articles newer than any seeded one, as a day of ingestion would."""
+    conn = standin_db.MySQLStyleConnection(path)
+    newest = datetime(2024, 6, 1)
+    conn.cursor().executemany(
+        'INSERT INTO news_articles VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+        [(f"Update {i}", "", f"https://www.moneycontrol.com/news/new-{i}.html",
+          (newest + timedelta(minutes=i + 1)).strftime('%Y-%m-%d %H:%M:%S'), "", 'POSITIVE', 'BUY',
+          '[{"code": "TCS"}]') for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def normalize(rows):
+    return [tuple(round(value, 2) if isinstance(value, float) else value for value in row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--new-rows', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-analytics-')
+    # A private copy, as add_articles writes to it
+    source_path = os.path.join(workdir, 'source.sqlite3')
+    shutil.copy(standin_db.seeded_database(args.rows), source_path)
+    conn = standin_db.MySQLStyleConnection(source_path)
+    cursor = conn.cursor()
+    # Stand-ins for MySQL's monthly partitions, which keep each month's read to that month
+    cursor.execute("CREATE INDEX news_articles_pubdate ON news_articles (pubDate)")
+    cursor.execute("CREATE INDEX max_pain_data_record_time ON max_pain_data (record_time)")
+    conn.commit()
+    conn.close()
+    lookbacks = {'news_articles': timedelta(hours=analytics.DEFAULT_NEWS_LOOKBACK_HOURS)}
+    try:
+        store = analytics.AnalyticsStore(os.path.join(workdir, 'analytics.duckdb'))
+        source = standin_db.MySQLStyleConnection(source_path)
+        started = time.perf_counter()
+        copied = store.sync(source, lookbacks)
+        print(f"initial sync      {time.perf_counter() - started:>8.2f}s  "
+              + ', '.join(f'{table} {rows:,}' for table, rows in copied.items()))
+        source.close()
+
+        add_articles(source_path, args.new_rows)
+        source = standin_db.MySQLStyleConnection(source_path)
+        started = time.perf_counter()
+        copied = store.sync(source, lookbacks)
+        print(f"incremental sync  {time.perf_counter() - started:>8.2f}s  "
+              + ', '.join(f'{table} {rows:,}' for table, rows in copied.items())
+              + f" ({args.new_rows:,} new articles, the rest re-read by the lookback)")
+        source.close()
+
+        sqlite = standin_db.MySQLStyleConnection(source_path)
+        print(f"\n{'query':<28} {'sqlite ms':>10} {'duckdb ms':>10} {'speedup':>8} {'rows':>7}")
+        failed = False
+        for label, sqlite_sql, duckdb_sql in COMPARISONS:
+            def run_sqlite():
+                cursor = sqlite.cursor()
+                cursor.execute(sqlite_sql)
+                return cursor.fetchall()
+
+            sqlite_seconds, expected = timed(run_sqlite, args.repeat)
+            duckdb_seconds, (_, actual) = timed(lambda: store.sql(duckdb_sql), args.repeat)
+            if normalize(expected) != normalize(actual):
+                failed = True
+                label += ' (MISMATCH)'
+            print(f"{label:<28} {sqlite_seconds * 1000:>10.1f} {duckdb_seconds * 1000:>10.1f} "
+                  f"{sqlite_seconds / duckdb_seconds:>7.1f}x {len(actual):>7}")
+        for name in sorted(analytics.QUERIES):
+            if name == 'recommendation_hit_rate':
+                continue
+            seconds, (_, rows) = timed(lambda: store.query(name), args.repeat)
+            print(f"{name:<28} {'':>10} {seconds * 1000:>10.1f} {'':>8} {len(rows):>7}")
+        sqlite.close()
+        store.close()
+    finally:
+        shutil.rmtree(workdir)
+    if failed:
+        sys.exit("SQLite and DuckDB disagree")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Load test the async JSON API against the Flask views it mirrors.
+
+Serves the stand-in database twice, each with --workers gunicorn workers:
+the Flask app with sync workers, and api.py with aiohttp workers over
+AsyncMySQLStylePool. Each scenario pairs a view with the API call returning
+the same rows and drives both with --clients concurrent clients for --seconds,
+cycling through --pages pages so the caches see realistic variety.
+
+--slow-clients adds that many clients that trickle their request headers over
+--slow-seconds, like mobile clients on a bad link. A sync worker is tied up
+for each of them; the async workers are not.
+
+Usage: python benchmarks/bench_api.py [--rows 10000] [--workers 4] [--clients 50]
+                                      [--slow-clients 200] [--seconds 10]
+"""
+import argparse
+import asyncio
+import functools
+import http.cookiejar
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import standin_db  # noqa: E402
+
+TOKEN = 'bench'
+# (label, Flask view, API call); {page} and its offset select the same rows in both
+SCENARIOS = (
+    ('news', '/news?page={page}', '/api/v1/news?limit=21&offset={offset21}'),
+    ('max_pain.filtered', '/max_pain_new?index_name=NIFTY&days=0&page={page}',
+     '/api/v1/max_pain?index_name=NIFTY&days=0&limit=20&offset={offset20}'),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(kind, db_path, port, workers):
+    """Run one server in this process until killed."""
+    from gunicorn.app.base import BaseApplication
+
+    os.chdir(ROOT)
+    if kind == 'flask':
+        from run_suite import load_web_app
+        web = load_web_app(db_path)
+        with web.app.app_context():
+            # Each worker opens its own connections after the fork
+            web.db.engine.dispose()
+        application, worker_class = web.app, 'sync'
+    else:
+        import api
+        application = functools.partial(api.create_app, functools.partial(standin_db.create_async_pool, db_path),
+                                        tokens=[TOKEN])
+        worker_class = 'aiohttp.GunicornWebWorker'
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for name, value in {'bind': f'127.0.0.1:{port}', 'workers': workers, 'worker_class': worker_class,
+                                'loglevel': 'warning', 'backlog': 4096, 'timeout': 120}.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return application
+
+    Server().run()
+
+
+def start_server(kind, db_path, workers):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', kind, '--db', db_path,
+                                '--port', str(port), '--workers', str(workers)])
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def flask_session_cookie(port):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f'http://127.0.0.1:{port}/login',
+                urllib.parse.urlencode({'username': 'bench', 'password': 'bench'}).encode())
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+async def request(port, path, headers, trickle=0.0):
+    """
+    One HTTP/1.1 request on a new connection.
+
+    :param trickle: Seconds to spread the request headers over
+    :return: Status code
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2 ** 20)
+    try:
+        lines = [f'GET {path} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: close'] + \
+                [f'{name}: {value}' for name, value in headers.items()]
+        if trickle:
+            for line in lines:
+                writer.write(f'{line}\r\n'.encode())
+                await writer.drain()
+                await asyncio.sleep(trickle / len(lines))
+            writer.write(b'\r\n')
+        else:
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        if not status_line:
+            raise ConnectionResetError("connection closed without a response")
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def drive(port, template, headers, args):
+    """
+    Run the fast clients for args.seconds, with args.slow_clients alongside.
+
+    :return: (completed requests, latencies of fast requests, errors)
+    """
+    deadline = time.monotonic() + args.seconds
+    latencies = []
+    errors = 0
+
+    def path(n):
+        page = n % args.pages + 1
+        return template.format(page=page, offset21=(page - 1) * 21, offset20=(page - 1) * 20)
+
+    async def fast_client(n):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await request(port, path(n), headers)
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            n += args.clients
+
+    async def slow_client(n):
+        while time.monotonic() < deadline:
+            try:
+                await request(port, path(n), headers, trickle=args.slow_seconds)
+            except OSError:
+                await asyncio.sleep(0.1)
+
+    clients = [fast_client(n) for n in range(args.clients)]
+    clients += [slow_client(n) for n in range(args.slow_clients)]
+    # Give stragglers up to a minute to finish their last request
+    await asyncio.wait_for(asyncio.gather(*clients), args.seconds + 60)
+    return len(latencies), latencies, errors
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * pct / 100 + 0.5) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--slow-clients', type=int, default=200)
+    parser.add_argument('--slow-seconds', type=float, default=2.0)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--serve', choices=('flask', 'api'), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.db, args.port, args.workers)
+        return
+
+    db_path = standin_db.seeded_database(args.rows)
+    print(f"{args.workers} workers each; {args.clients} clients, plus {args.slow_clients} slow ones where shown")
+    print(f"{'scenario':<20} {'server':<6} {'slow':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for kind in ('flask', 'api'):
+        process, port = start_server(kind, db_path, args.workers)
+        try:
+            if kind == 'flask':
+                headers = {'Cookie': flask_session_cookie(port)}
+            else:
+                headers = {'Authorization': f'Bearer {TOKEN}'}
+            for label, view, call in SCENARIOS:
+                for slow in (0, args.slow_clients) if args.slow_clients else (0,):
+                    run_args = argparse.Namespace(**{**vars(args), 'slow_clients': slow})
+                    completed, latencies, errors = asyncio.run(
+                        drive(port, view if kind == 'flask' else call, headers, run_args))
+                    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+                    p95 = percentile(latencies, 95) * 1000 if latencies else float('nan')
+                    print(f"{label:<20} {kind:<6} {slow:>5} {completed / args.seconds:>9.1f} {p50:>8.1f} "
+                          f"{p95:>8.1f} {errors:>7}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark article text extraction over the saved HTML fixtures.
+
+Compares the original BeautifulSoup html.parser extraction with
+article_extractors.extract_text, reporting pages/sec and extracted text size.
+
+Usage: python benchmarks/bench_article_extraction.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from article_extractors import extract_text  # noqa: E402
+
+FIXTURE_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+FIXTURE_URLS = {
+    'moneycontrol_article.html': 'https://www.moneycontrol.com/news/business/markets/sample-article.html',
+    'economictimes_article.html': 'https://economictimes.indiatimes.com/markets/stocks/news/sample-article.cms',
+    'generic_article.html': 'https://www.example-news.in/markets/sample-article',
+}
+
+
+def legacy_extract(html, url):
+    article_soup = BeautifulSoup(html, 'html.parser')
+    domain = urlparse(url).netloc
+
+    if 'moneycontrol.com' in domain:
+        content_div = article_soup.find('div', class_='content_wrapper')
+        return content_div.get_text(strip=True) if content_div else ""
+    elif 'economictimes.indiatimes.com' in domain:
+        data_elements = article_soup.find_all('main', class_='clr customclr')
+        elementText = ""
+        if data_elements:
+            for element in data_elements:
+                for tag in ['img', 'a']:
+                    for sub_tag in element.find_all(tag):
+                        sub_tag.decompose()
+            for element in data_elements:
+                elementText += element.get_text(strip=True)
+        return elementText
+    else:
+        return article_soup.get_text(strip=True)
+
+
+def measure(fn, html, url, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        text = fn(html, url)
+    elapsed = time.perf_counter() - started
+    return repeat / elapsed, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<28} {'KB':>6} {'legacy p/s':>11} {'new p/s':>9} {'legacy chars':>13} {'new chars':>10}")
+    for name, url in FIXTURE_URLS.items():
+        with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+            html = f.read()
+        legacy_rate, legacy_size = measure(legacy_extract, html, url, args.repeat)
+        new_rate, new_size = measure(extract_text, html, url, args.repeat)
+        print(f"{name:<28} {len(html) / 1024:>6.0f} {legacy_rate:>11.1f} {new_rate:>9.1f} {legacy_size:>13,} {new_size:>10,}")
+
+
+if __name__ == '__main__':
+    main()
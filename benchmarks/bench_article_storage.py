@@ -0,0 +1,161 @@
+"""
+Benchmark inline article bodies against the compressed article_bodies side table.
+
+Builds the same news_articles rows in SQLite with the body inline (the layout
+before migrate_article_bodies.py) and then moved to article_bodies through
+article_store with each codec, and reports database size, the /news listing
+and count queries, the ingest dedup lookup and a lazy body load. Bodies are the
+extracted text of the HTML fixtures with sentences shuffled per row; they are
+drawn from three articles, so the dictionary ratio is far better than real news
+will give.
+
+Usage: python benchmarks/bench_article_storage.py [--rows 20000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import article_store  # noqa: E402
+import standin_db  # noqa: E402
+from article_extractors import extract_text  # noqa: E402
+from fake_sites import ARTICLE_SITES, load_fixtures  # noqa: E402
+
+LISTING_QUERY = '''SELECT title, description, link, pubDate, sentiment, recommendation, stocks
+                   FROM news_articles ORDER BY pubDate DESC LIMIT 20'''
+COUNT_QUERY = "SELECT COUNT(*) FROM news_articles"
+LEGACY_DEDUP = "SELECT * FROM news_articles WHERE link = %s"
+DEDUP = "SELECT 1 FROM news_articles WHERE link = %s LIMIT 1"
+LEAN_SCHEMA = '''CREATE TABLE news_articles
+                 (title TEXT, description TEXT, link TEXT PRIMARY KEY, pubDate TIMESTAMP,
+                  sentiment TEXT, recommendation TEXT, stocks JSON)'''
+# SQLite spelling of article_store's MySQL-only dictionary table
+DICTIONARY_SCHEMA = '''CREATE TABLE article_dictionaries
+                       (id INTEGER PRIMARY KEY, codec VARCHAR(16) NOT NULL, data BLOB NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'''
+
+
+def fixture_sentences():
+    sentences = []
+    for host, url_template, _ in ARTICLE_SITES:
+        text = extract_text(load_fixtures()[host].decode('utf-8'), url_template.format(n=0))
+        sentences.extend(s for s in re.split(r'(?<=[.!?])\s+', text) if s)
+    return sentences
+
+
+def bodies(rows, sentences):
+    rng = random.Random(42)
+    for i in range(rows):
+        picked = rng.sample(sentences, min(len(sentences), rng.randint(20, 40)))
+        yield f"Article {i}. " + ' '.join(picked)
+
+
+def build(path, rows, sentences, codec=None, dictionary=False):
+    """
+    Seed one database. codec None keeps bodies inline.
+
+    :return: Compressed body bytes, or raw bytes when inline
+    """
+    conn = standin_db.MySQLStyleConnection(path)
+    cursor = conn.cursor()
+    cursor.execute(standin_db.NEWS_SCHEMA if codec is None else LEAN_SCHEMA)
+    store = None
+    if codec is not None:
+        article_store.ensure_schema(cursor)
+        if dictionary:
+            cursor.execute(DICTIONARY_SCHEMA)
+            samples = list(bodies(min(rows, 2000), sentences))
+            article_store.save_dictionary(cursor, article_store.train_dictionary(samples))
+        store = article_store.ArticleStore(codec=codec, use_dictionary=dictionary)
+
+    total = 0
+    for row, body in zip(standin_db.news_rows(rows, article_bytes=0), bodies(rows, sentences)):
+        title, description, link, pub_date, _, sentiment, recommendation, stocks = row
+        if store is None:
+            cursor.execute("INSERT INTO news_articles VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                           (title, description, link, pub_date, body, sentiment, recommendation, stocks))
+            total += len(body.encode('utf-8'))
+        else:
+            cursor.execute("INSERT INTO news_articles VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                           (title, description, link, pub_date, sentiment, recommendation, stocks))
+            store.save(cursor, link, body)
+    if store is not None:
+        cursor.execute("SELECT SUM(LENGTH(body)) FROM article_bodies")
+        total = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    return total, store
+
+
+def timed(cursor, query, params=(), repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def measure(path, rows, store, repeat):
+    conn = standin_db.MySQLStyleConnection(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT link FROM news_articles LIMIT 1 OFFSET %s", (rows // 2,))
+    link = cursor.fetchone()[0]
+    results = {
+        'listing ms': timed(cursor, LISTING_QUERY, repeat=repeat),
+        'count ms': timed(cursor, COUNT_QUERY, repeat=repeat),
+        'dedup ms': timed(cursor, LEGACY_DEDUP if store is None else DEDUP, (link,), repeat=repeat),
+    }
+    if store is not None:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            store.load(cursor, link)
+            samples.append(time.perf_counter() - start)
+        results['load ms'] = statistics.median(samples) * 1000
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sentences = fixture_sentences()
+    layouts = [('inline', None, False), ('zlib', 'zlib', False)]
+    try:
+        import zstandard  # noqa: F401
+        layouts += [('zstd', 'zstd', False), ('zstd+dict', 'zstd', True)]
+    except ImportError:
+        print("zstandard not installed; skipping the zstd layouts")
+
+    directory = tempfile.mkdtemp(prefix='bench-articles-')
+    raw_bytes = None
+    print(f"{'layout':<10} {'db MiB':>8} {'bodies MiB':>11} {'ratio':>6} {'listing ms':>11} "
+          f"{'count ms':>9} {'dedup ms':>9} {'load ms':>8}")
+    for name, codec, dictionary in layouts:
+        path = os.path.join(directory, f'{name}.sqlite3')
+        body_bytes, store = build(path, args.rows, sentences, codec, dictionary)
+        if codec is None:
+            raw_bytes = body_bytes
+        timings = measure(path, args.rows, store, args.repeat)
+        load = f"{timings['load ms']:>8.3f}" if 'load ms' in timings else f"{'-':>8}"
+        print(f"{name:<10} {os.path.getsize(path) / 2**20:>8.1f} {body_bytes / 2**20:>11.1f} "
+              f"{raw_bytes / body_bytes:>6.2f} {timings['listing ms']:>11.2f} {timings['count ms']:>9.2f} "
+              f"{timings['dedup ms']:>9.3f} {load}")
+        os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
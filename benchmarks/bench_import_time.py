@@ -0,0 +1,92 @@
+"""
+Measure how long a fresh interpreter takes to import the web app and the models.
+
+Each module is imported in a new subprocess several times and the median is
+compared with a budget. The script exits non-zero when a budget is exceeded, so
+it can guard worker boot and reload time in CI. No database connection is made:
+importing app.py must not touch MySQL.
+
+Usage: python benchmarks/bench_import_time.py [--runs 5] [--app-budget-ms 800] [--models-budget-ms 500] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy modules that must stay out of the web worker's import path
+LAZY_MODULES = ('telegram', 'mysql.connector', 'lxml', 'bs4', 'ExtractNews', 'ingest_scheduler', 'requests')
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed)
+print(','.join(name for name in {lazy!r} if name in sys.modules))
+"""
+
+
+def time_import(module, env):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()
+    loaded = [name for name in output[1].split(',') if name] if len(output) > 1 else []
+    return float(output[0]), loaded
+
+
+def top_imports(module, env, count):
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only top-level imports, nested ones are already inside their parent's time
+        if name.startswith(' ') and not name.startswith('  '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--app-budget-ms', type=float, default=800)
+    parser.add_argument('--models-budget-ms', type=float, default=500)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # The URI only has to parse; nothing may connect during import
+    env.setdefault('MYSQL_HOST', '127.0.0.1')
+    env.setdefault('MYSQL_PORT', '3306')
+
+    failed = False
+    for module, budget in (('app', args.app_budget_ms), ('models', args.models_budget_ms)):
+        samples = []
+        loaded = []
+        for _ in range(args.runs):
+            seconds, loaded = time_import(module, env)
+            samples.append(seconds * 1000)
+        median = statistics.median(samples)
+        status = 'ok' if median <= budget else 'OVER BUDGET'
+        print(f"import {module:<7} median {median:7.1f} ms  (budget {budget:.0f} ms)  {status}")
+        if loaded:
+            print(f"  eagerly imported heavy modules: {', '.join(loaded)}")
+            status = 'OVER BUDGET'
+        if status != 'ok':
+            failed = True
+            for cumulative, name in top_imports(module, env, args.top):
+                print(f"  {cumulative / 1000:7.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Run several ingest_worker processes against one local database.
+
+Each round starts a fresh SQLite database holding one feed job for the fake
+feed, then N worker processes, each with its own fake Ollama as on separate
+hosts. It waits until every feed item is stored and reports throughput, the
+number of analyses sent to Ollama (any above the item count is duplicate
+work) and whether any link was stored twice. --kill SIGKILLs one worker
+mid-run to check that its leased jobs are picked up by the others once the
+lease runs out.
+
+SQLite has no SKIP LOCKED, so claims fall back to the conditional UPDATE alone.
+
+Usage: python benchmarks/bench_ingest_queue.py [--workers 1,2,4] [--items 60] [--kill]
+"""
+import argparse
+import functools
+import os
+import signal
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+# Keep ingestion's conditional GET state out of the working tree
+os.environ['HTTP_VALIDATOR_STORE'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'validators.json')
+
+import article_store  # noqa: E402
+import data_versions  # noqa: E402
+import ingest_worker  # noqa: E402
+import job_queue  # noqa: E402
+import sentiment_aggregates  # noqa: E402
+import standin_db  # noqa: E402
+from ExtractNews import load_ingest_config  # noqa: E402
+from fake_ollama import FakeOllamaServer  # noqa: E402
+from fake_sites import FakeSitesServer  # noqa: E402
+
+# SQLite spelling of job_queue.ensure_schema
+QUEUE_SCHEMA = '''CREATE TABLE ingest_jobs
+                  (job_key VARCHAR(191) PRIMARY KEY, kind VARCHAR(32) NOT NULL, payload TEXT NOT NULL,
+                   state VARCHAR(16) NOT NULL, attempts INT NOT NULL DEFAULT 0, max_attempts INT NOT NULL,
+                   run_after DATETIME NOT NULL, leased_by VARCHAR(128), lease_expires DATETIME,
+                   last_error TEXT, updated_at DATETIME NOT NULL)'''
+QUEUE_INDEX = "CREATE INDEX ingest_jobs_due ON ingest_jobs (state, run_after)"
+
+
+def connect(path):
+    return standin_db.MySQLStyleConnection(path, timeout=30)
+
+
+def build_database(path, feed_url, lease_seconds):
+    conn = connect(path)
+    cursor = conn.cursor()
+    # WAL lets workers read while another one commits
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(standin_db.NEWS_SCHEMA)
+    article_store.ensure_schema(cursor)
+    sentiment_aggregates.ensure_schema(cursor)
+    data_versions.ensure_schema(cursor)
+    cursor.execute(QUEUE_SCHEMA)
+    cursor.execute(QUEUE_INDEX)
+    conn.commit()
+    queue = job_queue.JobQueue(conn, lease_seconds=lease_seconds, skip_locked=False)
+    queue.enqueue(ingest_worker.feed_key(feed_url), ingest_worker.FEED,
+                  {'url': feed_url, 'interval': 3600, 'checkpoint': None})
+    conn.close()
+
+
+def worker_process(path, config, ollama_url, verbose):
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    worker = ingest_worker.IngestWorker(config=config, connect=functools.partial(connect, path),
+                                        ollama_api_url=ollama_url, skip_locked=False)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    worker.run()
+
+
+def progress(path):
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT link) FROM news_articles")
+    stored, distinct = cursor.fetchone()
+    cursor.execute("SELECT state, COUNT(*) FROM ingest_jobs WHERE kind = 'article' GROUP BY state")
+    states = dict(cursor.fetchall())
+    conn.close()
+    return stored, distinct, states
+
+
+def run_round(workers, args, sites):
+    ollamas = [FakeOllamaServer(('127.0.0.1', 0), latency=args.ollama_latency, parallel=args.ollama_parallel).start()
+               for _ in range(workers)]
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-queue-'), 'ingest.sqlite3')
+    build_database(path, sites.feed_url, args.lease)
+
+    config = load_ingest_config(os.path.join(ROOT, 'app.config'))
+    config.set('Ollama', 'max_parallel', str(args.ollama_parallel))
+    if not config.has_section('Queue'):
+        config.add_section('Queue')
+    config.set('Queue', 'lease_seconds', str(args.lease))
+    config.set('Queue', 'retry_base', '1')
+
+    processes = [Process(target=worker_process, args=(path, config, ollama.url, args.verbose), daemon=True)
+                 for ollama in ollamas]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    killed = False
+    stored, distinct, states = 0, 0, {}
+    while time.perf_counter() - started < args.timeout:
+        time.sleep(0.2)
+        stored, distinct, states = progress(path)
+        if args.kill and not killed and workers > 1 and stored >= args.items // 4:
+            os.kill(processes[0].pid, signal.SIGKILL)
+            killed = True
+        if stored >= args.items and not states.get(job_queue.QUEUED) and not states.get(job_queue.RUNNING):
+            break
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+    analyses = sum(1 for ollama in ollamas for request in ollama.requests if request.get('prompt'))
+    for ollama in ollamas:
+        ollama.shutdown()
+    os.remove(path)
+    return elapsed, stored, distinct, analyses, states, killed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts, one round each')
+    parser.add_argument('--items', type=int, default=60)
+    parser.add_argument('--ollama-latency', type=float, default=0.2)
+    parser.add_argument('--ollama-parallel', type=int, default=2, help='slots per fake Ollama and per worker')
+    parser.add_argument('--site-latency', type=float, default=0.02)
+    parser.add_argument('--lease', type=float, default=5.0, help='lease seconds; short so --kill recovers quickly')
+    parser.add_argument('--kill', action='store_true', help='SIGKILL one worker a quarter of the way through')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--verbose', action='store_true', help='show worker output')
+    args = parser.parse_args()
+
+    sites = FakeSitesServer(('127.0.0.1', 0), items=args.items, latency=args.site_latency).start()
+    # Article URLs are real hostnames; the fake site answers for them as a proxy
+    os.environ.update({'HTTP_PROXY': sites.base_url, 'http_proxy': sites.base_url,
+                       'NO_PROXY': '127.0.0.1,localhost', 'no_proxy': '127.0.0.1,localhost'})
+    print(f"{'workers':>7} {'seconds':>8} {'articles/s':>11} {'stored':>7} {'analyses':>9} {'duplicates':>11}  jobs")
+    failed = False
+    try:
+        for workers in [int(value) for value in args.workers.split(',')]:
+            elapsed, stored, distinct, analyses, states, killed = run_round(workers, args, sites)
+            jobs = ', '.join(f'{state} {count}' for state, count in sorted(states.items()))
+            print(f"{workers:>7} {elapsed:>8.2f} {stored / elapsed:>11.1f} {stored:>7} {analyses:>9} "
+                  f"{stored - distinct:>11}  {jobs}{' (one worker killed)' if killed else ''}")
+            # A killed worker may have analyzed articles it never stored; anything else is a bug
+            if stored != args.items or stored != distinct or (analyses != args.items and not killed):
+                failed = True
+    finally:
+        sites.shutdown()
+    if failed:
+        sys.exit("Some articles were missed or analyzed more than once")
+
+
+if __name__ == '__main__':
+    main()
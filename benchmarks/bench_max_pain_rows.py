@@ -0,0 +1,115 @@
+"""
+Benchmark the max pain row materialization used by /max_pain and /max_pain_new.
+
+Compares the original per-row dict + pytz conversion with result_rows.materialize_rows
+on an in-memory SQLite table shaped like max_pain_data.
+
+Usage: python benchmarks/bench_max_pain_rows.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from result_rows import materialize_rows  # noqa: E402
+
+
+def seed(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE max_pain_data (
+            id INTEGER PRIMARY KEY, record_time TIMESTAMP, expiry_date TEXT, index_name TEXT,
+            max_pain REAL, max_pain_trend TEXT, max_pain_price REAL, index_price_close REAL)"""))
+        start = datetime(2024, 1, 1, 3, 45)
+        conn.execute(
+            text("""INSERT INTO max_pain_data
+                    (record_time, expiry_date, index_name, max_pain, max_pain_trend, max_pain_price, index_price_close)
+                    VALUES (:record_time, :expiry_date, :index_name, :max_pain, :trend, :price, :close)"""),
+            [{
+                'record_time': start + timedelta(minutes=5 * i),
+                'expiry_date': '2024-01-25',
+                'index_name': ('NIFTY', 'BANKNIFTY', 'FINNIFTY')[i % 3],
+                'max_pain': 21500 + i % 400,
+                'trend': 'UP' if i % 2 else 'DOWN',
+                'price': 21500.0 + i % 400,
+                'close': 21480.5 + i % 377,
+            } for i in range(rows)]
+        )
+
+
+def legacy(result):
+    max_pain_data = []
+    utc = pytz.utc
+    ist = pytz.timezone('Asia/Kolkata')
+    for row in result:
+        row_dict = dict(row._mapping)
+        if 'record_time' in row_dict:
+            utc_time = utc.localize(row_dict['record_time'])
+            ist_time = utc_time.astimezone(ist)
+            row_dict['record_time'] = ist_time.strftime('%Y-%m-%d %H:%M:%S')
+        max_pain_data.append(row_dict)
+    return max_pain_data
+
+
+def bulk(result):
+    return materialize_rows(result, row_name='MaxPainRow')
+
+
+def run(engine, fn, repeat):
+    best = None
+    for _ in range(repeat):
+        with engine.connect() as conn:
+            # Fetch first so only materialization is timed, not SQLite itself
+            result = conn.execute(text("SELECT * FROM max_pain_data"))
+            frozen = _FrozenResult(list(result.keys()), result.fetchall())
+        started = time.perf_counter()
+        output = fn(frozen)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+class _FrozenResult:
+    """Replays pre-fetched rows through the Result API used by the views."""
+
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self._rows = rows
+
+    def keys(self):
+        return self._keys
+
+    def fetchall(self):
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://', connect_args={'detect_types': sqlite3.PARSE_DECLTYPES})
+    seed(engine, args.rows)
+
+    legacy_time, legacy_rows = run(engine, legacy, args.repeat)
+    bulk_time, bulk_rows = run(engine, bulk, args.repeat)
+
+    assert [r['record_time'] for r in legacy_rows] == [r.record_time for r in bulk_rows]
+
+    print(f"rows: {args.rows}")
+    print(f"legacy dict+pytz : {args.rows / legacy_time:12,.0f} rows/sec ({legacy_time * 1000:.1f} ms)")
+    print(f"materialize_rows : {args.rows / bulk_time:12,.0f} rows/sec ({bulk_time * 1000:.1f} ms)")
+    print(f"speedup          : {legacy_time / bulk_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
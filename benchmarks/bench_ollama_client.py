@@ -0,0 +1,64 @@
+"""
+Benchmark OllamaClient against the local fake Ollama server.
+
+Analyzes the same set of articles one request at a time and then pipelined
+through max_parallel slots, and checks that answers parse strictly and that
+long articles stay inside the token budget.
+
+Usage: python benchmarks/bench_ollama_client.py [--articles 16] [--latency 0.2] [--parallel 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from fake_ollama import FakeOllamaServer  # noqa: E402
+from ollama_client import OllamaClient, SENTIMENTS  # noqa: E402
+
+
+def make_articles(count):
+    paragraph = "Shares of RELIANCE and TCS moved as analysts revised their outlook for the quarter. "
+    # Every fourth article is far longer than the budget
+    return [paragraph * (400 if i % 4 == 0 else 20) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--parallel', type=int, default=4)
+    parser.add_argument('--token-budget', type=int, default=1000)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(('127.0.0.1', 0), latency=args.latency, parallel=args.parallel).start()
+    articles = make_articles(args.articles)
+
+    sequential = OllamaClient(server.url, 'fake', token_budget=args.token_budget, max_parallel=1)
+    started = time.perf_counter()
+    results = [sequential.analyze(text) for text in articles]
+    sequential_time = time.perf_counter() - started
+
+    pipelined = OllamaClient(server.url, 'fake', token_budget=args.token_budget, max_parallel=args.parallel)
+    started = time.perf_counter()
+    pipelined_results = pipelined.analyze_many(articles)
+    pipelined_time = time.perf_counter() - started
+
+    assert results == pipelined_results
+    assert all(sentiment in SENTIMENTS for sentiment, _, _ in results)
+    longest_prompt = max(len(request['prompt']) for request in server.requests)
+    stats = pipelined.stats.snapshot()
+
+    print(f"articles: {args.articles}, server latency: {args.latency}s, parallel slots: {args.parallel}")
+    print(f"sequential : {args.articles / sequential_time:6.2f} docs/sec ({sequential_time:.2f}s)")
+    print(f"pipelined  : {args.articles / pipelined_time:6.2f} docs/sec ({pipelined_time:.2f}s)")
+    print(f"longest prompt: {longest_prompt:,} chars (article budget {pipelined.char_budget:,} chars)")
+    print(f"avg latency: {stats['avg_seconds'] * 1000:.0f} ms, prompt tokens: {stats['prompt_tokens']:,}, "
+          f"completion tokens: {stats['completion_tokens']:,}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
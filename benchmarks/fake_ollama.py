@@ -0,0 +1,88 @@
+"""
+Local stand-in for Ollama's /api/generate.
+
+Answers every prompt with a valid analysis JSON after a configurable delay and
+handles at most --parallel requests at once, like OLLAMA_NUM_PARALLEL. Any stock
+code from --stocks that appears in the prompt is reported back.
+
+Usage: python benchmarks/fake_ollama.py [--port 11435] [--latency 0.5] [--parallel 2]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_STOCKS = ('RELIANCE', 'TCS', 'HDFC', 'INFY', 'ICICIBANK', 'HDFCBANK', 'ITC', 'KOTAKBANK', 'LT', 'HINDUNILVR')
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, parallel=2, stocks=DEFAULT_STOCKS):
+        super().__init__(address, FakeOllamaHandler)
+        self.latency = latency
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.stocks = stocks
+        self.requests = []
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api/generate'
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        self.server.requests.append(payload)
+        prompt = payload.get('prompt', '')
+
+        with self.server.slots:
+            if prompt:
+                time.sleep(self.server.latency)
+        upper = prompt.upper()
+        stocks = [{'name': code.title(), 'code': code} for code in self.server.stocks if code in upper]
+        answer = {
+            'sentiment': ('POSITIVE', 'NEGATIVE', 'NEUTRAL')[len(prompt) % 3],
+            'recommendation': ('BUY', 'SELL', 'HOLD')[len(prompt) % 3],
+            'stocks': stocks
+        }
+        body = json.dumps({
+            'model': payload.get('model'),
+            'response': json.dumps(answer) if prompt else '',
+            'done': True,
+            'prompt_eval_count': len(prompt) // 4,
+            'eval_count': 40
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--parallel', type=int, default=2)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer((args.host, args.port), latency=args.latency, parallel=args.parallel)
+    print(f"Fake Ollama listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the RSS feeds and news sites that ingestion talks to.
+
+/feed.xml serves an RSS feed of --items entries whose links point at
+moneycontrol.com, economictimes.indiatimes.com and a generic news site in
+turn. Article pages are the recorded HTML fixtures in benchmarks/fixtures.
+
+The server also answers as an HTTP proxy: with HTTP_PROXY pointing at it,
+requests for the real article URLs are served from the fixtures, so the
+domain-specific extractors run exactly as in production without any network
+access. Put the fake Ollama host in NO_PROXY.
+
+Usage: python benchmarks/fake_sites.py [--port 8089] [--items 50] [--latency 0.05]
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Article host -> (URL template, fixture file)
+ARTICLE_SITES = (
+    ('www.moneycontrol.com', 'http://www.moneycontrol.com/news/business/markets/article-{n}.html',
+     'moneycontrol_article.html'),
+    ('economictimes.indiatimes.com', 'http://economictimes.indiatimes.com/markets/stocks/news/article-{n}.cms',
+     'economictimes_article.html'),
+    ('www.example-news.in', 'http://www.example-news.in/markets/article-{n}', 'generic_article.html'),
+)
+STOCKS = ('RELIANCE', 'TCS', 'HDFC', 'INFY', 'ICICIBANK', 'HDFCBANK', 'ITC', 'KOTAKBANK', 'LT', 'HINDUNILVR')
+
+
+def load_fixtures():
+    fixtures = {}
+    for host, _, name in ARTICLE_SITES:
+        with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+            fixtures[host] = f.read()
+    return fixtures
+
+
+def article_url(n):
+    return ARTICLE_SITES[n % len(ARTICLE_SITES)][1].format(n=n)
+
+
+def build_feed(items, start=None):
+    """RSS 2.0 document with items newest first, like the live feeds."""
+    start = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+    entries = []
+    for n in reversed(range(items)):
+        stock = STOCKS[n % len(STOCKS)]
+        entries.append(
+            '<item>'
+            f'<title>{escape(f"{stock} shares move after quarterly update {n}")}</title>'
+            f'<link>{escape(article_url(n))}</link>'
+            f'<guid>{escape(article_url(n))}</guid>'
+            f'<description>{escape(f"Analysts revise targets for {stock}.")}</description>'
+            f'<pubDate>{format_datetime(start + timedelta(minutes=n))}</pubDate>'
+            '</item>'
+        )
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            '<title>Fake Markets</title>' + ''.join(entries) + '</channel></rss>').encode()
+
+
+class FakeSitesServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, items=50, latency=0.0):
+        super().__init__(address, FakeSitesHandler)
+        self.latency = latency
+        self.fixtures = load_fixtures()
+        self.feed = build_feed(items)
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def feed_url(self):
+        return f'{self.base_url}/feed.xml'
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class FakeSitesHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server._lock:
+            self.server.hits += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        # Proxied requests carry the absolute URL in the request line
+        parts = urlsplit(self.path)
+        host = parts.hostname or ''
+        if host in self.server.fixtures:
+            self._send(self.server.fixtures[host], 'text/html; charset=utf-8')
+        elif parts.path == '/feed.xml':
+            self._send(self.server.feed, 'application/rss+xml')
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeSitesServer((args.host, args.port), items=args.items, latency=args.latency)
+    print(f"Fake feed at {server.feed_url}; set HTTP_PROXY={server.base_url} to serve article pages")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
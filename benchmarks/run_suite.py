@@ -0,0 +1,330 @@
+"""
+Offline benchmark suite for ingestion, the web views and the analyzer.
+
+Everything runs locally: RSS feeds and article pages come from
+fake_sites.FakeSitesServer, Ollama is fake_ollama.FakeOllamaServer, and the
+news/max pain MySQL database is a seeded SQLite stand-in (standin_db). Results
+are printed and written as JSON; pass --baseline with an earlier results file
+to fail when any measurement regresses by more than --tolerance.
+
+Scenarios:
+  ingest     feed -> scrape -> extract -> analyze -> insert throughput, with per-stage times
+  analyzer   article extraction pages/sec and Ollama docs/sec, sequential and pipelined
+  views      /news, /max_pain and /max_pain_new latency at increasing page depth, uncached,
+             then served from the fragment cache (*.cached)
+  max_pain   materialize_rows throughput over max_pain_data
+
+Usage: python benchmarks/run_suite.py [--scale small|medium|large] [--only ingest,views]
+                                      [--output bench_results.json] [--baseline old.json] [--tolerance 0.2]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Keep ingestion's conditional GET state out of the working tree
+os.environ['HTTP_VALIDATOR_STORE'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'validators.json')
+
+import standin_db  # noqa: E402
+from fake_ollama import FakeOllamaServer  # noqa: E402
+from fake_sites import FakeSitesServer, ARTICLE_SITES, load_fixtures  # noqa: E402
+
+SCENARIOS = ('ingest', 'analyzer', 'views', 'max_pain')
+
+
+class Results:
+    """Named measurements, each with a unit and whether lower or higher is better."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, name, value, unit, better='lower'):
+        self.entries[name] = {'value': round(value, 4), 'unit': unit, 'better': better}
+        print(f"  {name:<44} {value:>12,.2f} {unit}")
+
+    def add_latencies(self, name, samples):
+        self.add(f'{name}.p50', statistics.median(samples) * 1000, 'ms')
+        self.add(f'{name}.p95', percentile(samples, 95) * 1000, 'ms')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def bench_ingest(args, results):
+    import ExtractNews
+    import article_store
+    import data_versions
+    import metrics
+    import sentiment_aggregates
+
+    sites = FakeSitesServer(('127.0.0.1', 0), items=args.feed_items, latency=args.site_latency).start()
+    ollama = FakeOllamaServer(('127.0.0.1', 0), latency=args.ollama_latency, parallel=args.ollama_parallel).start()
+    # Article URLs are real hostnames; the fake site answers for them as a proxy
+    saved_env = {name: os.environ.get(name) for name in ('HTTP_PROXY', 'http_proxy', 'NO_PROXY', 'no_proxy')}
+    os.environ.update({'HTTP_PROXY': sites.base_url, 'http_proxy': sites.base_url,
+                       'NO_PROXY': '127.0.0.1,localhost', 'no_proxy': '127.0.0.1,localhost'})
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'ingest.sqlite3')
+    conn = standin_db.MySQLStyleConnection(path)
+    cursor = conn.cursor()
+    cursor.execute(standin_db.NEWS_SCHEMA)
+    data_versions.ensure_schema(cursor)
+    article_store.ensure_schema(cursor)
+    sentiment_aggregates.ensure_schema(cursor)
+    try:
+        before = metrics.INGEST_STAGE_LATENCY.totals()
+        started = time.perf_counter()
+        ExtractNews.process_feed(sites.feed_url, conn, cursor, ollama.url, 'fake')
+        elapsed = time.perf_counter() - started
+        after = metrics.INGEST_STAGE_LATENCY.totals()
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        sites.shutdown()
+        ollama.shutdown()
+
+    cursor.execute("SELECT COUNT(*) FROM news_articles")
+    inserted = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM article_bodies")
+    bodies = cursor.fetchone()[0]
+    conn.close()
+    assert inserted == args.feed_items, f"expected {args.feed_items} articles, got {inserted}"
+    assert bodies == inserted, f"expected {inserted} article bodies, got {bodies}"
+
+    results.add('ingest.articles_per_sec', inserted / elapsed, 'articles/s', better='higher')
+    for (stage,), (count, total) in sorted(after.items()):
+        count -= before.get((stage,), (0, 0.0))[0]
+        total -= before.get((stage,), (0, 0.0))[1]
+        if count:
+            results.add(f'ingest.stage.{stage}.avg', total / count * 1000, 'ms')
+
+
+def bench_analyzer(args, results):
+    from article_extractors import extract_text
+    from ollama_client import OllamaClient
+
+    fixtures = load_fixtures()
+    texts = []
+    for host, url_template, name in ARTICLE_SITES:
+        html = fixtures[host].decode('utf-8')
+        url = url_template.format(n=0)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            text = extract_text(html, url)
+        results.add(f'analyzer.extract.{name.split("_")[0]}', args.repeat / (time.perf_counter() - started),
+                    'pages/s', better='higher')
+        texts.append(text)
+
+    ollama = FakeOllamaServer(('127.0.0.1', 0), latency=args.ollama_latency, parallel=args.ollama_parallel).start()
+    documents = (texts * (args.analyzer_docs // len(texts) + 1))[:args.analyzer_docs]
+    try:
+        for label, parallel in (('sequential', 1), ('pipelined', args.ollama_parallel)):
+            client = OllamaClient(ollama.url, 'fake', max_parallel=parallel)
+            started = time.perf_counter()
+            client.analyze_many(documents)
+            results.add(f'analyzer.ollama.{label}', len(documents) / (time.perf_counter() - started),
+                        'docs/s', better='higher')
+            client.close()
+    finally:
+        ollama.shutdown()
+
+
+def load_web_app(db_path, view_cache=True):
+    """
+    Import app.py against the stand-in database, with an approved user
+    bench/bench in a fresh users database.
+
+    :return: The app module
+    """
+    import config
+
+    # Point the app at SQLite before it is imported; Config reads the environment at import
+    users_db = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'users.sqlite3')
+    config.Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{users_db}'
+    config.Config.MAX_PAIN_SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}?detect_types=1'
+    config.Config.SECRET_KEY = config.Config.SECRET_KEY or 'bench'
+    config.Config.WTF_CSRF_ENABLED = False
+    os.environ.pop('NEWS_INGEST_ENABLED', None)
+    if not view_cache:
+        os.environ['VIEW_CACHE_BACKEND'] = 'none'
+
+    import news_db
+    import app as web
+
+    news_db.get_connection = lambda: standin_db.MySQLStyleConnection(db_path)
+    with web.app.app_context():
+        web.db.create_all()
+        user = web.User(username='bench', email='bench@example.com', is_approved=True)
+        user.set_password('bench')
+        web.db.session.add(user)
+        web.db.session.commit()
+    return web
+
+
+def time_requests(client, url, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+    return samples
+
+
+def bench_views(args, results, db_path):
+    web = load_web_app(db_path, view_cache=not args.no_view_cache)
+    # Page depth timings are about the queries, so they run with the fragment
+    # cache off; cache hits are reported separately as *.cached
+    fragment_cache, web.fragment_cache = web.fragment_cache, None
+    client = web.app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+    # (label, route, rows per page, filter, share of the seeded rows the filter matches);
+    # days=0 pages through all history, without it the max pain views show their default window
+    views = (('news', '/news', 21, '', 1), ('news.filtered', '/news', 21, '&sentiment=POSITIVE', 1 / 3),
+             ('max_pain', '/max_pain', 10, '&days=0', 1),
+             ('max_pain_new.filtered', '/max_pain_new', 20, '&index_name=NIFTY&days=0', 1 / 3),
+             ('max_pain.window', '/max_pain', 10, '', None))
+    for label, route, per_page, extra, share in views:
+        if share is None:
+            # Row count unknown: time the first pages only
+            pages, last_page = (1, 10), None
+        else:
+            last_page = max(1, math.ceil(math.ceil(args.rows * share) / per_page))
+            pages = sorted({p for p in (1, 10, 100, 1000, 10000) if p <= last_page} | {last_page})
+        for page in pages:
+            url = f'{route}?page={page}{extra}'
+            name = f'views.{label}.page_last' if page == last_page else f'views.{label}.page_{page}'
+            # The test client sends no If-None-Match, so no request is answered with a 304
+            web.fragment_cache = None
+            results.add_latencies(name, time_requests(client, url, args.view_repeat))
+            if fragment_cache is not None:
+                web.fragment_cache = fragment_cache
+                time_requests(client, url, 1)
+                results.add_latencies(f'{name}.cached', time_requests(client, url, args.view_repeat))
+
+
+def bench_max_pain(args, results, db_path):
+    from sqlalchemy import create_engine, text
+    from result_rows import materialize_rows
+
+    engine = create_engine(f'sqlite:///{db_path}?detect_types=1')
+    limit = min(args.rows, 100_000)
+    best = None
+    with engine.connect() as conn:
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            rows = materialize_rows(conn.execute(text("SELECT * FROM max_pain_data LIMIT :limit"), {'limit': limit}),
+                                    row_name='MaxPainRow')
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    assert len(rows) == limit
+    results.add('max_pain.materialize', limit / best, 'rows/s', better='higher')
+    engine.dispose()
+
+
+def compare(current, baseline, tolerance):
+    """Print changes against a baseline and return the names that regressed."""
+    regressions = []
+    print(f"\nAgainst baseline (tolerance {tolerance:.0%}):")
+    for name, entry in current.items():
+        old = baseline.get(name)
+        if not old or not old['value']:
+            continue
+        change = (entry['value'] - old['value']) / old['value']
+        worse = change > tolerance if entry['better'] == 'lower' else change < -tolerance
+        if worse:
+            regressions.append(name)
+        print(f"  {name:<44} {change:+7.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=standin_db.SCALES, default='small')
+    parser.add_argument('--rows', type=int, help='Rows per table; overrides --scale')
+    parser.add_argument('--only', help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--feed-items', type=int, default=30)
+    parser.add_argument('--site-latency', type=float, default=0.02)
+    parser.add_argument('--ollama-latency', type=float, default=0.1)
+    parser.add_argument('--ollama-parallel', type=int, default=2)
+    parser.add_argument('--analyzer-docs', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--view-repeat', type=int, default=10)
+    parser.add_argument('--no-view-cache', action='store_true', help='Skip the *.cached view timings')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+    args.rows = args.rows or standin_db.SCALES[args.scale]
+    scenarios = args.only.split(',') if args.only else SCENARIOS
+    args.output = os.path.abspath(args.output)
+
+    # app.config and the templates are resolved relative to the repo root
+    os.chdir(ROOT)
+    results = Results()
+    db_path = standin_db.seeded_database(args.rows) if {'views', 'max_pain'} & set(scenarios) else None
+    for scenario in scenarios:
+        print(f"{scenario}:")
+        if scenario == 'ingest':
+            bench_ingest(args, results)
+        elif scenario == 'analyzer':
+            bench_analyzer(args, results)
+        elif scenario == 'views':
+            bench_views(args, results, db_path)
+        elif scenario == 'max_pain':
+            bench_max_pain(args, results, db_path)
+        else:
+            parser.error(f"unknown scenario {scenario}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': args.rows,
+            'scenarios': list(scenarios),
+        },
+        'results': results.entries
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('rows') != args.rows:
+            print(f"Warning: baseline was run with {baseline['meta'].get('rows')} rows, this run with {args.rows}")
+        regressions = compare(results.entries, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+SQLite stand-in for the news/max pain MySQL database.
+
+Seeds synthetic news_articles and max_pain_data tables shaped like the
+production ones and caches them under benchmarks/.data, so the 1M and 10M row
+databases are only built once. MySQLStyleConnection lets code written for
+mysql.connector (%s placeholders, conn.cursor()) run against them unchanged,
+and AsyncMySQLStylePool does the same for aiomysql.
+
+Usage: python benchmarks/standin_db.py [--scale small|medium|large] [--rows N] [--article-bytes 256]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+SCALES = {'small': 10_000, 'medium': 1_000_000, 'large': 10_000_000}
+BATCH_SIZE = 50_000
+
+STOCKS = ('RELIANCE', 'TCS', 'HDFC', 'INFY', 'ICICIBANK', 'HDFCBANK', 'ITC', 'KOTAKBANK', 'LT', 'HINDUNILVR')
+SENTIMENTS = ('POSITIVE', 'NEGATIVE', 'NEUTRAL')
+RECOMMENDATIONS = ('BUY', 'SELL', 'HOLD')
+INDEX_NAMES = ('NIFTY', 'BANKNIFTY', 'FINNIFTY')
+
+# ExtractNews.ensure_news_schema's columns plus the inline article body that
+# tables created before article_bodies still carry; link is the only key, as in production
+NEWS_SCHEMA = '''CREATE TABLE news_articles
+                 (title TEXT, description TEXT, link TEXT PRIMARY KEY, pubDate TIMESTAMP, article TEXT,
+                  sentiment TEXT, recommendation TEXT, stocks JSON)'''
+MAX_PAIN_SCHEMA = '''CREATE TABLE max_pain_data
+                     (id INTEGER PRIMARY KEY, record_time TIMESTAMP, expiry_date TEXT, index_name TEXT,
+                      max_pain REAL, max_pain_trend TEXT, max_pain_price REAL, index_price_close REAL)'''
+
+
+def news_rows(rows, article_bytes=256):
+    body = ("Shares moved as analysts revised their outlook for the quarter. " * (article_bytes // 64 + 1))[:article_bytes]
+    newest = datetime(2024, 6, 1)
+    for i in range(rows):
+        stocks = [{'name': STOCKS[i % 10].title(), 'code': STOCKS[i % 10]}]
+        if i % 3 == 0:
+            stocks.append({'name': STOCKS[(i + 3) % 10].title(), 'code': STOCKS[(i + 3) % 10]})
+        yield (
+            f"{STOCKS[i % 10]} shares move after quarterly update {i}",
+            f"Analysts revise targets for {STOCKS[i % 10]}.",
+            f"https://www.moneycontrol.com/news/business/markets/article-{i}.html",
+            (newest - timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            body,
+            SENTIMENTS[i % 3],
+            RECOMMENDATIONS[(i // 3) % 3],
+            json.dumps(stocks)
+        )
+
+
+def max_pain_rows(rows):
+    start = datetime(2020, 1, 1, 3, 45)
+    for i in range(rows):
+        record_time = start + timedelta(minutes=5 * (i // 3))
+        yield (
+            record_time.strftime('%Y-%m-%d %H:%M:%S'),
+            # Weekly expiries, the Thursday on or after the record
+            (record_time + timedelta(days=(3 - record_time.weekday()) % 7)).strftime('%Y-%m-%d'),
+            INDEX_NAMES[i % 3],
+            21500 + i % 400,
+            'UP' if i % 2 else 'DOWN',
+            21500.0 + i % 400,
+            21480.5 + i % 377
+        )
+
+
+def _insert_batched(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def seed_news(conn, rows, article_bytes=256):
+    conn.execute(NEWS_SCHEMA)
+    _insert_batched(conn, 'INSERT INTO news_articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    news_rows(rows, article_bytes))
+
+
+def seed_max_pain(conn, rows):
+    conn.execute(MAX_PAIN_SCHEMA)
+    _insert_batched(conn, '''INSERT INTO max_pain_data
+                             (record_time, expiry_date, index_name, max_pain, max_pain_trend,
+                              max_pain_price, index_price_close)
+                             VALUES (?, ?, ?, ?, ?, ?, ?)''', max_pain_rows(rows))
+
+
+def seed_versions(conn):
+    """Give news_articles a data version, as ingestion would, so /news pages are cacheable."""
+    # TIMESTAMP rather than MySQL's DATETIME so sqlite3 returns a datetime
+    conn.execute('''CREATE TABLE IF NOT EXISTS data_versions
+                    (name VARCHAR(64) PRIMARY KEY, version BIGINT NOT NULL, updated_at TIMESTAMP NOT NULL)''')
+    conn.execute("INSERT OR IGNORE INTO data_versions VALUES ('news_articles', 1, '2024-06-01 00:00:00')")
+
+
+def seeded_database(rows, article_bytes=256, data_dir=DATA_DIR):
+    """
+    Return the path of a database with both tables seeded to the given size.
+
+    :param rows: Rows per table
+    :param article_bytes: Size of each synthetic article body
+    :param data_dir: Where seeded databases are cached between runs
+    :return: Path of the SQLite file
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'news_{rows}_{article_bytes}.sqlite3')
+    if os.path.exists(path):
+        # Databases seeded before data_versions existed get it on first use
+        with sqlite3.connect(path) as conn:
+            seed_versions(conn)
+        conn.close()
+        return path
+
+    # Seed under a temporary name so an interrupted run is never reused
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+    started = time.perf_counter()
+    conn = sqlite3.connect(partial)
+    # Durability does not matter for a throwaway file
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    seed_news(conn, rows, article_bytes)
+    seed_max_pain(conn, rows)
+    seed_versions(conn)
+    conn.commit()
+    conn.close()
+    os.replace(partial, path)
+    print(f"Seeded {rows:,} rows per table in {time.perf_counter() - started:.1f}s: {path}")
+    return path
+
+
+def translate(operation):
+    """SQLite spelling of the MySQL statements the app issues."""
+    operation = operation.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+    insert, upsert, updates = operation.partition('ON DUPLICATE KEY UPDATE')
+    if upsert:
+        # SQLite 3.35+ resolves a target-less DO UPDATE against the primary key
+        operation = insert + 'ON CONFLICT DO UPDATE SET' + re.sub(r'VALUES\((\w+)\)', r'excluded.\1', updates)
+    return operation
+
+
+class MySQLStyleCursor:
+    """Cursor accepting mysql.connector's %s placeholders, INSERT IGNORE and ON DUPLICATE KEY UPDATE."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=()):
+        return self._cursor.execute(translate(operation), tuple(params or ()))
+
+    def executemany(self, operation, seq_params):
+        return self._cursor.executemany(translate(operation), seq_params)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class MySQLStyleConnection:
+    """sqlite3 connection with the subset of the mysql.connector API the app uses."""
+
+    def __init__(self, path, timeout=5.0):
+        """:param timeout: Seconds to wait for another connection's write lock"""
+        self._conn = sqlite3.connect(path, timeout=timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False)
+
+    def cursor(self, *args, **kwargs):
+        return MySQLStyleCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def is_connected(self):
+        return True
+
+
+class AsyncMySQLStyleCursor:
+    """aiomysql-style cursor; statements run on a worker thread so the event loop keeps serving."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, operation, params=()):
+        return await asyncio.to_thread(self._cursor.execute, operation, params)
+
+    async def fetchone(self):
+        return await asyncio.to_thread(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await asyncio.to_thread(self._cursor.fetchall)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._cursor.close()
+
+
+class AsyncMySQLStyleConnection:
+    def __init__(self, path):
+        self._conn = MySQLStyleConnection(path)
+
+    def cursor(self):
+        return AsyncMySQLStyleCursor(self._conn.cursor())
+
+    def close(self):
+        self._conn.close()
+
+
+class AsyncMySQLStylePool:
+    """The subset of an aiomysql pool that api.py uses, over sqlite3 connections."""
+
+    def __init__(self, path, size=4):
+        self._connections = [AsyncMySQLStyleConnection(path) for _ in range(size)]
+        self._idle = asyncio.Queue()
+        for conn in self._connections:
+            self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+
+    async def wait_closed(self):
+        pass
+
+
+async def create_async_pool(path, size=4):
+    return AsyncMySQLStylePool(path, size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--rows', type=int, help='Overrides --scale')
+    parser.add_argument('--article-bytes', type=int, default=256)
+    args = parser.parse_args()
+
+    print(seeded_database(args.rows or SCALES[args.scale], args.article_bytes))
+
+
+if __name__ == '__main__':
+    main()
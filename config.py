@@ -23,6 +23,12 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAX_PAIN_SQLALCHEMY_DATABASE_URI=f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MAX_PAIN_DATABASE}'
+    # Days of snapshots the max pain views show by default; 0 shows all history
+    MAX_PAIN_WINDOW_DAYS = int(os.getenv('MAX_PAIN_WINDOW_DAYS', 30))
+
+    # JSON API (api.py): comma separated bearer tokens, and MySQL connections per API worker
+    API_TOKENS = os.getenv('API_TOKENS', '')
+    API_DB_POOL_SIZE = int(os.getenv('API_DB_POOL_SIZE', 10))
 
     # Mailgun configuration
     MAILGUN_DOMAIN = os.getenv('MAILGUN_DOMAIN')
@@ -0,0 +1,32 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# token changes whenever the data does; updated_at is naive UTC
+DataVersion = namedtuple('DataVersion', 'token updated_at')
+
+NEWS_ARTICLES = 'news_articles'
+
+
+def ensure_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS data_versions
+                      (name VARCHAR(64) PRIMARY KEY, version BIGINT NOT NULL, updated_at DATETIME NOT NULL)''')
+
+
+def bump(cursor, name):
+    """
+    Advance a table's version. Run it in the transaction that changes the table,
+    so readers never see new rows with the old version.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    cursor.execute("UPDATE data_versions SET version = version + 1, updated_at = %s WHERE name = %s", (now, name))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO data_versions (name, version, updated_at) VALUES (%s, 1, %s)", (name, now))
+
+
+def read(cursor, name):
+    """
+    :return: DataVersion for the table, or None if it has never been bumped
+    """
+    cursor.execute("SELECT version, updated_at FROM data_versions WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    return DataVersion(str(row[0]), row[1]) if row else None
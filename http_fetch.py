@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (5, 30)
+USER_AGENT = 'TechunarStocksAI/1.0 (+news ingestion)'
+# Next to this module by default, so every ingest process shares one file whatever its CWD
+VALIDATOR_STORE_PATH = os.getenv('HTTP_VALIDATOR_STORE') or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.http_validators.json')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide requests session.
+
+    The session keeps connections alive per host, retries idempotent requests
+    on connection errors and 429/5xx with exponential backoff, and asks for
+    gzip responses.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=('GET', 'HEAD'),
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'User-Agent': USER_AGENT,
+                    'Accept-Encoding': 'gzip, deflate'
+                })
+                _session = session
+    return _session
+
+
+def get(url, params=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return get_session().get(url, params=params, timeout=timeout, **kwargs)
+
+
+def post(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return get_session().post(url, timeout=timeout, **kwargs)
+
+
+class ValidatorStore:
+    """
+    ETag/Last-Modified values per URL, persisted to a small JSON file.
+
+    Several ingest processes may share the file. Each save merges into what is
+    on disk and replaces it through its own temporary file.
+    """
+
+    def __init__(self, path=VALIDATOR_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._validators = None
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if self._validators is None:
+            self._validators = self._read()
+        return self._validators
+
+    def get(self, url):
+        with self._lock:
+            return dict(self._load().get(url, {}))
+
+    def save(self, url, validators):
+        if not validators:
+            return
+        with self._lock:
+            if self._load().get(url) == validators:
+                return
+            # Start from the file, so other processes' feeds are kept
+            data = self._read()
+            data[url] = validators
+            self._validators = data
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(self.path) or '.',
+                                                 prefix='.http_validators-', suffix='.tmp', delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error saving HTTP validators: {e}")
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+
+validator_store = ValidatorStore()
+
+
+def conditional_get(url, timeout=DEFAULT_TIMEOUT, store=None):
+    """
+    GET a URL with If-None-Match/If-Modified-Since from the previous fetch.
+
+    Validators are not saved here: call store.save(url, validators) once the
+    body has been fully processed, so an interrupted run fetches it again.
+
+    :return: Tuple of (response, validators); response.status_code is 304 when
+             the resource is unchanged
+    """
+    store = store or validator_store
+    headers = {}
+    previous = store.get(url)
+    if previous.get('etag'):
+        headers['If-None-Match'] = previous['etag']
+    if previous.get('last_modified'):
+        headers['If-Modified-Since'] = previous['last_modified']
+
+    response = get(url, timeout=timeout, headers=headers)
+    validators = {}
+    if response.status_code == 200:
+        if response.headers.get('ETag'):
+            validators['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            validators['last_modified'] = response.headers['Last-Modified']
+    return response, validators
@@ -0,0 +1,247 @@
+import os
+import random
+import signal
+import threading
+import time
+from datetime import timezone
+
+import metrics
+import partitions
+from ExtractNews import load_ingest_config, get_db_connection, ensure_news_schema, process_feed, get_ollama_client
+
+# MySQL named lock held by whichever process is currently ingesting
+INGEST_LOCK_NAME = 'techunar_news_ingest'
+DEFAULT_INTERVAL = 300
+DEFAULT_JITTER = 0.1
+LOCK_RETRY_SECONDS = 60
+DEFAULT_MAINTENANCE_INTERVAL = 24 * 3600
+
+
+class FeedSchedule:
+    def __init__(self, url, interval):
+        self.url = url
+        self.interval = interval
+        self.next_run = 0.0
+
+
+def load_feed_schedules(config):
+    """
+    Build per-feed schedules from app.config.
+
+    Every URL in [MoneyControl] cms_urls is polled every [Scheduler] interval
+    seconds unless a "[Feed <url>]" section sets its own interval.
+    """
+    default_interval = config.getfloat('Scheduler', 'interval', fallback=DEFAULT_INTERVAL)
+    schedules = []
+    for url in config.get('MoneyControl', 'cms_urls').split(','):
+        url = url.strip()
+        if not url:
+            continue
+        section = f'Feed {url}'
+        interval = config.getfloat(section, 'interval', fallback=default_interval)
+        schedules.append(FeedSchedule(url, interval))
+    return schedules
+
+
+def ensure_checkpoint_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS feed_checkpoints
+                      (feed_url VARCHAR(512) PRIMARY KEY, last_pub_date DATETIME NOT NULL,
+                       last_guid TEXT, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP)''')
+
+
+def load_checkpoint(cursor, url):
+    cursor.execute("SELECT last_pub_date, last_guid FROM feed_checkpoints WHERE feed_url = %s", (url,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    # Stored as naive UTC
+    return row[0].replace(tzinfo=timezone.utc), row[1]
+
+
+def save_checkpoint(conn, cursor, url, checkpoint):
+    pub_date, guid = checkpoint
+    cursor.execute('''INSERT INTO feed_checkpoints (feed_url, last_pub_date, last_guid)
+                      VALUES (%s, %s, %s)
+                      ON DUPLICATE KEY UPDATE last_pub_date = VALUES(last_pub_date), last_guid = VALUES(last_guid)''',
+                   (url, pub_date.astimezone(timezone.utc).replace(tzinfo=None), guid))
+    conn.commit()
+
+
+class IngestScheduler:
+    """
+    Polls RSS feeds on their own intervals and ingests only items past each feed's checkpoint.
+
+    Only one scheduler ingests at a time across all processes and hosts sharing
+    the database: the others wait on a MySQL named lock and take over if the
+    holder goes away.
+    """
+
+    def __init__(self, config=None, jitter=None):
+        self.config = config or load_ingest_config()
+        self.feeds = load_feed_schedules(self.config)
+        self.jitter = jitter if jitter is not None else self.config.getfloat('Scheduler', 'jitter', fallback=DEFAULT_JITTER)
+        self.ollama_api_url = self.config.get('Ollama', 'api_url')
+        self.ollama_model = self.config.get('Ollama', 'model')
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_conn = None
+        # Partition upkeep runs on the lock holder, first right after taking the lock
+        self.maintenance_interval = self.config.getfloat('Retention', 'maintenance_interval',
+                                                         fallback=DEFAULT_MAINTENANCE_INTERVAL)
+        self._next_maintenance = 0.0
+        self._schema_ready = False
+
+    def start(self):
+        """Run the scheduler on a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='news-ingest', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        """
+        Request shutdown and wait for the article in flight to be committed
+        and its feed checkpoint saved.
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def run(self):
+        try:
+            while not self._stop.is_set():
+                if not self._hold_lock():
+                    self._stop.wait(LOCK_RETRY_SECONDS)
+                    continue
+                if not self._schema_ready and not self._ensure_schema():
+                    self._stop.wait(LOCK_RETRY_SECONDS)
+                    continue
+                now = time.monotonic()
+                if self.maintenance_interval > 0 and self._next_maintenance <= now:
+                    self._maintain()
+                    self._next_maintenance = now + self.maintenance_interval
+                due = [feed for feed in self.feeds if feed.next_run <= now]
+                if due:
+                    self._run_cycle(due)
+                if self.feeds:
+                    wait = min(feed.next_run for feed in self.feeds) - time.monotonic()
+                    self._stop.wait(max(wait, 1.0))
+                else:
+                    self._stop.wait(LOCK_RETRY_SECONDS)
+        finally:
+            self._release_lock()
+
+    def _ensure_schema(self):
+        """Create the ingest tables once, on the first run after taking the lock."""
+        try:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                ensure_news_schema(cursor)
+                ensure_checkpoint_schema(cursor)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error creating ingest tables: {e}")
+            return False
+        self._schema_ready = True
+        return True
+
+    def _run_cycle(self, feeds):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            for feed in feeds:
+                if self._stop.is_set():
+                    break
+                try:
+                    self._poll(feed, conn, cursor)
+                except Exception as e:
+                    print(f"Error ingesting feed {feed.url}: {e}")
+                feed.next_run = time.monotonic() + self._next_delay(feed)
+        finally:
+            conn.close()
+
+    def _maintain(self):
+        try:
+            conn = get_db_connection()
+            try:
+                partitions.maintain(conn, self.config)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error maintaining partitions: {e}")
+
+    def _poll(self, feed, conn, cursor):
+        checkpoint = load_checkpoint(cursor, feed.url)
+        # On shutdown process_feed returns early with the progress made so far
+        with metrics.stage('feed'):
+            new_checkpoint = process_feed(
+                feed.url, conn, cursor, self.ollama_api_url, self.ollama_model,
+                checkpoint=checkpoint, should_stop=self._stop.is_set
+            )
+        if new_checkpoint is not None and new_checkpoint != checkpoint:
+            save_checkpoint(conn, cursor, feed.url, new_checkpoint)
+
+    def _next_delay(self, feed):
+        # Jitter spreads feeds out so they do not all fire on the same tick
+        spread = feed.interval * self.jitter
+        return max(1.0, feed.interval + random.uniform(-spread, spread))
+
+    def _hold_lock(self):
+        if self._lock_conn is not None:
+            try:
+                if self._lock_conn.is_connected():
+                    return True
+            except Exception:
+                pass
+            # Connection dropped, and MySQL released the lock with it
+            self._lock_conn = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (INGEST_LOCK_NAME,))
+            acquired = cursor.fetchone()[0] == 1
+        except Exception as e:
+            print(f"Error acquiring ingest lock: {e}")
+            return False
+        if acquired:
+            self._lock_conn = conn
+            print("Acquired news ingest lock")
+            # Load the model now rather than on the first article
+            get_ollama_client(self.ollama_api_url, self.ollama_model).warm_up()
+            return True
+        conn.close()
+        return False
+
+    def _release_lock(self):
+        if self._lock_conn is None:
+            return
+        try:
+            cursor = self._lock_conn.cursor()
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (INGEST_LOCK_NAME,))
+            cursor.fetchone()
+            self._lock_conn.close()
+        except Exception as e:
+            print(f"Error releasing ingest lock: {e}")
+        self._lock_conn = None
+
+
+if __name__ == "__main__":
+    # Alerts go out from whichever process ingests the article
+    from stock_alerts import install_stock_alerts
+    install_stock_alerts()
+    scheduler = IngestScheduler()
+
+    def shutdown(signum, frame):
+        print("Stopping news ingestion...")
+        scheduler.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    # Standalone ingestion has no web app, so serve /metrics on its own port
+    if os.getenv('METRICS_PORT'):
+        metrics.serve(int(os.getenv('METRICS_PORT')))
+    scheduler.run()
@@ -0,0 +1,390 @@
+"""
+Queue-based news ingestion, for running workers on any number of hosts.
+
+Work is shared through the ingest_jobs table (see job_queue.py):
+
+  feed         one recurring job per feed in app.config. Fetches the feed,
+               queues an article job for every link not yet stored and
+               reschedules itself [Scheduler] interval seconds later. The feed
+               checkpoint travels in the job payload.
+  article      scrapes and analyzes one link, then inserts it. The job key is
+               derived from the link, so a link is queued and analyzed once
+               however many feeds or workers see it. Stock alerts go out from
+               the worker that stores the article; the web app's live feed
+               polls the database, so it sees articles from every worker.
+  maintenance  one recurring job that runs partitions.maintain every
+               [Retention] maintenance_interval seconds on whichever worker
+               claims it.
+
+Each worker process claims up to [Ollama] max_parallel jobs at a time, so
+point every host at its own Ollama with --ollama-url and run as many workers
+as it has capacity for. The single-process ingest_scheduler.py remains the
+simpler choice for one host; do not run both against one database.
+
+Usage: python ingest_worker.py [--workers 2] [--kinds feed,article,maintenance] [--ollama-url URL]
+       python ingest_worker.py --status | --dead | --retry-dead
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import article_store
+import http_fetch
+import job_queue
+import metrics
+import partitions
+from ExtractNews import (load_ingest_config, get_db_connection, ensure_news_schema, fetch_feed_items,
+                         is_at_or_before, scrape_and_analyze, save_articles, get_ollama_client)
+from ingest_scheduler import load_feed_schedules, DEFAULT_JITTER, DEFAULT_MAINTENANCE_INTERVAL
+from news_pubsub import broker
+
+FEED = 'feed'
+ARTICLE = 'article'
+MAINTENANCE = 'maintenance'
+KINDS = (FEED, ARTICLE, MAINTENANCE)
+# Kinds that reschedule themselves; job_queue retries them instead of dead-lettering
+RECURRING_KINDS = (FEED, MAINTENANCE)
+MAINTENANCE_KEY = 'maintenance:partitions'
+# Seconds to wait before claiming again when the queue has nothing due
+IDLE_SECONDS = 2.0
+RECONNECT_SECONDS = 10.0
+DEFAULT_DONE_RETENTION_DAYS = 7
+
+
+def feed_key(url):
+    return 'feed:' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def article_key(link):
+    return 'article:' + article_store.link_hash(link)
+
+
+def entry_payload(entry):
+    return dict(entry, pubDate=entry['pubDate'].isoformat())
+
+
+def payload_entry(payload):
+    return dict(payload, pubDate=datetime.fromisoformat(payload['pubDate']))
+
+
+def seed_feeds(queue, config):
+    """
+    Queue a feed job for every configured feed that does not have one yet,
+    and requeue feed jobs left dead by versions that dead-lettered them.
+    Changing a feed's interval takes effect after its next run.
+
+    :return: Number of feed jobs added
+    """
+    queue.retry_dead(FEED)
+    added = 0
+    for feed in load_feed_schedules(config):
+        payload = {'url': feed.url, 'interval': feed.interval, 'checkpoint': None}
+        added += queue.enqueue(feed_key(feed.url), FEED, payload)
+    return added
+
+
+def seed_maintenance(queue, config):
+    """
+    Queue the partition maintenance job if it does not exist yet, or requeue it if dead.
+
+    :return: True if the job was added
+    """
+    queue.retry_dead(MAINTENANCE)
+    interval = config.getfloat('Retention', 'maintenance_interval', fallback=DEFAULT_MAINTENANCE_INTERVAL)
+    return queue.enqueue(MAINTENANCE_KEY, MAINTENANCE, {'interval': interval})
+
+
+class IngestWorker:
+    """
+    Claims and runs ingest jobs until stopped.
+
+    :param connect: Callable returning a new DB connection
+    :param kinds: Job kinds this worker takes
+    :param ollama_api_url: Overrides [Ollama] api_url
+    :param skip_locked: Passed to JobQueue; False for databases without SKIP LOCKED
+    """
+
+    def __init__(self, config=None, connect=get_db_connection, kinds=KINDS, ollama_api_url=None, skip_locked=True):
+        self.config = config or load_ingest_config()
+        self.connect = connect
+        self.kinds = tuple(kinds)
+        self.skip_locked = skip_locked
+        self.owner = job_queue.worker_id()
+        self.ollama_api_url = ollama_api_url or self.config.get('Ollama', 'api_url')
+        self.ollama_model = self.config.get('Ollama', 'model')
+        self.jitter = self.config.getfloat('Scheduler', 'jitter', fallback=DEFAULT_JITTER)
+        self.done_retention_days = self.config.getfloat('Queue', 'done_retention_days',
+                                                        fallback=DEFAULT_DONE_RETENTION_DAYS)
+        self.store = article_store.store_from_config(self.config)
+        self._stop = threading.Event()
+        self.conn = None
+        self.cursor = None
+        self.queue = None
+
+    def _open_queue(self):
+        return job_queue.JobQueue.from_config(self.connect(), self.config, skip_locked=self.skip_locked,
+                                              recurring_kinds=RECURRING_KINDS)
+
+    def stop(self):
+        """Finish the jobs in hand and exit run()."""
+        self._stop.set()
+
+    def run(self):
+        client = get_ollama_client(self.ollama_api_url, self.ollama_model)
+        batch_size = max(1, client.max_parallel)
+        heartbeat = None
+        next_housekeeping = 0.0
+        with ThreadPoolExecutor(max_workers=batch_size, thread_name_prefix='ingest') as executor:
+            while not self._stop.is_set():
+                try:
+                    if self.queue is None:
+                        self.queue = self._open_queue()
+                        self.conn, self.cursor = self.queue.conn, self.queue.cursor
+                        heartbeat = job_queue.Heartbeat(self._open_queue, self.owner,
+                                                        self.queue.lease_seconds / 3).start()
+                        print(f"Ingest worker {self.owner} taking {', '.join(self.kinds)} jobs")
+                    now = time.monotonic()
+                    if next_housekeeping <= now:
+                        self._housekeeping()
+                        next_housekeeping = now + self.queue.lease_seconds / 2
+                    jobs = self.queue.claim(self.owner, self.kinds, limit=batch_size)
+                    if not jobs:
+                        self._stop.wait(IDLE_SECONDS)
+                        continue
+                    for job in jobs:
+                        heartbeat.hold(job.key)
+                    try:
+                        for job in jobs:
+                            if job.kind == FEED:
+                                self._run_job(job, self._run_feed)
+                            elif job.kind == MAINTENANCE:
+                                self._run_job(job, self._run_maintenance)
+                        self._run_articles([job for job in jobs if job.kind == ARTICLE], client, executor, heartbeat)
+                    finally:
+                        for job in jobs:
+                            heartbeat.release(job.key)
+                except Exception as e:
+                    # Most likely the database went away; start over on a new connection
+                    print(f"Error in ingest worker: {e}")
+                    self._close()
+                    if heartbeat is not None:
+                        heartbeat.stop()
+                        heartbeat = None
+                    self._stop.wait(RECONNECT_SECONDS)
+        if heartbeat is not None:
+            heartbeat.stop()
+        self._close()
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = self.cursor = self.queue = None
+
+    def _housekeeping(self):
+        released = self.queue.requeue_expired()
+        if released:
+            print(f"Released {released} job(s) with expired leases")
+        self.queue.purge_done(self.done_retention_days, ARTICLE)
+
+    def _run_job(self, job, handler):
+        """Run one job's handler, recording a failure against the job."""
+        try:
+            handler(job)
+        except Exception as e:
+            self.conn.rollback()
+            self._fail(job, e)
+
+    def _fail(self, job, error):
+        state = self.queue.fail(job, self.owner, error)
+        result = {job_queue.QUEUED: 'retry', job_queue.DEAD: 'dead'}.get(state, 'lease_lost')
+        metrics.INGEST_JOBS.inc(kind=job.kind, result=result)
+        print(f"Job {job.key} failed (attempt {job.attempts} of {job.max_attempts}, {result}): {error}")
+
+    def _finish(self, job, **kwargs):
+        """Commit the job's writes if its lease is still held, else roll them back."""
+        if self.queue.complete(job, self.owner, commit=False, **kwargs):
+            self.conn.commit()
+            metrics.INGEST_JOBS.inc(kind=job.kind, result='done')
+            return True
+        self.conn.rollback()
+        metrics.INGEST_JOBS.inc(kind=job.kind, result='lease_lost')
+        print(f"Lost the lease on {job.key}; discarded its work")
+        return False
+
+    def _link_exists(self, link):
+        self.cursor.execute("SELECT 1 FROM news_articles WHERE link = %s LIMIT 1", (link,))
+        return self.cursor.fetchone() is not None
+
+    def _run_feed(self, job):
+        url = job.payload['url']
+        checkpoint = job.payload.get('checkpoint')
+        if checkpoint is not None:
+            checkpoint = (datetime.fromisoformat(checkpoint[0]), checkpoint[1])
+        with metrics.stage('feed'):
+            items, validators = fetch_feed_items(url)
+        queued = 0
+        for entry in items or []:
+            if checkpoint is not None and is_at_or_before(entry, checkpoint):
+                continue
+            if self._link_exists(entry['link']):
+                metrics.INGEST_ARTICLES.inc(result='existing')
+                continue
+            if self.queue.enqueue(article_key(entry['link']), ARTICLE, entry_payload(entry), commit=False):
+                metrics.INGEST_ARTICLES.inc(result='new')
+                queued += 1
+        payload = dict(job.payload)
+        if items:
+            # Items are oldest first
+            payload['checkpoint'] = [items[-1]['pubDate'].isoformat(), items[-1]['guid']]
+        spread = job.payload['interval'] * self.jitter
+        delay = max(1.0, job.payload['interval'] + random.uniform(-spread, spread))
+        if self._finish(job, reschedule_after=delay, payload=payload):
+            if items is not None:
+                http_fetch.validator_store.save(url, validators)
+            print(f"Queued {queued} new article(s) from {url}")
+
+    def _run_maintenance(self, job):
+        # Its own connection: partitions.maintain commits as it goes and ALTER TABLE
+        # commits implicitly, which must not sweep up the queue's transaction
+        conn = self.connect()
+        try:
+            with metrics.stage('maintenance'):
+                partitions.maintain(conn, self.config)
+        finally:
+            conn.close()
+        self._finish(job, reschedule_after=job.payload['interval'])
+
+    def _run_articles(self, jobs, client, executor, heartbeat):
+        """Scrape and analyze the batch concurrently, then store each article in its own transaction."""
+        futures = {}
+        for job in jobs:
+            entry = payload_entry(job.payload)
+            if self._link_exists(entry['link']):
+                metrics.INGEST_ARTICLES.inc(result='existing')
+                self._finish(job)
+                continue
+            # Outside any transaction: this is the slow part, and holds no locks
+            futures[job.key] = (entry, executor.submit(scrape_and_analyze, entry, client))
+        for job in jobs:
+            if job.key not in futures:
+                continue
+            entry, future = futures[job.key]
+            try:
+                result = future.result()
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            if heartbeat.lost(job.key):
+                metrics.INGEST_JOBS.inc(kind=job.kind, result='lease_lost')
+                print(f"Lost the lease on {job.key}; discarded its analysis")
+                continue
+            self._run_job(job, lambda job: self._store_article(job, entry, result))
+
+    def _store_article(self, job, entry, result):
+        published = save_articles(self.cursor, self.store, [(entry, result)])
+        if self._finish(job):
+            broker.publish(published)
+
+
+def run_worker(index, options):
+    """Entry point of one worker process."""
+    load_dotenv()
+    worker = IngestWorker(kinds=options['kinds'], ollama_api_url=options['ollama_url'],
+                          skip_locked=not options['no_skip_locked'])
+
+    def shutdown(signum, frame):
+        worker.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    if ARTICLE in worker.kinds:
+        # Alerts go out from whichever process ingests the article
+        from stock_alerts import install_stock_alerts
+        install_stock_alerts()
+    # One metrics port per worker process
+    if os.getenv('METRICS_PORT'):
+        metrics.serve(int(os.getenv('METRICS_PORT')) + index)
+    worker.run()
+
+
+def print_status(queue):
+    counts = queue.counts()
+    if not counts:
+        print("No ingest jobs")
+    for (kind, state), count in sorted(counts.items()):
+        print(f"{kind:<8} {state:<8} {count:>8,}")
+
+
+def print_dead(queue):
+    rows = queue.dead_jobs()
+    if not rows:
+        print("No dead jobs")
+    for key, kind, attempts, error, updated_at in rows:
+        print(f"{updated_at}  {kind:<8} {key}  attempts {attempts}: {error}")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1, help='worker processes to run on this host')
+    parser.add_argument('--kinds', default=','.join(KINDS), help='comma separated job kinds to take')
+    parser.add_argument('--ollama-url', help='Ollama generate URL for this host (default: [Ollama] api_url)')
+    parser.add_argument('--no-skip-locked', action='store_true', help='for MySQL before 8.0')
+    parser.add_argument('--status', action='store_true', help='print job counts by state and exit')
+    parser.add_argument('--dead', action='store_true', help='list dead jobs and exit')
+    parser.add_argument('--retry-dead', action='store_true', help='requeue dead jobs and exit')
+    args = parser.parse_args()
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        parser.error(f"unknown job kinds: {', '.join(sorted(unknown))}")
+
+    config = load_ingest_config()
+    queue = job_queue.JobQueue.from_config(get_db_connection(), config, recurring_kinds=RECURRING_KINDS)
+    ensure_news_schema(queue.cursor)
+    job_queue.ensure_schema(queue.cursor)
+    if args.status or args.dead or args.retry_dead:
+        if args.retry_dead:
+            print(f"Requeued {queue.retry_dead()} dead job(s)")
+        if args.dead:
+            print_dead(queue)
+        if args.status:
+            print_status(queue)
+        queue.conn.close()
+        return
+    added = seed_feeds(queue, config)
+    if added:
+        print(f"Queued {added} feed job(s)")
+    if seed_maintenance(queue, config):
+        print("Queued the partition maintenance job")
+    queue.conn.close()
+
+    options = {'kinds': kinds, 'ollama_url': args.ollama_url, 'no_skip_locked': args.no_skip_locked}
+    if args.workers == 1:
+        run_worker(0, options)
+        return
+    processes = [multiprocessing.Process(target=run_worker, args=(index, options), name=f'ingest-worker-{index}')
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    # Ctrl+C reaches the whole process group; each worker finishes its jobs in hand
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: [process.terminate() for process in processes])
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
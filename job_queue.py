@@ -0,0 +1,354 @@
+"""
+Database-backed job queue with leases, for ingestion spread over many workers.
+
+A job is a row in ingest_jobs keyed by job_key, so the same feed or article
+can only ever be queued once. Workers claim due jobs with SELECT ... FOR
+UPDATE SKIP LOCKED, which lets concurrent claimers pass over each other's
+rows instead of waiting, and hold them under a lease that a heartbeat keeps
+extending. A worker that dies stops heartbeating; its lease runs out and
+requeue_expired() hands the job to someone else.
+
+Completing or failing a job is fenced on the lease: it only takes effect if
+the job is still leased to the caller, so work done under a lost lease is
+rolled back rather than applied twice.
+
+Failed jobs are retried with exponential backoff and moved to the dead
+state after max_attempts, where they stay for inspection until retry_dead().
+Recurring kinds, such as feeds, are never dead-lettered: once out of
+attempts they keep retrying every retry_max seconds, since nothing else
+would ever queue them again.
+"""
+import json
+import os
+import socket
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+DEAD = 'dead'
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE = 30
+DEFAULT_RETRY_MAX = 3600
+
+Job = namedtuple('Job', 'key kind payload attempts max_attempts')
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def _timestamp(value):
+    # Text works for DATETIME comparisons in MySQL and the SQLite stand-in alike
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def worker_id():
+    """host:pid, unique among live workers."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def ensure_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ingest_jobs
+                      (job_key VARCHAR(191) PRIMARY KEY, kind VARCHAR(32) NOT NULL, payload TEXT NOT NULL,
+                       state VARCHAR(16) NOT NULL, attempts INT NOT NULL DEFAULT 0, max_attempts INT NOT NULL,
+                       run_after DATETIME NOT NULL, leased_by VARCHAR(128), lease_expires DATETIME,
+                       last_error TEXT, updated_at DATETIME NOT NULL,
+                       INDEX ingest_jobs_due (state, run_after), INDEX ingest_jobs_lease (state, lease_expires))''')
+
+
+class JobQueue:
+    """
+    Queue operations on one connection. Every method commits unless passed commit=False.
+
+    :param skip_locked: Claim with FOR UPDATE SKIP LOCKED (MySQL 8+). Without it
+                        claims are still safe, since each claim is a conditional
+                        UPDATE, but concurrent claimers may contend for the same rows.
+    :param recurring_kinds: Job kinds that reschedule themselves and so are
+                            retried indefinitely instead of moving to dead
+    """
+
+    def __init__(self, conn, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_base=DEFAULT_RETRY_BASE, retry_max=DEFAULT_RETRY_MAX, skip_locked=True,
+                 recurring_kinds=()):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.skip_locked = skip_locked
+        self.recurring_kinds = tuple(recurring_kinds)
+
+    @classmethod
+    def from_config(cls, conn, config, **kwargs):
+        """Queue settings from the [Queue] section of app.config."""
+        options = dict(
+            lease_seconds=config.getfloat('Queue', 'lease_seconds', fallback=DEFAULT_LEASE_SECONDS),
+            max_attempts=config.getint('Queue', 'max_attempts', fallback=DEFAULT_MAX_ATTEMPTS),
+            retry_base=config.getfloat('Queue', 'retry_base', fallback=DEFAULT_RETRY_BASE),
+            retry_max=config.getfloat('Queue', 'retry_max', fallback=DEFAULT_RETRY_MAX),
+        )
+        options.update(kwargs)
+        return cls(conn, **options)
+
+    def enqueue(self, key, kind, payload, run_after=None, commit=True):
+        """
+        Queue a job unless one with the same key already exists, in any state.
+
+        :return: True if the job was added
+        """
+        self.cursor.execute("SELECT 1 FROM ingest_jobs WHERE job_key = %s", (key,))
+        if self.cursor.fetchone() is not None:
+            return False
+        now = utcnow()
+        try:
+            self.cursor.execute('''INSERT INTO ingest_jobs
+                                   (job_key, kind, payload, state, attempts, max_attempts, run_after, updated_at)
+                                   VALUES (%s, %s, %s, %s, 0, %s, %s, %s)''',
+                                (key, kind, json.dumps(payload), QUEUED, self.max_attempts,
+                                 _timestamp(run_after or now), _timestamp(now)))
+        except Exception:
+            # Another worker queued the same key between the check and the insert
+            self.cursor.execute("SELECT 1 FROM ingest_jobs WHERE job_key = %s", (key,))
+            if self.cursor.fetchone() is None:
+                raise
+            return False
+        if commit:
+            self.conn.commit()
+        return True
+
+    def claim(self, owner, kinds, limit=1):
+        """
+        Lease up to limit due jobs of the given kinds.
+
+        :return: List of Job
+        """
+        now = utcnow()
+        placeholders = ', '.join(['%s'] * len(kinds))
+        query = f'''SELECT job_key FROM ingest_jobs
+                    WHERE state = %s AND run_after <= %s AND kind IN ({placeholders})
+                    ORDER BY run_after LIMIT %s'''
+        if self.skip_locked:
+            query += ' FOR UPDATE SKIP LOCKED'
+        self.cursor.execute(query, [QUEUED, _timestamp(now)] + list(kinds) + [limit])
+        keys = [row[0] for row in self.cursor.fetchall()]
+        claimed = []
+        for key in keys:
+            # Conditional, so two claimers of the same row cannot both win
+            self.cursor.execute('''UPDATE ingest_jobs
+                                   SET state = %s, leased_by = %s, lease_expires = %s, attempts = attempts + 1,
+                                       updated_at = %s
+                                   WHERE job_key = %s AND state = %s''',
+                                (RUNNING, owner, _timestamp(now + timedelta(seconds=self.lease_seconds)),
+                                 _timestamp(now), key, QUEUED))
+            if self.cursor.rowcount == 1:
+                claimed.append(key)
+        self.conn.commit()
+        jobs = []
+        for key in claimed:
+            self.cursor.execute("SELECT job_key, kind, payload, attempts, max_attempts FROM ingest_jobs WHERE job_key = %s",
+                                (key,))
+            key, kind, payload, attempts, max_attempts = self.cursor.fetchone()
+            jobs.append(Job(key, kind, json.loads(payload), attempts, max_attempts))
+        return jobs
+
+    def heartbeat(self, owner, keys):
+        """
+        Extend the leases on keys still held by owner.
+
+        :return: The keys whose lease was lost
+        """
+        now = utcnow()
+        lost = []
+        for key in keys:
+            self.cursor.execute('''UPDATE ingest_jobs SET lease_expires = %s, updated_at = %s
+                                   WHERE job_key = %s AND leased_by = %s AND state = %s''',
+                                (_timestamp(now + timedelta(seconds=self.lease_seconds)), _timestamp(now),
+                                 key, owner, RUNNING))
+            if self.cursor.rowcount == 0:
+                lost.append(key)
+        self.conn.commit()
+        return lost
+
+    def complete(self, job, owner, reschedule_after=None, payload=None, commit=True):
+        """
+        Mark a job done, or queue it again reschedule_after seconds from now
+        for recurring jobs. Call it before committing the job's own writes,
+        with commit=False, to make them conditional on still holding the lease.
+
+        :param payload: Replaces the payload of a rescheduled job
+
+        :return: False if the lease was lost; the caller must roll back
+        """
+        now = utcnow()
+        if reschedule_after is None:
+            self.cursor.execute('''UPDATE ingest_jobs SET state = %s, leased_by = NULL, lease_expires = NULL,
+                                          last_error = NULL, updated_at = %s
+                                   WHERE job_key = %s AND leased_by = %s AND state = %s''',
+                                (DONE, _timestamp(now), job.key, owner, RUNNING))
+        else:
+            self.cursor.execute('''UPDATE ingest_jobs SET state = %s, leased_by = NULL, lease_expires = NULL,
+                                          attempts = 0, last_error = NULL, run_after = %s, payload = %s,
+                                          updated_at = %s
+                                   WHERE job_key = %s AND leased_by = %s AND state = %s''',
+                                (QUEUED, _timestamp(now + timedelta(seconds=reschedule_after)),
+                                 json.dumps(job.payload if payload is None else payload), _timestamp(now),
+                                 job.key, owner, RUNNING))
+        held = self.cursor.rowcount == 1
+        if commit:
+            self.conn.commit()
+        return held
+
+    def fail(self, job, owner, error):
+        """
+        Retry a failed job with exponential backoff, or move it to dead once
+        it has used max_attempts. Recurring jobs retry every retry_max seconds instead.
+
+        :return: The job's new state, or None if the lease was already lost
+        """
+        now = utcnow()
+        exhausted = job.attempts >= job.max_attempts
+        if exhausted and job.kind not in self.recurring_kinds:
+            state, run_after = DEAD, now
+        else:
+            delay = self.retry_max if exhausted else min(self.retry_max, self.retry_base * 2 ** (job.attempts - 1))
+            state, run_after = QUEUED, now + timedelta(seconds=delay)
+        self.cursor.execute('''UPDATE ingest_jobs SET state = %s, leased_by = NULL, lease_expires = NULL,
+                                      run_after = %s, last_error = %s, updated_at = %s
+                               WHERE job_key = %s AND leased_by = %s AND state = %s''',
+                            (state, _timestamp(run_after), str(error)[:2000], _timestamp(now), job.key, owner, RUNNING))
+        held = self.cursor.rowcount == 1
+        self.conn.commit()
+        return state if held else None
+
+    def requeue_expired(self):
+        """
+        Return jobs whose lease ran out to the queue, or to dead when they
+        have no attempts left (a job that keeps killing its worker). Recurring
+        jobs always go back to the queue.
+
+        :return: Number of jobs released
+        """
+        now = _timestamp(utcnow())
+        query = '''UPDATE ingest_jobs SET state = %s, leased_by = NULL, lease_expires = NULL,
+                          last_error = 'lease expired', updated_at = %s
+                   WHERE state = %s AND lease_expires < %s AND attempts >= max_attempts'''
+        params = [DEAD, now, RUNNING, now]
+        if self.recurring_kinds:
+            query += f" AND kind NOT IN ({', '.join(['%s'] * len(self.recurring_kinds))})"
+            params.extend(self.recurring_kinds)
+        self.cursor.execute(query, params)
+        released = self.cursor.rowcount
+        self.cursor.execute('''UPDATE ingest_jobs SET state = %s, leased_by = NULL, lease_expires = NULL,
+                                      run_after = %s, last_error = 'lease expired', updated_at = %s
+                               WHERE state = %s AND lease_expires < %s''',
+                            (QUEUED, now, now, RUNNING, now))
+        released += self.cursor.rowcount
+        self.conn.commit()
+        return released
+
+    def retry_dead(self, kind=None):
+        """Give dead jobs a fresh set of attempts. :return: Number of jobs requeued"""
+        now = _timestamp(utcnow())
+        query = '''UPDATE ingest_jobs SET state = %s, attempts = 0, run_after = %s, updated_at = %s
+                   WHERE state = %s'''
+        params = [QUEUED, now, now, DEAD]
+        if kind:
+            query += ' AND kind = %s'
+            params.append(kind)
+        self.cursor.execute(query, params)
+        requeued = self.cursor.rowcount
+        self.conn.commit()
+        return requeued
+
+    def purge_done(self, older_than_days, kind):
+        """Delete finished jobs of a kind last updated more than older_than_days ago."""
+        cutoff = _timestamp(utcnow() - timedelta(days=older_than_days))
+        self.cursor.execute("DELETE FROM ingest_jobs WHERE state = %s AND kind = %s AND updated_at < %s",
+                            (DONE, kind, cutoff))
+        purged = self.cursor.rowcount
+        self.conn.commit()
+        return purged
+
+    def counts(self):
+        """:return: {(kind, state): jobs}"""
+        self.cursor.execute("SELECT kind, state, COUNT(*) FROM ingest_jobs GROUP BY kind, state")
+        counts = {(kind, state): count for kind, state, count in self.cursor.fetchall()}
+        self.conn.commit()
+        return counts
+
+    def dead_jobs(self, limit=50):
+        self.cursor.execute('''SELECT job_key, kind, attempts, last_error, updated_at FROM ingest_jobs
+                               WHERE state = %s ORDER BY updated_at DESC LIMIT %s''', (DEAD, limit))
+        rows = self.cursor.fetchall()
+        self.conn.commit()
+        return rows
+
+
+class Heartbeat:
+    """
+    Background thread extending the leases of the jobs a worker holds.
+
+    Runs on its own connection; lost() tells the worker a lease has gone so it
+    can stop early rather than find out when completing.
+    """
+
+    def __init__(self, queue_factory, owner, interval):
+        self._queue_factory = queue_factory
+        self.owner = owner
+        self.interval = interval
+        self._keys = set()
+        self._lost = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def hold(self, key):
+        with self._lock:
+            self._keys.add(key)
+            self._lost.discard(key)
+
+    def release(self, key):
+        with self._lock:
+            self._keys.discard(key)
+
+    def lost(self, key):
+        with self._lock:
+            return key in self._lost
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='job-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        queue = None
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                keys = list(self._keys)
+            if not keys:
+                continue
+            try:
+                if queue is None:
+                    queue = self._queue_factory()
+                lost = queue.heartbeat(self.owner, keys)
+            except Exception as e:
+                print(f"Error extending job leases: {e}")
+                queue = None
+                continue
+            if lost:
+                with self._lock:
+                    self._lost.update(lost)
+                print(f"Lost the lease on {len(lost)} job(s)")
+        if queue is not None:
+            queue.conn.close()
@@ -0,0 +1,548 @@
+import asyncio
+import glob
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, others=()):
+        """:param others: snapshot() results from other processes, added in"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for snapshot in others:
+            for key, value in snapshot:
+                key = tuple(key)
+                values[key] = values.get(key, 0) + value
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then sum and count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self):
+        """Return {label values: (count, sum)} for every series."""
+        with self._lock:
+            return {key: (series[-1], series[-2]) for key, series in self._series.items()}
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._series.items()]
+
+    def render(self, others=()):
+        """:param others: snapshot() results from other processes, added in"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            merged = {key: list(series) for key, series in self._series.items()}
+        for snapshot in others:
+            for key, series in snapshot:
+                key = tuple(key)
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = list(series)
+                elif len(total) == len(series):
+                    merged[key] = [a + b for a, b in zip(total, series)]
+        for key, series in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}')
+        return lines
+
+
+class Registry:
+    """Process-local metrics; see render_all() for the totals of all gunicorn workers."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render(self, others=()):
+        """:param others: snapshot() results from other processes, added in"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render([snapshot.get(metric.name, ()) for snapshot in others]))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# A directory shared by the gunicorn workers of one app. Each worker writes its
+# numbers there every METRICS_FLUSH_SECONDS and /metrics adds them all up, so a
+# scrape reports the same totals whichever worker answers. Files not updated
+# for METRICS_RETIRE_SECONDS belong to exited workers and are folded into
+# retired.json, so counters never go backwards and recycled workers do not
+# pile up files. Unset, /metrics reports the answering worker only.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+METRICS_RETIRE_SECONDS = float(os.getenv('METRICS_RETIRE_SECONDS', 300))
+RETIRED_SNAPSHOT = 'retired.json'
+_snapshot_path = None
+_snapshot_pid = None
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def write_snapshot():
+    """Write this process's metrics to METRICS_DIR."""
+    global _snapshot_path, _snapshot_pid
+    if _snapshot_pid != os.getpid():
+        # Start time as well as pid, so a reused pid never overwrites an exited worker's totals
+        _snapshot_path = os.path.join(METRICS_DIR, f'{os.getpid()}-{time.time_ns()}.json')
+        _snapshot_pid = os.getpid()
+    partial = _snapshot_path + '.partial'
+    with open(partial, 'w') as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(partial, _snapshot_path)
+
+
+def start_snapshot_flusher():
+    """Write snapshots from a daemon thread; call per request so it starts in each forked worker."""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        os.makedirs(METRICS_DIR, exist_ok=True)
+
+        def flush():
+            while True:
+                try:
+                    write_snapshot()
+                except OSError as e:
+                    print(f"Error writing metrics snapshot: {e}")
+                time.sleep(METRICS_FLUSH_SECONDS)
+
+        threading.Thread(target=flush, name='metrics-flush', daemon=True).start()
+
+
+def _merge_snapshots(snapshots):
+    """Add Registry.snapshot() results together into one snapshot."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, entries in snapshot.items():
+            series = merged.setdefault(name, {})
+            for key, value in entries:
+                key = tuple(key)
+                total = series.get(key)
+                if total is None:
+                    series[key] = value
+                elif isinstance(value, list):
+                    # Histogram buckets, sum and count; bucket layouts always match within one app
+                    if len(total) == len(value):
+                        series[key] = [a + b for a, b in zip(total, value)]
+                else:
+                    series[key] = total + value
+    return {name: [[list(key), value] for key, value in series.items()] for name, series in merged.items()}
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Being replaced or removed right now
+        return None
+
+
+def prune_snapshots():
+    """
+    Fold the snapshots of workers that stopped writing into retired.json.
+
+    :return: Number of snapshot files folded
+    """
+    import fcntl
+
+    cutoff = time.time() - METRICS_RETIRE_SECONDS
+    retired_path = os.path.join(METRICS_DIR, RETIRED_SNAPSHOT)
+    with open(os.path.join(METRICS_DIR, '.prune.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Another worker is pruning
+            return 0
+        stale = []
+        for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+            if path in (retired_path, _snapshot_path):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    stale.append(path)
+            except OSError:
+                continue
+        if not stale:
+            return 0
+        snapshots = [_read_snapshot(retired_path) or {}] + [_read_snapshot(path) or {} for path in stale]
+        partial = retired_path + '.partial'
+        with open(partial, 'w') as f:
+            json.dump(_merge_snapshots(snapshots), f)
+        os.replace(partial, retired_path)
+        for path in stale:
+            os.unlink(path)
+        return len(stale)
+
+
+def render_all():
+    """Render this process's metrics plus every other worker's from METRICS_DIR."""
+    if not METRICS_DIR:
+        return REGISTRY.render()
+    start_snapshot_flusher()
+    write_snapshot()
+    try:
+        prune_snapshots()
+    except OSError as e:
+        print(f"Error pruning metrics snapshots: {e}")
+    others = []
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        if path == _snapshot_path:
+            continue
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            others.append(snapshot)
+    return REGISTRY.render(others)
+
+
+def authorized(authorization):
+    """
+    Check an Authorization header against METRICS_TOKEN. Without a token nothing
+    is allowed: behind a local reverse proxy every client looks local.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    return bool(token) and hmac.compare_digest(authorization or '', f'Bearer {token}')
+
+HTTP_REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP requests by route', ('endpoint', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('http_request_duration_seconds', 'HTTP request latency by route', ('endpoint', 'method'))
+TEMPLATE_LATENCY = REGISTRY.histogram('template_render_duration_seconds', 'Jinja template render time', ('template',))
+DB_QUERIES = REGISTRY.counter('db_queries_total', 'SQL statements executed', ('database', 'operation', 'table'))
+DB_LATENCY = REGISTRY.histogram('db_query_duration_seconds', 'SQL statement latency', ('database', 'operation', 'table'))
+INGEST_STAGE_LATENCY = REGISTRY.histogram('ingest_stage_duration_seconds', 'News ingestion stage latency', ('stage',))
+INGEST_ARTICLES = REGISTRY.counter('ingest_articles_total', 'Feed items seen by ingestion', ('result',))
+INGEST_JOBS = REGISTRY.counter('ingest_jobs_total', 'Ingest queue jobs handled by kind and outcome', ('kind', 'result'))
+OLLAMA_TOKENS = REGISTRY.counter('ollama_tokens_total', 'Tokens processed by Ollama', ('kind',))
+OLLAMA_ERRORS = REGISTRY.counter('ollama_errors_total', 'Failed Ollama generate calls')
+VIEW_CACHE = REGISTRY.counter('view_cache_total', 'Cached page lookups by result', ('view', 'result'))
+
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?: IF NOT EXISTS)?)\s+`?(\w+)', re.IGNORECASE)
+
+
+def describe_statement(statement):
+    """Reduce SQL to low-cardinality (operation, table) labels."""
+    stripped = statement.lstrip()
+    operation = stripped.split(None, 1)[0].upper() if stripped else ''
+    match = _STATEMENT_TABLE.search(stripped)
+    return operation, match.group(1) if match else ''
+
+
+def record_query(database, statement, seconds):
+    operation, table = describe_statement(statement)
+    DB_QUERIES.inc(database=database, operation=operation, table=table)
+    DB_LATENCY.observe(seconds, database=database, operation=operation, table=table)
+
+
+def stage(name):
+    """Context manager timing one ingestion stage."""
+    return INGEST_STAGE_LATENCY.time(stage=name)
+
+
+def instrument_sqlalchemy():
+    """Time every statement on every SQLAlchemy engine, including ones created later."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if getattr(instrument_sqlalchemy, 'installed', False):
+        return
+    instrument_sqlalchemy.installed = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_query_start'].pop()
+        record_query(conn.engine.url.database or '', statement, time.perf_counter() - started)
+
+
+class InstrumentedCursor:
+    """mysql.connector cursor proxy that times execute() and executemany()."""
+
+    def __init__(self, cursor, database):
+        self._cursor = cursor
+        self._database = database
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            record_query(self._database, operation, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            record_query(self._database, operation, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """mysql.connector connection proxy whose cursors are instrumented."""
+
+    def __init__(self, connection, database):
+        self._connection = connection
+        self._database = database
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._database)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: samples every thread's stack at a fixed interval.
+
+    Output is in collapsed-stack format ("frame;frame;frame count"), which
+    flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def profile(self, seconds):
+        """Sample for the given number of seconds and return collapsed stacks."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError('A profile is already running')
+        try:
+            own_thread = threading.get_ident()
+            stacks = _Tally()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    names = []
+                    while frame is not None:
+                        code = frame.f_code
+                        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                        frame = frame.f_back
+                    stacks[';'.join(reversed(names))] += 1
+                time.sleep(self.interval)
+            return '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common()) + '\n'
+        finally:
+            self._lock.release()
+
+
+profiler = SamplingProfiler()
+
+
+def serve(port, host='127.0.0.1'):
+    """
+    Serve /metrics from a daemon thread, for processes without the web app.
+    Each process gets its own port, so it reports its own numbers only.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+def init_app(app):
+    """Time requests and template renders and register /metrics and /metrics/profile."""
+    from flask import g, request, Response, abort, before_render_template, template_rendered
+    from flask_login import current_user
+
+    instrument_sqlalchemy()
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_request_start = time.perf_counter()
+        start_snapshot_flusher()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_request_start', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+            HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        return response
+
+    def start_template_timer(sender, template, context, **extra):
+        g.setdefault('metrics_template_starts', []).append(time.perf_counter())
+
+    def record_template(sender, template, context, **extra):
+        starts = g.get('metrics_template_starts')
+        if starts:
+            TEMPLATE_LATENCY.observe(time.perf_counter() - starts.pop(), template=template.name or '')
+
+    before_render_template.connect(start_template_timer, app, weak=False)
+    template_rendered.connect(record_template, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        if not authorized(request.headers.get('Authorization')):
+            abort(403)
+        return Response(render_all(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics/profile')
+    def metrics_profile():
+        # Opt-in: sampling costs CPU on a live worker
+        if os.getenv('PROFILER_ENABLED', '').lower() not in ('1', 'true', 'yes'):
+            abort(404)
+        if not (current_user.is_authenticated and current_user.is_admin):
+            abort(403)
+        seconds = min(request.args.get('seconds', 10, type=float), 60)
+        try:
+            output = profiler.profile(seconds)
+        except RuntimeError as e:
+            return str(e), 409
+        return Response(output, mimetype='text/plain')
+
+
+def init_aiohttp_app(app):
+    """Time requests on an aiohttp application and register /metrics."""
+    from aiohttp import web
+
+    @web.middleware
+    async def record_request(request, handler):
+        started = time.perf_counter()
+        start_snapshot_flusher()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            route = request.match_info.route
+            endpoint = (route.name if route is not None else None) or 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+            HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+
+    async def metrics(request):
+        if not authorized(request.headers.get('Authorization')):
+            raise web.HTTPForbidden()
+        # Reading every worker's snapshot is file I/O; keep it off the event loop
+        body = await asyncio.to_thread(render_all)
+        return web.Response(body=body.encode(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+    app.middlewares.append(record_request)
+    app.router.add_get('/metrics', metrics, name='metrics')
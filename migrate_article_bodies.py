@@ -0,0 +1,180 @@
+"""
+Move news_articles.article into the compressed article_bodies table.
+
+Bodies are copied in batches and the inline copy is set to NULL in the same
+transaction, so the migration can be stopped and rerun at any point. Once every
+row is moved, --drop-column removes the column and rebuilds the table to give
+the space back. A size and listing latency report is printed before and after.
+
+Usage: python migrate_article_bodies.py [--batch 500] [--codec zstd] [--train-dictionary]
+                                        [--drop-column] [--report-only]
+"""
+import argparse
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+import article_store
+from ExtractNews import load_ingest_config
+from news_db import get_connection
+
+# The first /news page, as render_news_content builds it without filters
+LISTING_QUERY = '''SELECT title, description, link, pubDate, sentiment, recommendation, stocks
+                   FROM news_articles ORDER BY pubDate DESC LIMIT 20'''
+COUNT_QUERY = "SELECT COUNT(*) FROM news_articles"
+DICTIONARY_SAMPLES = 2000
+
+
+def has_article_column(cursor):
+    cursor.execute('''SELECT COUNT(*) FROM information_schema.COLUMNS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'news_articles' AND COLUMN_NAME = 'article' ''')
+    return cursor.fetchone()[0] > 0
+
+
+def table_sizes(cursor):
+    """
+    :return: {table: (rows, data_bytes, index_bytes)} for news_articles and article_bodies
+    """
+    sizes = {}
+    for table in ('news_articles', 'article_bodies'):
+        # InnoDB only refreshes the information_schema figures on ANALYZE
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+        cursor.execute('''SELECT TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s''', (table,))
+        row = cursor.fetchone()
+        if row is not None:
+            sizes[table] = tuple(int(value or 0) for value in row)
+    return sizes
+
+
+def listing_latency(cursor, repeat=5):
+    """Median seconds for the first listing page and its count query."""
+    timings = {}
+    for name, query in (('listing', LISTING_QUERY), ('count', COUNT_QUERY)):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(query)
+            cursor.fetchall()
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def report(cursor, title):
+    print(f"== {title}")
+    for table, (rows, data_bytes, index_bytes) in table_sizes(cursor).items():
+        print(f"{table:<16} rows ~{rows:>10,}  data {data_bytes / 2**20:>9.1f} MiB  index {index_bytes / 2**20:>8.1f} MiB")
+    for name, seconds in listing_latency(cursor).items():
+        print(f"{name + ' query':<16} {seconds * 1000:>8.2f} ms (median of 5)")
+
+
+def sample_bodies(cursor, limit=DICTIONARY_SAMPLES):
+    if has_article_column(cursor):
+        cursor.execute("SELECT article FROM news_articles WHERE article IS NOT NULL LIMIT %s", (limit,))
+        return [row[0] for row in cursor.fetchall() if row[0]]
+    cursor.execute("SELECT codec, body FROM article_bodies WHERE dictionary_id IS NULL LIMIT %s", (limit,))
+    return [article_store.decompress(bytes(body), codec) for codec, body in cursor.fetchall()]
+
+
+def train(conn, cursor):
+    samples = sample_bodies(cursor)
+    if len(samples) < 100:
+        print(f"Only {len(samples)} article bodies to train on; skipping the dictionary")
+        return None
+    dictionary_id = article_store.save_dictionary(cursor, article_store.train_dictionary(samples))
+    conn.commit()
+    print(f"Trained zstd dictionary {dictionary_id} on {len(samples)} articles")
+    return dictionary_id
+
+
+def migrate(conn, cursor, store, batch_size):
+    """
+    Copy inline bodies into article_bodies, batch_size rows per transaction.
+
+    :return: Number of rows moved
+    """
+    moved, raw_bytes, stored_bytes = 0, 0, 0
+    last_link = ''
+    while True:
+        # Keyset on the primary key; moved rows drop out of the filter, so a rerun resumes
+        cursor.execute('''SELECT link, article FROM news_articles
+                          WHERE link > %s AND article IS NOT NULL ORDER BY link LIMIT %s''', (last_link, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for link, text in rows:
+            store.save(cursor, link, text)
+            raw_bytes += len(text.encode('utf-8'))
+        cursor.executemany("UPDATE news_articles SET article = NULL WHERE link = %s", [(link,) for link, _ in rows])
+        conn.commit()
+        moved += len(rows)
+        last_link = rows[-1][0]
+        print(f"Moved {moved:,} article bodies")
+    if moved:
+        cursor.execute("SELECT SUM(LENGTH(body)) FROM article_bodies")
+        stored_bytes = int(cursor.fetchone()[0] or 0)
+        print(f"Raw {raw_bytes / 2**20:.1f} MiB moved; article_bodies now holds {stored_bytes / 2**20:.1f} MiB")
+    return moved
+
+
+def drop_column(conn, cursor):
+    cursor.execute("SELECT COUNT(*) FROM news_articles WHERE article IS NOT NULL")
+    remaining = cursor.fetchone()[0]
+    if remaining:
+        print(f"{remaining:,} rows still hold an inline article; not dropping the column")
+        return False
+    cursor.execute("ALTER TABLE news_articles DROP COLUMN article")
+    # Rebuild so the freed pages go back to the tablespace
+    cursor.execute("OPTIMIZE TABLE news_articles")
+    cursor.fetchall()
+    conn.commit()
+    print("Dropped news_articles.article")
+    return True
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', type=int, default=500, help='rows per transaction')
+    parser.add_argument('--codec', choices=article_store.CODECS, help='override [Storage] article_codec')
+    parser.add_argument('--level', type=int, help='override [Storage] article_level')
+    parser.add_argument('--train-dictionary', action='store_true',
+                        help='train a zstd dictionary on existing bodies and compress with it')
+    parser.add_argument('--drop-column', action='store_true',
+                        help='drop news_articles.article once every body is moved')
+    parser.add_argument('--report-only', action='store_true', help='print the report and exit')
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    article_store.ensure_schema(cursor)
+    report(cursor, 'before')
+    if args.report_only:
+        conn.close()
+        return
+
+    configured = article_store.store_from_config(load_ingest_config())
+    codec = args.codec or ('zstd' if args.train_dictionary else configured.codec)
+    level = args.level if args.level is not None else configured.level
+    use_dictionary = configured.use_dictionary
+    if args.train_dictionary:
+        if codec != 'zstd':
+            parser.error('--train-dictionary needs --codec zstd')
+        use_dictionary = train(conn, cursor) is not None
+    store = article_store.ArticleStore(codec=codec, level=level, use_dictionary=use_dictionary)
+
+    if has_article_column(cursor):
+        migrate(conn, cursor, store, args.batch)
+        if args.drop_column:
+            drop_column(conn, cursor)
+    else:
+        print("news_articles has no article column; nothing to move")
+    report(cursor, 'after')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+from functools import lru_cache
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Bound to an app by create_app(); importing the models has no side effects
+db = SQLAlchemy()
+
+@lru_cache(maxsize=4096)
+def split_csv(value):
+    return tuple(item for item in value.split(',') if item) if value else ()
+
+# Models
+class UserConfig(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    risk_tolerance = db.Column(db.Float, nullable=False, default=0.5)
+    investment_horizon = db.Column(db.String(50), nullable=False, default='Medium-term')
+    preferred_sectors = db.Column(db.String(200), nullable=True)
+    selected_stocks = db.Column(db.String(500), nullable=True)
+    selected_news_sources = db.Column(db.String(200), nullable=True)
+
+    @property
+    def stock_list(self):
+        return split_csv(self.selected_stocks)
+
+    @property
+    def news_source_list(self):
+        return split_csv(self.selected_news_sources)
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(64), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128))
+    is_admin = db.Column(db.Boolean, default=False)
+    is_approved = db.Column(db.Boolean, default=False)
+    config = db.relationship('UserConfig', backref='user', uselist=False, cascade='all, delete-orphan')
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+    def get_config(self):
+        # Read path: users without a saved config get unsaved defaults, no INSERT
+        if self.config:
+            return self.config
+        return UserConfig(user_id=self.id, risk_tolerance=0.5, investment_horizon='Medium-term')
+
+    def ensure_config(self):
+        if not self.config:
+            self.config = UserConfig(user_id=self.id)
+            db.session.add(self.config)
+        return self.config
+
+def init_database():
+    """Create missing tables and the default admin user. Run once per deploy, not per worker."""
+    db.create_all()
+    # Create an admin user if it doesn't exist
+    admin = User.query.filter_by(username=os.getenv('ADMIN_USERNAME')).first()
+    if not admin:
+        admin = User(
+            username=os.getenv('ADMIN_USERNAME'),
+            email=os.getenv('ADMIN_EMAIL'),
+            is_approved=True,
+            is_admin=True
+        )
+        admin.config = UserConfig()
+        admin.set_password(os.getenv('ADMIN_PASSWORD'))
+        db.session.add(admin)
+        db.session.commit()
+        print("Default admin user created.")
+    else:
+        print("Admin user already exists.")
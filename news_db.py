@@ -0,0 +1,24 @@
+import os
+
+import metrics
+
+
+def get_connection(database=None):
+    """
+    Open a mysql.connector connection to the news/max pain database.
+
+    :param database: Another database on the same server, such as MYSQL_DATABASE
+    """
+    # Imported here: mysql.connector is slow to import and most processes
+    # that import this module never open a connection
+    import mysql.connector
+    database = database or os.getenv('MAX_PAIN_DATABASE')
+    connection = mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST'),
+        port=os.getenv('MYSQL_PORT'),
+        database=database,
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD')
+    )
+    # Cursors time every statement into the db_query_* metrics
+    return metrics.InstrumentedConnection(connection, database or '')
@@ -1,7 +1,10 @@
-import requests
 from bs4 import BeautifulSoup
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+import http_fetch
 
 # Load environment variables
 load_dotenv()
@@ -9,30 +12,175 @@ load_dotenv()
 # API keys (you'll need to sign up for these services)
 ALPHA_VANTAGE_KEY = os.getenv('ALPHA_VANTAGE_KEY')
 FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
+NEWSAPI_KEY = os.getenv('NEWSAPI_KEY')
 
-def fetch_news(sources, stocks):
+# Maximum number of provider requests in flight at once
+MAX_WORKERS = int(os.getenv('NEWS_FETCH_WORKERS', 8))
+
+# Responses are reused within the same time window
+CACHE_WINDOW_SECONDS = int(os.getenv('NEWS_FETCH_CACHE_WINDOW', 300))
+
+# Requests per second, burst size and daily quota for each provider
+PROVIDER_LIMITS = {
+    'newsapi': {'rate': 2.0, 'burst': 5, 'daily_quota': int(os.getenv('NEWSAPI_DAILY_QUOTA', 100))},
+    'finnhub': {'rate': 1.0, 'burst': 10, 'daily_quota': int(os.getenv('FINNHUB_DAILY_QUOTA', 50000))},
+}
+
+
+class RateLimiter:
+    """Token bucket with an optional daily quota, shared by all threads calling one provider."""
+
+    def __init__(self, rate, burst, daily_quota=None):
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._day = None
+        self._used_today = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+
+        :return: False if the daily quota is used up, True otherwise
+        """
+        with self._lock:
+            today = time.strftime('%Y-%m-%d')
+            if today != self._day:
+                self._day = today
+                self._used_today = 0
+            if self.daily_quota is not None and self._used_today >= self.daily_quota:
+                return False
+            self._used_today += 1
+
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is this caller's place in the queue
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return True
+
+
+class ResponseCache:
+    """Provider responses keyed by (provider, query, time window)."""
+
+    def __init__(self, window_seconds=CACHE_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _window(self):
+        return int(time.time() // self.window_seconds)
+
+    def get(self, provider, query):
+        with self._lock:
+            return self._entries.get((provider, query, self._window()))
+
+    def put(self, provider, query, value):
+        window = self._window()
+        with self._lock:
+            # Drop entries from previous windows so the cache stays bounded
+            for key in [key for key in self._entries if key[2] != window]:
+                del self._entries[key]
+            self._entries[(provider, query, window)] = value
+
+
+rate_limiters = {name: RateLimiter(**limits) for name, limits in PROVIDER_LIMITS.items()}
+response_cache = ResponseCache()
+
+
+def _call_provider(provider, query, fetch):
     """
-    Fetch news from various sources based on user configuration.
-    
-    :param sources: List of news sources selected by the user
-    :param stocks: List of stocks selected by the user
-    :return: List of news articles
+    Run one provider request through its rate limiter and the response cache.
+    Only successful responses are cached; a failed request returns [] and is
+    tried again on the next call.
     """
-    news_articles = []
+    cached = response_cache.get(provider, query)
+    if cached is not None:
+        return cached
+    limiter = rate_limiters.get(provider)
+    if limiter is not None and not limiter.acquire():
+        print(f"Daily quota exhausted for {provider}, skipping {query}")
+        return []
+    try:
+        articles = fetch()
+    except Exception as e:
+        print(f"Error fetching {provider} {query}: {e}")
+        return []
+    response_cache.put(provider, query, articles)
+    return articles
 
+
+def _build_tasks(sources, stocks):
+    """Expand the selected sources and stocks into one (provider, query, fetch) task per request."""
+    stocks = tuple(stocks)
+    tasks = []
     for source in sources:
         if source == 'Economic Times':
-            news_articles.extend(fetch_economic_times(stocks))
+            tasks.append((source, stocks, lambda: fetch_economic_times(stocks)))
         elif source == 'Moneycontrol':
-            news_articles.extend(fetch_moneycontrol(stocks))
+            tasks.append((source, stocks, lambda: fetch_moneycontrol(stocks)))
         elif source == 'LiveMint':
-            news_articles.extend(fetch_livemint(stocks))
+            tasks.append((source, stocks, lambda: fetch_livemint(stocks)))
         elif source in ['Business Standard', 'Financial Express', 'NDTV Profit']:
-            news_articles.extend(fetch_newsapi(source, stocks))
+            for stock in stocks:
+                tasks.append(('newsapi', (source, stock),
+                              lambda source=source, stock=stock: _fetch_newsapi_stock(source, stock)))
         elif source == 'Bloomberg Quint':
-            news_articles.extend(fetch_bloomberg_quint(stocks))
+            for stock in stocks:
+                tasks.append(('finnhub', stock, lambda stock=stock: _fetch_finnhub_stock(stock)))
+    return tasks
+
+
+def article_url(article):
+    return article.get('url') or article.get('link')
 
-    return news_articles
+
+def iter_news(sources, stocks, max_workers=MAX_WORKERS):
+    """
+    Fetch news from all selected sources concurrently, yielding articles as providers respond.
+
+    Articles are deduplicated by URL across providers.
+
+    :param sources: List of news sources selected by the user
+    :param stocks: List of stocks selected by the user
+    :param max_workers: Maximum number of requests in flight
+    :return: Generator of news articles
+    """
+    tasks = _build_tasks(sources, stocks)
+    if not tasks:
+        return
+    seen_urls = set()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), thread_name_prefix='news-fetch')
+    try:
+        futures = [executor.submit(_call_provider, *task) for task in tasks]
+        for future in as_completed(futures):
+            for article in future.result():
+                url = article_url(article)
+                if url:
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                yield article
+    finally:
+        # Abandon queued requests if the caller stops iterating early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_news(sources, stocks):
+    """
+    Fetch news from various sources based on user configuration.
+
+    :param sources: List of news sources selected by the user
+    :param stocks: List of stocks selected by the user
+    :return: List of news articles
+    """
+    return list(iter_news(sources, stocks))
 
 def fetch_economic_times(stocks):
     # Web scraping implementation for Economic Times
@@ -50,43 +198,45 @@ def fetch_livemint(stocks):
     return []
 
 def fetch_newsapi(source, stocks):
-    # Using NewsAPI to fetch news
-    base_url = "https://newsapi.org/v2/everything"
-    
     articles = []
     for stock in stocks:
-        params = {
-            'apiKey': NEWSAPI_KEY,
-            'q': stock,
-            'sources': source.lower().replace(' ', '-'),
-            'language': 'en',
-            'sortBy': 'publishedAt'
-        }
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            articles.extend(data['articles'])
-    
+        articles.extend(_call_provider('newsapi', (source, stock),
+                                       lambda stock=stock: _fetch_newsapi_stock(source, stock)))
     return articles
 
+def _fetch_newsapi_stock(source, stock):
+    # Using NewsAPI to fetch news
+    base_url = "https://newsapi.org/v2/everything"
+    params = {
+        'apiKey': NEWSAPI_KEY,
+        'q': stock,
+        'sources': source.lower().replace(' ', '-'),
+        'language': 'en',
+        'sortBy': 'publishedAt'
+    }
+    response = http_fetch.get(base_url, params=params)
+    # Raise on 429/5xx so _call_provider does not cache the failure for the window
+    response.raise_for_status()
+    return response.json()['articles']
+
 def fetch_bloomberg_quint(stocks):
-    # Using Finnhub API to fetch Bloomberg news
-    base_url = "https://finnhub.io/api/v1/news"
-    
     articles = []
     for stock in stocks:
-        params = {
-            'token': FINNHUB_API_KEY,
-            'category': 'general',
-            'symbol': stock
-        }
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            articles.extend(data)
-    
+        articles.extend(_call_provider('finnhub', stock, lambda stock=stock: _fetch_finnhub_stock(stock)))
     return articles
 
+def _fetch_finnhub_stock(stock):
+    # Using Finnhub API to fetch Bloomberg news
+    base_url = "https://finnhub.io/api/v1/news"
+    params = {
+        'token': FINNHUB_API_KEY,
+        'category': 'general',
+        'symbol': stock
+    }
+    response = http_fetch.get(base_url, params=params)
+    response.raise_for_status()
+    return response.json()
+
 # Example usage
 if __name__ == '__main__':
     test_sources = ['Economic Times', 'Moneycontrol', 'Business Standard']
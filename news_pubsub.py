@@ -0,0 +1,249 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import data_versions
+
+
+class Subscription:
+    """A single subscriber's bounded inbox of published articles."""
+
+    def __init__(self, broker, maxsize):
+        self._broker = broker
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        """
+        Wait for the next published article.
+
+        :param timeout: Seconds to wait before giving up
+        :return: Article dict, or None if nothing arrived within the timeout
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _offer(self, article):
+        try:
+            self._queue.put_nowait(article)
+        except queue.Full:
+            # A stalled client must never block the ingester
+            self.dropped += 1
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class NewsBroker:
+    """In-process publish/subscribe hub for newly ingested news articles."""
+
+    def __init__(self, maxsize=100):
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listeners = []
+
+    def subscribe(self, maxsize=None):
+        subscription = Subscription(self, maxsize or self._maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def add_listener(self, callback):
+        """
+        Register a callback invoked with every published batch.
+
+        Callbacks run on the publishing thread, so they should hand off any
+        slow work instead of doing it inline.
+
+        :param callback: Callable taking a list of article dicts
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def publish(self, articles):
+        """
+        Publish a batch of committed articles to every subscriber.
+
+        :param articles: List of article dicts with title, description, link,
+                         pubDate, sentiment, recommendation and stocks keys
+        """
+        if not articles:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for subscription in subscribers:
+            for article in articles:
+                subscription._offer(article)
+        for callback in listeners:
+            try:
+                callback(articles)
+            except Exception as e:
+                print(f"Error in news listener {callback!r}: {e}")
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class NewsPoller:
+    """
+    Publishes articles committed by any process, found by polling the database.
+
+    Ingestion runs in whichever gunicorn worker holds the ingest lock, or in
+    ingest_scheduler.py / ingest_worker.py processes, so the in-process broker
+    only ever sees this process's own inserts. The poller watches the
+    news_articles data version from a daemon thread and, when it moves, reads
+    the newest articles and publishes those it has not seen to its own broker.
+
+    Each published article carries event_id, the data version it was first
+    seen at. Versions are shared by every process, so a client reconnecting
+    to another worker with Last-Event-ID is replayed what it missed from the
+    poller's recent history.
+
+    :param connect: Callable returning a new DB connection
+    :param interval: Seconds between data version checks
+    :param lookback: How far back by pubDate new articles are looked for
+    :param limit: Newest articles read per change
+    :param history: Articles kept for replay
+    """
+
+    def __init__(self, connect=None, interval=5.0, lookback=timedelta(hours=48), limit=100, history=200):
+        self.connect = connect
+        self.interval = interval
+        self.lookback = lookback
+        self.limit = limit
+        self.broker = NewsBroker()
+        self._history = deque(maxlen=history)
+        self._known = {}
+        self._version = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, last_event_id=None, maxsize=None):
+        """
+        Subscribe to new articles, starting the poller on first use.
+
+        :param last_event_id: Event id the client last received; newer articles
+                              still in the history are queued first
+        """
+        self._start()
+        with self._lock:
+            subscription = self.broker.subscribe(maxsize)
+            try:
+                after = int(last_event_id) if last_event_id else None
+            except ValueError:
+                after = None
+            if after is not None:
+                for article in self._history:
+                    if article['event_id'] > after:
+                        subscription._offer(article)
+        return subscription
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='news-poller', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error polling for new articles: {e}")
+                self._close()
+            time.sleep(self.interval)
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def poll(self):
+        """
+        Check the data version once and publish any new articles.
+
+        :return: Number of articles published
+        """
+        if self._conn is None:
+            if self.connect is None:
+                from news_db import get_connection
+                self.connect = get_connection
+            self._conn = self.connect()
+        cursor = self._conn.cursor()
+        try:
+            version = data_versions.read(cursor, data_versions.NEWS_ARTICLES)
+            version = int(version.token) if version else 0
+            if version == self._version:
+                return 0
+            cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.lookback
+            cursor.execute('''SELECT title, description, link, pubDate, sentiment, recommendation, stocks
+                              FROM news_articles WHERE pubDate >= %s ORDER BY pubDate DESC LIMIT %s''',
+                           (cutoff.strftime('%Y-%m-%d %H:%M:%S'), self.limit))
+            rows = cursor.fetchall()
+        finally:
+            # End the read snapshot so the next poll sees new commits
+            self._conn.commit()
+
+        fresh = []
+        for title, description, link, pub_date, sentiment, recommendation, stocks in reversed(rows):
+            if link in self._known:
+                continue
+            self._known[link] = pub_date
+            try:
+                stocks = json.loads(stocks) if stocks else []
+            except ValueError:
+                stocks = []
+            fresh.append({'title': title, 'description': description, 'link': link, 'pubDate': pub_date,
+                          'sentiment': sentiment, 'recommendation': recommendation, 'stocks': stocks,
+                          'event_id': version})
+        self._known = {link: pub_date for link, pub_date in self._known.items() if pub_date >= cutoff}
+        baseline = self._version is None
+        self._version = version
+        # The first poll only learns what is already there
+        if baseline or not fresh:
+            return 0
+        with self._lock:
+            self._history.extend(fresh)
+            self.broker.publish(fresh)
+        return len(fresh)
+
+
+def article_stock_codes(article):
+    """Return the set of stock codes mentioned by an article's stocks list."""
+    codes = set()
+    for stock in article.get('stocks') or []:
+        if isinstance(stock, dict):
+            code = stock.get('code')
+        else:
+            code = stock
+        if code:
+            codes.add(str(code).upper())
+    return codes
+
+
+# Shared broker for the process; the ingester publishes and in-process
+# listeners such as stock alerts subscribe
+broker = NewsBroker()
@@ -0,0 +1,299 @@
+import json
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import http_fetch
+import metrics
+
+SENTIMENTS = ('POSITIVE', 'NEGATIVE', 'NEUTRAL')
+RECOMMENDATIONS = ('BUY', 'SELL', 'HOLD')
+UNKNOWN_ANALYSIS = ("UNKNOWN", "UNKNOWN", [])
+
+ANALYSIS_PROMPT = """Consider yourself as a stock market analyst. Analyze the following news article and using your expertise of stock market provide the following information:
+1. Sentiment (POSITIVE, NEGATIVE, or NEUTRAL)
+2. Stock recommendation (BUY, SELL, or HOLD)
+3. stock in discussion discussion, in case of multiple stocks provide comma separated
+
+{text}
+
+Respond in the following JSON format:
+{{
+    "sentiment": "POSITIVE/NEGATIVE/NEUTRAL",
+    "recommendation": "BUY/SELL/HOLD",
+    "stocks": [
+        {{"name": "Stock Name 1", "code": "STOCK_CODE_1"}},
+        {{"name": "Stock Name 2", "code": "STOCK_CODE_2"}},
+        ...
+    ]
+}}
+"""
+
+
+class OllamaError(Exception):
+    pass
+
+
+def parse_analysis(raw):
+    """
+    Strictly parse the model's JSON answer.
+
+    :param raw: The 'response' string returned by /api/generate
+    :return: Tuple of (sentiment, recommendation, stocks)
+    :raises OllamaError: If the JSON is malformed or a field is out of range
+    """
+    try:
+        output = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise OllamaError(f"Invalid JSON from model: {raw!r}") from e
+    if not isinstance(output, dict):
+        raise OllamaError(f"Expected a JSON object, got: {raw!r}")
+
+    sentiment = str(output.get('sentiment', '')).strip().upper()
+    recommendation = str(output.get('recommendation', '')).strip().upper()
+    if sentiment not in SENTIMENTS:
+        raise OllamaError(f"Invalid sentiment: {output.get('sentiment')!r}")
+    if recommendation not in RECOMMENDATIONS:
+        raise OllamaError(f"Invalid recommendation: {output.get('recommendation')!r}")
+
+    stocks = []
+    raw_stocks = output.get('stocks') or []
+    if not isinstance(raw_stocks, list):
+        raise OllamaError(f"Invalid stocks list: {raw_stocks!r}")
+    for stock in raw_stocks:
+        if not isinstance(stock, dict):
+            continue
+        code = str(stock.get('code') or '').strip().upper()
+        if not code or code.startswith('STOCK_CODE'):
+            continue
+        stocks.append({'name': str(stock.get('name') or code).strip(), 'code': code})
+    return sentiment, recommendation, stocks
+
+
+class CallStats:
+    """Latency and token counts for recent calls, plus running totals."""
+
+    def __init__(self, history=500):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, seconds, prompt_tokens=0, completion_tokens=0, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.total_seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.recent.append({
+                'seconds': seconds,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'error': error
+            })
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_seconds': self.total_seconds / self.calls if self.calls else 0.0,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
+
+
+class OllamaClient:
+    """
+    Client for Ollama's /api/generate tuned for batch article analysis.
+
+    Article text is trimmed or chunked to a token budget, the model is kept
+    loaded between calls, and at most max_parallel requests are in flight
+    (match OLLAMA_NUM_PARALLEL on the server). Thread-safe.
+    """
+
+    def __init__(self, api_url, model, token_budget=3000, max_parallel=2, keep_alive='30m',
+                 timeout=120, num_ctx=4096, chars_per_token=4.0, strategy='trim'):
+        """
+        :param token_budget: Maximum tokens of article text per request
+        :param max_parallel: Maximum concurrent requests to the server
+        :param keep_alive: How long Ollama keeps the model loaded after a call
+        :param timeout: Read timeout in seconds for one generation
+        :param num_ctx: Context window requested from the server
+        :param chars_per_token: Estimate used to convert the budget to characters
+        :param strategy: 'trim' keeps the start of long articles, 'chunk' analyzes
+                         every chunk and merges the answers
+        """
+        self.api_url = api_url
+        self.model = model
+        self.token_budget = token_budget
+        self.max_parallel = max_parallel
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.num_ctx = num_ctx
+        self.chars_per_token = chars_per_token
+        self.strategy = strategy
+        self.stats = CallStats()
+        self._slots = threading.BoundedSemaphore(max_parallel)
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='ollama')
+
+    @property
+    def char_budget(self):
+        return int(self.token_budget * self.chars_per_token)
+
+    def trim(self, text):
+        """Cut text to the budget, preferring to end on a sentence or word boundary."""
+        text = text or ''
+        budget = self.char_budget
+        if len(text) <= budget:
+            return text
+        cut = text[:budget]
+        boundary = max(cut.rfind('. '), cut.rfind('\n'))
+        if boundary < budget // 2:
+            boundary = cut.rfind(' ')
+        return cut[:boundary + 1].rstrip() if boundary > 0 else cut
+
+    def chunk(self, text):
+        """Split text into budget-sized chunks on word boundaries."""
+        chunks = []
+        remaining = (text or '').strip()
+        while remaining:
+            piece = self.trim(remaining)
+            chunks.append(piece)
+            remaining = remaining[len(piece):].lstrip()
+        return chunks or ['']
+
+    def generate(self, prompt, json_format=True):
+        """
+        Run one non-streaming generation.
+
+        :return: The model's response text
+        :raises OllamaError: On transport errors or a non-200 status
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"num_ctx": self.num_ctx}
+        }
+        if json_format:
+            payload["format"] = "json"
+
+        with self._slots:
+            # Latency excludes time spent waiting for a free slot
+            started = time.perf_counter()
+            try:
+                response = http_fetch.post(self.api_url, json=payload, timeout=(5, self.timeout))
+            except Exception as e:
+                self.stats.record(time.perf_counter() - started, error=True)
+                metrics.OLLAMA_ERRORS.inc()
+                raise OllamaError(f"Error calling Ollama API: {e}") from e
+            elapsed = time.perf_counter() - started
+
+        if response.status_code != 200:
+            self.stats.record(elapsed, error=True)
+            metrics.OLLAMA_ERRORS.inc()
+            raise OllamaError(f"Error calling Ollama API: {response.status_code}")
+        try:
+            result = response.json()
+        except ValueError as e:
+            self.stats.record(elapsed, error=True)
+            metrics.OLLAMA_ERRORS.inc()
+            raise OllamaError(f"Invalid response from Ollama API: {e}") from e
+        self.stats.record(elapsed, result.get('prompt_eval_count', 0), result.get('eval_count', 0))
+        metrics.OLLAMA_TOKENS.inc(result.get('prompt_eval_count', 0), kind='prompt')
+        metrics.OLLAMA_TOKENS.inc(result.get('eval_count', 0), kind='completion')
+        return result.get('response', '')
+
+    def warm_up(self):
+        """Load the model ahead of the first article; an empty prompt only loads it."""
+        try:
+            http_fetch.post(self.api_url, json={"model": self.model, "keep_alive": self.keep_alive},
+                            timeout=(5, self.timeout))
+        except Exception as e:
+            print(f"Error warming up Ollama model {self.model}: {e}")
+
+    def _analyze_prompt(self, text):
+        try:
+            return parse_analysis(self.generate(ANALYSIS_PROMPT.format(text=text)))
+        except OllamaError as e:
+            print(e)
+            return UNKNOWN_ANALYSIS
+
+    def analyze(self, text):
+        """
+        Get sentiment, recommendation and mentioned stocks for an article.
+
+        :return: Tuple of (sentiment, recommendation, stocks); UNKNOWN values on failure
+        """
+        if self.strategy != 'chunk':
+            return self._analyze_prompt(self.trim(text))
+        chunks = self.chunk(text)
+        if len(chunks) == 1:
+            return self._analyze_prompt(chunks[0])
+        # Chunks run one after another here; parallelism comes from analyzing
+        # several articles at once, which keeps the pool free of nested waits
+        return merge_analyses([self._analyze_prompt(chunk) for chunk in chunks], [len(c) for c in chunks])
+
+    def analyze_many(self, texts):
+        """Analyze several articles concurrently, returning results in input order."""
+        return list(self._executor.map(self.analyze, texts))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def merge_analyses(analyses, weights):
+    """Combine per-chunk answers: length-weighted majority vote and the union of stocks."""
+    sentiments = Counter()
+    recommendations = Counter()
+    stocks = {}
+    for (sentiment, recommendation, chunk_stocks), weight in zip(analyses, weights):
+        if sentiment in SENTIMENTS:
+            sentiments[sentiment] += weight
+        if recommendation in RECOMMENDATIONS:
+            recommendations[recommendation] += weight
+        for stock in chunk_stocks:
+            stocks.setdefault(stock['code'], stock)
+    if not sentiments or not recommendations:
+        return UNKNOWN_ANALYSIS
+    return sentiments.most_common(1)[0][0], recommendations.most_common(1)[0][0], list(stocks.values())
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_url, model, config=None):
+    """
+    Return the shared client for an (api_url, model) pair, creating it on first use.
+
+    :param config: Optional ConfigParser whose [Ollama] section supplies the
+                   client options when the client is created
+    """
+    key = (api_url, model)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            options = client_options(config) if config is not None else {}
+            client = OllamaClient(api_url, model, **options)
+            _clients[key] = client
+        return client
+
+
+def client_options(config):
+    """Read OllamaClient options from the [Ollama] section of app.config."""
+    return {
+        'token_budget': config.getint('Ollama', 'token_budget', fallback=3000),
+        'max_parallel': config.getint('Ollama', 'max_parallel', fallback=2),
+        'keep_alive': config.get('Ollama', 'keep_alive', fallback='30m'),
+        'timeout': config.getfloat('Ollama', 'timeout', fallback=120),
+        'num_ctx': config.getint('Ollama', 'num_ctx', fallback=4096),
+        'strategy': config.get('Ollama', 'strategy', fallback='trim'),
+    }
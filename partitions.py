@@ -0,0 +1,344 @@
+"""
+Monthly range partitions and retention for news_articles and max_pain_data.
+
+Each table is split into one partition per calendar month of its time column
+(pYYYYMM holds rows before the first of the following month) plus a pmax
+catch-all. Maintenance keeps [Retention] future_months empty partitions ahead
+of the current month, and archives each partition older than the table's
+retention to a gzipped JSON lines file before dropping it, which is O(1)
+instead of a row-by-row DELETE.
+
+Queries only benefit when they filter the time column with plain ranges
+(pubDate >= %s AND pubDate < %s); wrapping it in a function such as
+date(pubDate) makes MySQL read every partition.
+
+Usage: python partitions.py [--status] [--convert] [--dry-run]
+
+--convert partitions tables that are not yet partitioned. It rebuilds the
+table, so run it in a quiet period. Maintenance also runs daily from the
+ingest scheduler.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+
+import article_store
+import data_versions
+
+PartitionedTable = namedtuple('PartitionedTable', 'name column')
+
+TABLES = (
+    PartitionedTable('news_articles', 'pubDate'),
+    PartitionedTable('max_pain_data', 'record_time'),
+)
+DEFAULT_RETENTION_MONTHS = {'news_articles': 24, 'max_pain_data': 6}
+DEFAULT_FUTURE_MONTHS = 3
+DEFAULT_ARCHIVE_DIR = 'archive'
+CATCH_ALL = 'pmax'
+ARCHIVE_BATCH = 1000
+
+_MONTH_PARTITION = re.compile(r'^p(\d{4})(\d{2})$')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'p{month:%Y%m}'
+
+
+def column_type(cursor, table, column):
+    cursor.execute('''SELECT DATA_TYPE FROM information_schema.COLUMNS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s''', (table, column))
+    row = cursor.fetchone()
+    if row is None:
+        raise LookupError(f"{table}.{column} does not exist")
+    return row[0].lower()
+
+
+def _bound(month, data_type):
+    # TIMESTAMP can only be range partitioned through UNIX_TIMESTAMP()
+    if data_type == 'timestamp':
+        return f"UNIX_TIMESTAMP('{month:%Y-%m-%d} 00:00:00')"
+    return f"'{month:%Y-%m-%d}'"
+
+
+def _partition_clause(month, data_type):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ({_bound(add_months(month, 1), data_type)})"
+
+
+def _catch_all_clause(data_type):
+    bound = 'MAXVALUE' if data_type == 'timestamp' else '(MAXVALUE)'
+    return f"PARTITION {CATCH_ALL} VALUES LESS THAN {bound}"
+
+
+def list_partitions(cursor, table):
+    """
+    :return: [(month, name, approximate rows)] for the monthly partitions, oldest
+             first; empty when the table is not partitioned
+    """
+    cursor.execute('''SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                      ORDER BY PARTITION_ORDINAL_POSITION''', (table,))
+    partitions = []
+    for name, rows in cursor.fetchall():
+        match = _MONTH_PARTITION.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name, rows or 0))
+    return partitions
+
+
+def _primary_key(cursor, table):
+    cursor.execute('''SELECT COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY'
+                      ORDER BY SEQ_IN_INDEX''', (table,))
+    return cursor.fetchall()
+
+
+def _unique_keys_without(cursor, table, column):
+    cursor.execute('''SELECT INDEX_NAME FROM information_schema.STATISTICS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0
+                            AND INDEX_NAME <> 'PRIMARY'
+                      GROUP BY INDEX_NAME HAVING SUM(COLUMN_NAME = %s) = 0''', (table, column))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def convert(cursor, spec, future_months=DEFAULT_FUTURE_MONTHS, today=None):
+    """
+    Partition an unpartitioned table by month, from its oldest row to future_months ahead.
+
+    MySQL requires the partition column in every unique key, so it is appended
+    to the primary key. For news_articles that makes the key (link, pubDate);
+    links stay unique through the news_links table, which is filled from the
+    stored articles here, also for tables partitioned before it existed.
+
+    :return: True if the table was converted
+    """
+    if spec.name == 'news_articles':
+        article_store.ensure_schema(cursor)
+        added = article_store.backfill_links(cursor)
+        if added:
+            print(f"Registered {added:,} stored links in news_links")
+    if list_partitions(cursor, spec.name):
+        return False
+    blocking = _unique_keys_without(cursor, spec.name, spec.column)
+    if blocking:
+        print(f"Cannot partition {spec.name}: unique keys {', '.join(blocking)} do not include {spec.column}")
+        return False
+    data_type = column_type(cursor, spec.name, spec.column)
+    if data_type not in ('timestamp', 'datetime', 'date'):
+        print(f"Cannot partition {spec.name}: {spec.column} is {data_type}, not a date or time")
+        return False
+
+    primary_key = _primary_key(cursor, spec.name)
+    if primary_key and spec.column not in [name for name, _ in primary_key]:
+        columns = [f'`{name}`({sub_part})' if sub_part else f'`{name}`' for name, sub_part in primary_key]
+        columns.append(f'`{spec.column}`')
+        print(f"Adding {spec.column} to the primary key of {spec.name}")
+        cursor.execute(f"ALTER TABLE {spec.name} DROP PRIMARY KEY, ADD PRIMARY KEY ({', '.join(columns)})")
+
+    cursor.execute(f"SELECT MIN({spec.column}) FROM {spec.name}")
+    oldest = cursor.fetchone()[0]
+    current = month_start(today or date.today())
+    month = month_start(oldest) if oldest else current
+    clauses = []
+    while month <= add_months(current, future_months):
+        clauses.append(_partition_clause(month, data_type))
+        month = add_months(month, 1)
+    clauses.append(_catch_all_clause(data_type))
+    expression = f'RANGE (UNIX_TIMESTAMP({spec.column}))' if data_type == 'timestamp' else f'RANGE COLUMNS({spec.column})'
+    print(f"Partitioning {spec.name} into {len(clauses)} partitions")
+    cursor.execute(f"ALTER TABLE {spec.name} PARTITION BY {expression} ({', '.join(clauses)})")
+    return True
+
+
+def add_future_partitions(cursor, spec, future_months=DEFAULT_FUTURE_MONTHS, today=None):
+    """
+    Split pmax so every month up to future_months ahead has its own partition.
+
+    :return: Names of the partitions created
+    """
+    partitions = list_partitions(cursor, spec.name)
+    if not partitions:
+        return []
+    last = partitions[-1][0]
+    target = add_months(month_start(today or date.today()), future_months)
+    if last >= target:
+        return []
+    data_type = column_type(cursor, spec.name, spec.column)
+    months = []
+    month = add_months(last, 1)
+    while month <= target:
+        months.append(month)
+        month = add_months(month, 1)
+    clauses = [_partition_clause(month, data_type) for month in months] + [_catch_all_clause(data_type)]
+    # Cheap while pmax is empty, which it is as long as maintenance keeps ahead
+    cursor.execute(f"ALTER TABLE {spec.name} REORGANIZE PARTITION {CATCH_ALL} INTO ({', '.join(clauses)})")
+    return [partition_name(month) for month in months]
+
+
+def expired_partitions(partitions, retention_months, today=None):
+    """Partitions whose every row is more than retention_months before the current month."""
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    return [(month, name, rows) for month, name, rows in partitions if add_months(month, 1) <= cutoff]
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def archive_partition(cursor, spec, name, archive_dir, store=None):
+    """
+    Write one partition to <archive_dir>/<table>/<partition>.jsonl.gz.
+
+    news_articles rows carry their decompressed article text.
+
+    :return: (path, rows written, link hashes of the archived articles)
+    """
+    directory = os.path.join(archive_dir, spec.name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.jsonl.gz')
+    hashes = []
+    if spec.name == 'news_articles':
+        store = store or article_store.ArticleStore()
+        store.load_dictionaries(cursor)
+        cursor.execute(f'''SELECT n.*, b.link_hash AS body_hash, b.codec AS body_codec,
+                                  b.dictionary_id AS body_dictionary, b.body AS body
+                           FROM news_articles PARTITION ({name}) n
+                           LEFT JOIN article_bodies b ON b.link_hash = SHA1(n.link)''')
+    else:
+        cursor.execute(f"SELECT * FROM {spec.name} PARTITION ({name})")
+    columns = [column[0] for column in cursor.description]
+    written = 0
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_BATCH)
+            if not rows:
+                break
+            for row in rows:
+                record = dict(zip(columns, row))
+                if 'body' in record:
+                    body_hash = record.pop('body_hash')
+                    codec, dictionary_id, body = record.pop('body_codec'), record.pop('body_dictionary'), record.pop('body')
+                    if body_hash is not None:
+                        hashes.append(body_hash)
+                        record['article'] = store.decode(cursor, codec, dictionary_id, body)
+                f.write(json.dumps(record, default=_json_value) + '\n')
+                written += 1
+    os.replace(tmp_path, path)
+    return path, written, hashes
+
+
+def drop_partition(conn, cursor, spec, name, archive_dir, store=None):
+    """Archive a partition, check the archive is complete, then drop it."""
+    path, written, hashes = archive_partition(cursor, spec, name, archive_dir, store)
+    cursor.execute(f"SELECT COUNT(*) FROM {spec.name} PARTITION ({name})")
+    expected = cursor.fetchone()[0]
+    if written != expected:
+        print(f"Archive of {spec.name} {name} has {written} rows, partition has {expected}; not dropping")
+        return False
+    # Bodies live in an unpartitioned table, so these go row by row
+    for start in range(0, len(hashes), ARCHIVE_BATCH):
+        batch = hashes[start:start + ARCHIVE_BATCH]
+        cursor.execute(f"DELETE FROM article_bodies WHERE link_hash IN ({', '.join(['%s'] * len(batch))})", batch)
+        conn.commit()
+    cursor.execute(f"ALTER TABLE {spec.name} DROP PARTITION {name}")
+    if spec.name == 'news_articles' and written:
+        # Cached /news pages and their ETags still list the dropped rows
+        data_versions.bump(cursor, data_versions.NEWS_ARTICLES)
+        conn.commit()
+    print(f"Archived {written:,} rows of {spec.name} {name} to {path} and dropped the partition")
+    return True
+
+
+def load_policy(config):
+    """
+    Read [Retention] from app.config.
+
+    :return: ({table: retention months}, future months, archive directory)
+    """
+    section = config['Retention'] if config is not None and config.has_section('Retention') else {}
+    retention = {spec.name: int(section.get(spec.name, DEFAULT_RETENTION_MONTHS[spec.name])) for spec in TABLES}
+    future_months = int(section.get('future_months', DEFAULT_FUTURE_MONTHS))
+    archive_dir = section.get('archive_dir', DEFAULT_ARCHIVE_DIR)
+    return retention, future_months, archive_dir
+
+
+def maintain(conn, config, today=None, dry_run=False):
+    """Create upcoming partitions and archive and drop expired ones for every table."""
+    retention, future_months, archive_dir = load_policy(config)
+    store = article_store.store_from_config(config)
+    cursor = conn.cursor()
+    for spec in TABLES:
+        partitions = list_partitions(cursor, spec.name)
+        if not partitions:
+            print(f"{spec.name} is not partitioned; run python partitions.py --convert")
+            continue
+        if dry_run:
+            print(f"{spec.name}: would archive {[name for _, name, _ in expired_partitions(partitions, retention[spec.name], today)]}")
+            continue
+        created = add_future_partitions(cursor, spec, future_months, today)
+        if created:
+            print(f"Added partitions {', '.join(created)} to {spec.name}")
+        expired = expired_partitions(partitions, retention[spec.name], today)
+        # Never drop the last monthly partition: REORGANIZE needs one before pmax
+        for month, name, rows in expired[:len(partitions) - 1]:
+            drop_partition(conn, cursor, spec, name, archive_dir, store)
+    conn.commit()
+
+
+def print_status(cursor):
+    for spec in TABLES:
+        partitions = list_partitions(cursor, spec.name)
+        if not partitions:
+            print(f"{spec.name}: not partitioned")
+            continue
+        print(f"{spec.name}: {len(partitions)} monthly partitions, {partitions[0][1]} to {partitions[-1][1]}")
+        for month, name, rows in partitions:
+            print(f"  {name:<8} ~{rows:>12,} rows")
+
+
+def main():
+    from ExtractNews import load_ingest_config
+    from news_db import get_connection
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--status', action='store_true', help='list partitions and exit')
+    parser.add_argument('--convert', action='store_true', help='partition tables that are not partitioned yet')
+    parser.add_argument('--dry-run', action='store_true', help='show what retention would archive')
+    args = parser.parse_args()
+
+    config = load_ingest_config()
+    conn = get_connection()
+    cursor = conn.cursor()
+    if args.status:
+        print_status(cursor)
+    else:
+        if args.convert:
+            _, future_months, _ = load_policy(config)
+            for spec in TABLES:
+                convert(cursor, spec, future_months)
+        maintain(conn, config, dry_run=args.dry_run)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Per-stock sentiment and recommendation counts by IST day and hour.
+
+Ingestion adds each batch of articles to stock_sentiment_daily and
+stock_sentiment_hourly in the transaction that inserts them, so the
+dashboard reads a few rows per stock instead of scanning news_articles.
+Counts for days whose partitions have been archived stay in place.
+
+Usage: python sentiment_aggregates.py --rebuild [--since YYYY-MM-DD]
+
+--rebuild recounts every bucket from the oldest article still in
+news_articles (or --since) onwards. Pause ingestion while it runs: articles
+added meanwhile are only counted again by the next rebuild.
+"""
+import argparse
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from news_pubsub import article_stock_codes
+from result_rows import IST
+
+SENTIMENTS = ('POSITIVE', 'NEGATIVE', 'NEUTRAL')
+RECOMMENDATIONS = ('BUY', 'SELL', 'HOLD')
+COUNT_COLUMNS = ('articles', 'positive', 'negative', 'neutral', 'buy', 'sell', 'hold')
+# table -> bucket column
+TABLES = {'stock_sentiment_daily': 'day', 'stock_sentiment_hourly': 'hour'}
+REBUILD_BATCH = 5000
+
+
+def ensure_schema(cursor):
+    counts = ', '.join(f'{column} INT NOT NULL DEFAULT 0' for column in COUNT_COLUMNS)
+    cursor.execute(f'''CREATE TABLE IF NOT EXISTS stock_sentiment_daily
+                       (stock_code VARCHAR(32) NOT NULL, day DATE NOT NULL, {counts},
+                        PRIMARY KEY (stock_code, day))''')
+    cursor.execute(f'''CREATE TABLE IF NOT EXISTS stock_sentiment_hourly
+                       (stock_code VARCHAR(32) NOT NULL, hour DATETIME NOT NULL, {counts},
+                        PRIMARY KEY (stock_code, hour))''')
+
+
+def ist_hour(pub_date):
+    """Start of the IST hour containing pub_date; naive values are taken as UTC."""
+    if pub_date.tzinfo is None:
+        pub_date = pub_date.replace(tzinfo=timezone.utc)
+    return pub_date.astimezone(IST).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def count_articles(articles):
+    """
+    Tally articles into buckets.
+
+    :param articles: Iterable of dicts with pubDate, sentiment, recommendation and stocks
+    :return: {table: {(stock_code, bucket): Counter}}
+    """
+    tallies = {table: defaultdict(Counter) for table in TABLES}
+    for article in articles:
+        if article['pubDate'] is None:
+            continue
+        hour = ist_hour(article['pubDate'])
+        sentiment = (article.get('sentiment') or '').strip().upper()
+        recommendation = (article.get('recommendation') or '').strip().upper()
+        for code in article_stock_codes(article):
+            for table, bucket in (('stock_sentiment_daily', hour.date()), ('stock_sentiment_hourly', hour)):
+                counts = tallies[table][(code[:32], bucket)]
+                counts['articles'] += 1
+                if sentiment in SENTIMENTS:
+                    counts[sentiment.lower()] += 1
+                if recommendation in RECOMMENDATIONS:
+                    counts[recommendation.lower()] += 1
+    return tallies
+
+
+def _add(cursor, table, key, counts):
+    bucket_column = TABLES[table]
+    placeholders = ', '.join(['%s'] * (len(COUNT_COLUMNS) + 2))
+    increments = ', '.join(f'{column} = {column} + VALUES({column})' for column in COUNT_COLUMNS)
+    # One statement, so parallel ingesters creating the same bucket add to it instead of racing to insert it
+    cursor.execute(f"INSERT INTO {table} (stock_code, {bucket_column}, {', '.join(COUNT_COLUMNS)}) "
+                   f"VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {increments}",
+                   list(key) + [counts[column] for column in COUNT_COLUMNS])
+
+
+def record(cursor, articles):
+    """
+    Add newly inserted articles to the aggregates. Run it in the transaction
+    that inserts them, so the counts never disagree with news_articles.
+    """
+    for table, buckets in count_articles(articles).items():
+        # Sorted so concurrent writers lock rows in the same order
+        for key in sorted(buckets):
+            _add(cursor, table, key, buckets[key])
+
+
+def rebuild(conn, cursor, since=None):
+    """
+    Recount every bucket from since (default: the oldest article) onwards.
+
+    Naive pubDate values are read as UTC; the command line sets the session
+    time zone to UTC before calling this.
+
+    :param since: Optional IST date to rebuild from
+    :return: Number of articles counted
+    """
+    if since is None:
+        cursor.execute("SELECT pubDate FROM news_articles ORDER BY pubDate LIMIT 1")
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        oldest = row[0]
+        since = ist_hour(oldest).date()
+    since_hour = datetime(since.year, since.month, since.day)
+    # IST midnight as naive UTC, to compare with pubDate
+    since_utc = since_hour - timedelta(hours=5, minutes=30)
+
+    cursor.execute('''SELECT pubDate, sentiment, recommendation, stocks FROM news_articles
+                      WHERE pubDate >= %s''', (since_utc.strftime('%Y-%m-%d %H:%M:%S'),))
+    tallies = {table: defaultdict(Counter) for table in TABLES}
+    counted = 0
+    while True:
+        rows = cursor.fetchmany(REBUILD_BATCH)
+        if not rows:
+            break
+        articles = []
+        for pub_date, sentiment, recommendation, stocks in rows:
+            try:
+                stocks = json.loads(stocks) if isinstance(stocks, (str, bytes)) else stocks
+            except ValueError:
+                stocks = []
+            articles.append({'pubDate': pub_date, 'sentiment': sentiment,
+                             'recommendation': recommendation, 'stocks': stocks})
+        for table, buckets in count_articles(articles).items():
+            for key, counts in buckets.items():
+                tallies[table][key].update(counts)
+        counted += len(rows)
+
+    # Replace the range in one transaction, so readers see old or new counts, never a mix
+    cursor.execute("DELETE FROM stock_sentiment_daily WHERE day >= %s", (since.isoformat(),))
+    cursor.execute("DELETE FROM stock_sentiment_hourly WHERE hour >= %s", (since_hour.strftime('%Y-%m-%d %H:%M:%S'),))
+    for table, buckets in tallies.items():
+        bucket_column = TABLES[table]
+        placeholders = ', '.join(['%s'] * (len(COUNT_COLUMNS) + 2))
+        cursor.executemany(
+            f"INSERT INTO {table} (stock_code, {bucket_column}, {', '.join(COUNT_COLUMNS)}) VALUES ({placeholders})",
+            [list(key) + [counts[column] for column in COUNT_COLUMNS] for key, counts in sorted(buckets.items())]
+        )
+    conn.commit()
+    return counted
+
+
+def read_daily(cursor, stock_codes, since):
+    """
+    :return: Rows (stock_code, day, articles, positive, negative, neutral, buy, sell, hold) oldest first
+    """
+    if not stock_codes:
+        return []
+    placeholders = ', '.join(['%s'] * len(stock_codes))
+    cursor.execute(f'''SELECT stock_code, day, {', '.join(COUNT_COLUMNS)} FROM stock_sentiment_daily
+                       WHERE stock_code IN ({placeholders}) AND day >= %s ORDER BY day''',
+                   list(stock_codes) + [since.isoformat()])
+    return cursor.fetchall()
+
+
+def read_hourly(cursor, stock_codes, since):
+    """
+    :return: Rows (stock_code, hour, articles, positive, ...) oldest first
+    """
+    if not stock_codes:
+        return []
+    placeholders = ', '.join(['%s'] * len(stock_codes))
+    cursor.execute(f'''SELECT stock_code, hour, {', '.join(COUNT_COLUMNS)} FROM stock_sentiment_hourly
+                       WHERE stock_code IN ({placeholders}) AND hour >= %s ORDER BY hour''',
+                   list(stock_codes) + [since.strftime('%Y-%m-%d %H:%M:%S')])
+    return cursor.fetchall()
+
+
+def main():
+    from news_db import get_connection
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rebuild', action='store_true', help='recount the aggregates from news_articles')
+    parser.add_argument('--since', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help='first IST day to rebuild (default: oldest article)')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error('nothing to do; pass --rebuild')
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Read TIMESTAMPs as UTC whatever the server's time zone
+    cursor.execute("SET time_zone = '+00:00'")
+    ensure_schema(cursor)
+    counted = rebuild(conn, cursor, args.since)
+    print(f"Rebuilt sentiment aggregates from {counted:,} articles")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
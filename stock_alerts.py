@@ -0,0 +1,259 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import news_db
+from news_pubsub import article_stock_codes, broker as news_broker
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def parse_stock_list(value):
+    """Split a comma-separated selected_stocks value into upper-case codes."""
+    if not value:
+        return []
+    return [code.strip().upper() for code in value.split(',') if code.strip()]
+
+
+class SubscriptionIndex:
+    """Inverted index from stock code to the users subscribed to it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users_by_stock = defaultdict(set)
+        self._stocks_by_user = {}
+        self._contacts = {}
+
+    def load(self, rows):
+        """
+        Replace the index contents.
+
+        :param rows: Iterable of (user_id, email, selected_stocks) tuples
+        """
+        users_by_stock = defaultdict(set)
+        stocks_by_user = {}
+        contacts = {}
+        for user_id, email, selected_stocks in rows:
+            stocks = frozenset(parse_stock_list(selected_stocks))
+            if not stocks:
+                continue
+            stocks_by_user[user_id] = stocks
+            contacts[user_id] = email
+            for code in stocks:
+                users_by_stock[code].add(user_id)
+        with self._lock:
+            self._users_by_stock = users_by_stock
+            self._stocks_by_user = stocks_by_user
+            self._contacts = contacts
+
+    def set_user(self, user_id, email, selected_stocks):
+        """
+        Add or update a single user's subscriptions.
+
+        :param selected_stocks: Comma-separated string or list of stock codes
+        """
+        if isinstance(selected_stocks, str) or selected_stocks is None:
+            stocks = frozenset(parse_stock_list(selected_stocks))
+        else:
+            stocks = frozenset(code.upper() for code in selected_stocks if code)
+        with self._lock:
+            self._discard(user_id)
+            if stocks:
+                self._stocks_by_user[user_id] = stocks
+                self._contacts[user_id] = email
+                for code in stocks:
+                    self._users_by_stock[code].add(user_id)
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def _discard(self, user_id):
+        for code in self._stocks_by_user.pop(user_id, ()):
+            users = self._users_by_stock.get(code)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._users_by_stock[code]
+        self._contacts.pop(user_id, None)
+
+    def match(self, stock_codes):
+        """
+        Find subscribers for a set of mentioned stock codes.
+
+        Cost is proportional to the mentioned stocks and their subscribers,
+        never to the total number of users.
+
+        :param stock_codes: Iterable of upper-case stock codes
+        :return: Dict of user_id -> set of matched stock codes
+        """
+        matches = {}
+        with self._lock:
+            for code in stock_codes:
+                for user_id in self._users_by_stock.get(code, ()):
+                    matches.setdefault(user_id, set()).add(code)
+        return matches
+
+    def contact(self, user_id):
+        with self._lock:
+            return self._contacts.get(user_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._stocks_by_user)
+
+
+class AlertDispatcher:
+    """
+    Matches published articles against a SubscriptionIndex and fans alerts out.
+
+    Instances are registered as news broker listeners. Delivery runs on a small
+    thread pool so slow email or Telegram calls never hold up ingestion.
+    """
+
+    def __init__(self, index, notify_user=None, notify_group=None, max_workers=4, reload=None,
+                 reload_interval=60.0):
+        """
+        :param index: SubscriptionIndex to match against
+        :param notify_user: Callable(email, alerts) where alerts is a list of (article, codes)
+        :param notify_group: Callable(alerts) for the shared channel, same alert shape
+        :param max_workers: Number of delivery threads
+        :param reload: Optional callable that reloads the index from the database.
+                       Subscriptions are edited in other processes, so it runs
+                       before matching whenever reload_interval seconds have passed
+        """
+        self.index = index
+        self.notify_user = notify_user
+        self.notify_group = notify_group
+        self.reload = reload
+        self.reload_interval = reload_interval
+        self._next_reload = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stock-alerts')
+
+    def _reload_if_stale(self):
+        now = time.monotonic()
+        if self.reload is None or now < self._next_reload:
+            return
+        self._next_reload = now + self.reload_interval
+        try:
+            self.reload()
+        except Exception as e:
+            # Match against the previous snapshot rather than drop the batch
+            print(f"Error reloading stock alert subscriptions: {e}")
+
+    def __call__(self, articles):
+        self._reload_if_stale()
+        per_user = defaultdict(list)
+        group_alerts = []
+        for article in articles:
+            matches = self.index.match(article_stock_codes(article))
+            if not matches:
+                continue
+            matched_codes = set()
+            for user_id, codes in matches.items():
+                per_user[user_id].append((article, sorted(codes)))
+                matched_codes.update(codes)
+            group_alerts.append((article, sorted(matched_codes)))
+
+        # One message per user per batch, however many articles matched
+        if self.notify_user:
+            for user_id, alerts in per_user.items():
+                email = self.index.contact(user_id)
+                if email:
+                    self._executor.submit(self._deliver, self.notify_user, email, alerts)
+        if self.notify_group and group_alerts:
+            self._executor.submit(self._deliver, self.notify_group, group_alerts)
+
+    @staticmethod
+    def _deliver(channel, *args):
+        try:
+            channel(*args)
+        except Exception as e:
+            print(f"Error delivering stock alert: {e}")
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+# Approved users indexed by the stocks they selected in user_config
+alert_index = SubscriptionIndex()
+_installed = False
+_installed_lock = threading.Lock()
+
+
+def load_alert_index(index=alert_index):
+    """Load approved users' selected stocks from the users database (MYSQL_DATABASE)."""
+    conn = news_db.get_connection(os.getenv('MYSQL_DATABASE'))
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''SELECT user_config.user_id, `user`.email, user_config.selected_stocks
+                          FROM user_config JOIN `user` ON `user`.id = user_config.user_id
+                          WHERE `user`.is_approved = 1''')
+        index.load(cursor.fetchall())
+    finally:
+        conn.close()
+
+
+def install_stock_alerts():
+    """
+    Send stock alerts for articles this process ingests. Every ingestion
+    entry point calls this: the web app's ingest thread, ingest_scheduler.py,
+    ingest_worker.py and ExtractNews.py.
+
+    Users change their subscriptions through whichever web worker serves them,
+    so the index is reloaded from user_config every ALERT_INDEX_RELOAD_SECONDS.
+    """
+    global _installed
+    with _installed_lock:
+        if _installed:
+            return
+        _installed = True
+    news_broker.add_listener(AlertDispatcher(
+        alert_index,
+        notify_user=send_stock_alert_email,
+        notify_group=send_stock_alert_telegram,
+        reload=load_alert_index,
+        reload_interval=float(os.getenv('ALERT_INDEX_RELOAD_SECONDS', 60))
+    ))
+
+
+def send_email(to, subject, template):
+    """Send an HTML email through Mailgun."""
+    import requests
+    return requests.post(
+        f"https://api.mailgun.net/v3/{os.getenv('MAILGUN_DOMAIN')}/messages",
+        auth=("api", os.getenv('MAILGUN_API_KEY')),
+        data={"from": os.getenv('MAILGUN_FROM'),
+              "to": to,
+              "subject": subject,
+              "html": template})
+
+
+def send_telegram_message(chat_id, text):
+    from telegram import Bot
+    bot = Bot(token=os.getenv('telegram_token'))
+    asyncio.run(bot.send_message(chat_id=chat_id, text=text))
+
+
+def send_stock_alert_email(email, alerts):
+    # Plain Jinja rather than Flask's render_template, so ingesters need no app context
+    from jinja2 import Environment, FileSystemLoader
+    template = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True) \
+        .get_template('emails/stock_alert.html')
+    codes = sorted({code for _, matched in alerts for code in matched})
+    send_email(email, f"Stock Alert: {', '.join(codes)}", template.render(alerts=alerts))
+
+
+def send_stock_alert_telegram(alerts):
+    chat_id = os.getenv('telegram_group_ID')
+    if not chat_id:
+        return
+    lines = [
+        f"{', '.join(codes)}: {article['title']} ({article['sentiment']}, {article['recommendation']})\n{article['link']}"
+        for article, codes in alerts
+    ]
+    # Telegram rejects messages longer than 4096 characters
+    send_telegram_message(chat_id, '\n\n'.join(lines)[:4096])
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+import time
+from datetime import timezone
+
+from ttl_cache import TTLCache
+
+DEFAULT_TTL = 300
+
+
+class MemoryBackend:
+    """Per-process LRU; each gunicorn worker warms its own copy."""
+
+    def __init__(self, ttl=DEFAULT_TTL, maxsize=512):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.put(key, value)
+
+
+class FileBackend:
+    """
+    One file per entry in a directory shared by every worker on the host.
+
+    Entries expire ttl seconds after they are written; expired and surplus
+    files are pruned every prune_every writes.
+    """
+
+    def __init__(self, directory, ttl=DEFAULT_TTL, max_entries=2000, prune_every=100):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.html')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                return None
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        # Write then rename so other workers never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing view cache entry: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                mtime = entry.stat().st_mtime
+                if mtime + self.ttl <= now:
+                    os.remove(entry.path)
+                else:
+                    entries.append((mtime, entry.path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def backend_from_env():
+    """
+    Build the fragment cache backend from VIEW_CACHE_BACKEND.
+
+    memory (default) keeps entries per process, file shares them through
+    VIEW_CACHE_DIR, none disables fragment caching.
+    """
+    kind = os.getenv('VIEW_CACHE_BACKEND', 'memory').lower()
+    ttl = float(os.getenv('VIEW_CACHE_TTL', DEFAULT_TTL))
+    if kind == 'none':
+        return None
+    if kind == 'file':
+        directory = os.getenv('VIEW_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'techunar-view-cache')
+        return FileBackend(directory, ttl=ttl)
+    return MemoryBackend(ttl=ttl)
+
+
+def fragment_key(view, args, stocks, version):
+    """
+    Cache key for one view's rendered content.
+
+    :param view: View name
+    :param args: Request args (MultiDict); empty values are dropped and order is ignored
+    :param stocks: The user's effective stock filter
+    :param version: Data version token; a new version never reuses old entries
+    """
+    normalized = sorted((name, tuple(sorted(value for value in args.getlist(name) if value)))
+                        for name in args.keys())
+    normalized = [(name, values) for name, values in normalized if values]
+    return repr((view, version, normalized, tuple(sorted(stocks or ()))))
+
+
+def make_etag(key, user_id):
+    # Per user, so a shared browser cache never serves one user's page to another
+    return hashlib.sha1(f'{user_id}:{key}'.encode()).hexdigest()[:32]
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc, microsecond=0) if value.tzinfo is None else value
+
+
+def is_fresh(request, etag, last_modified):
+    """
+    True when the client's copy matches etag. last_modified is only used for
+    responses without an etag: the data version's timestamp does not cover
+    the query args or the user's stock filter, which are in the etag's key.
+    """
+    if etag is not None:
+        return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _utc(last_modified) <= request.if_modified_since
+    return False
+
+
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    # Browsers keep the page but must revalidate, which is a cheap 304
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response